@@ -4,12 +4,29 @@
 
 
 from .functions import (
+    adox_a_class,
+    adox_a_function,
+    adox_a_module,
     dox_a_class,
     dox_a_function,
     dox_a_module,
+    dox_a_module_sharded,
     dox_a_value,
+    dox_modules,
+    discover_modules,
+    dox_shard,
+    merge_shards,
+    run_config,
+    shard_modules,
     Event,
+    Inventory,
+    Options,
+    ShardWriter,
+    SymbolTable,
     set_before_handler,
     set_after_handler,
+    set_batch_handler,
     unset_handler
 )
+from .bytecode import bytecode_module
+from .snapshot import Snapshot
@@ -0,0 +1,425 @@
+"""Builds stand-in modules from cached bytecode so that they can be
+    documented without importing (and thereby executing) them.
+"""
+
+
+from .functions import _debug
+from dis import get_instructions, stack_effect, HAVE_ARGUMENT
+from importlib.util import cache_from_source, source_from_cache, source_hash, MAGIC_NUMBER
+from types import CellType, CodeType, FunctionType, ModuleType
+import marshal
+import os
+import sys
+
+
+class _Unknown:
+    """Placeholder for a value that cannot be determined without
+        executing code.
+    """
+    def __repr__(self) -> str:
+        return '...'
+
+
+_unknown = _Unknown()
+
+
+class _Name(str):
+    """A name loaded from a namespace, e.g. a base class or decorator."""
+
+
+class _BuildClass:
+    """Marker for __build_class__ on the stack."""
+
+
+class _Function:
+    """A function that would be created by MAKE_FUNCTION."""
+    def __init__(self, code: CodeType) -> None:
+        self.code = code
+        self.defaults = None
+        self.kwdefaults = None
+        self.annotations = None
+        self.decorators = []
+
+
+class _Class:
+    """A class that would be created by __build_class__."""
+    def __init__(self, body: _Function, name: str, bases: list) -> None:
+        self.body = body
+        self.name = name
+        self.bases = bases
+        self.decorators = []
+
+
+class _Import:
+    """A module that would be imported by IMPORT_NAME or IMPORT_FROM."""
+    def __init__(self, name: str, level: int = 0) -> None:
+        self.name = name
+        self.level = level
+
+
+def _source_of(path: str) -> str:
+    """Returns the path of the source file a .pyc file was compiled
+        from, whether it is in __pycache__ or next to the source.
+    """
+    try:
+        return source_from_cache(path)
+    except ValueError:
+        return path[:-1]
+
+
+def _is_current(data: bytes, source: str) -> bool:
+    """Returns True if the header of a .pyc file matches its source
+        file, or if the source file does not exist. Timestamp-based
+        files are checked against the mtime and size of the source and
+        hash-based files against its hash, whether or not the latter
+        were compiled to be checked.
+    """
+    try:
+        stat = os.stat(source)
+    except OSError:
+        return True
+    flags = int.from_bytes(data[4:8], 'little')
+    if flags & 0b1:
+        with open(source, 'rb') as f:
+            return data[8:16] == source_hash(f.read())
+    return int.from_bytes(data[8:12], 'little') == int(stat.st_mtime) & 0xFFFFFFFF \
+        and int.from_bytes(data[12:16], 'little') == stat.st_size & 0xFFFFFFFF
+
+
+def _read_header(path: str) -> bytes:
+    """Reads the 16 byte header of a .pyc file."""
+    with open(path, 'rb') as f:
+        return f.read(16)
+
+
+def find_bytecode(name: str, search_path: list[str]|None = None) -> str:
+    """Finds the bytecode file for a module by name, looking in the
+        __pycache__ directories and for sourceless .pyc files. Files
+        that are out of date with their source are skipped. Raises
+        ModuleNotFoundError if no current bytecode file can be found.
+    """
+    _debug(2, 'find_bytecode(', name, ')')
+    parts = name.split('.')
+    stale = []
+    for path in (search_path if search_path is not None else sys.path):
+        base = os.path.join(path or '.', *parts)
+        for source in (os.path.join(base, '__init__.py'), base + '.py'):
+            candidates = [cache_from_source(source, optimization=o) for o in ('', 1, 2)]
+            for cached in candidates + [source + 'c']:
+                if not os.path.isfile(cached):
+                    continue
+                if _is_current(_read_header(cached), source):
+                    return cached
+                _debug(2, 'find_bytecode: skipping out of date', cached)
+                stale.append(cached)
+    if stale:
+        raise ModuleNotFoundError(
+            f'bytecode for {name} is out of date with its source: {", ".join(stale)}', name=name
+        )
+    raise ModuleNotFoundError(f'no bytecode found for {name}', name=name)
+
+
+def load_bytecode(path: str) -> CodeType:
+    """Loads the code object from a .pyc file without executing it.
+        Raises ImportError if the file was written by another version
+        of Python or is out of date with its source file.
+    """
+    _debug(2, 'load_bytecode(', path, ')')
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:4] != MAGIC_NUMBER:
+        raise ImportError(f'bad magic number in {path}', path=path)
+    source = _source_of(path)
+    if not _is_current(data, source):
+        raise ImportError(f'{path} is out of date with {source}', path=path)
+    return marshal.loads(data[16:])
+
+
+def _interpret(code: CodeType) -> dict:
+    """Walks the instructions of a module or class body and returns the
+        names it would store mapped to what is known about each value.
+        Only constants, functions, classes, and imports are tracked;
+        everything else is _unknown. The opcodes of Python 3.11 through
+        3.13 are handled; any other instruction is assumed to produce
+        unknown values, and one whose stack effect is unknown leaves the
+        whole stack unknown, so other versions degrade to documenting
+        fewer members rather than failing.
+    """
+    names = {}
+    stack = []
+    kw_names = 0
+
+    def pop(count: int = 1) -> list:
+        nonlocal stack
+        if count <= 0:
+            return []
+        items = stack[-count:]
+        stack = stack[:-count]
+        return [_unknown] * (count - len(items)) + items
+
+    for ins in get_instructions(code):
+        op, arg = ins.opname, ins.arg
+
+        if op in ('NOP', 'RESUME', 'CACHE', 'EXTENDED_ARG', 'PRECALL'):
+            continue
+        elif op == 'KW_NAMES':
+            kw_names = len(code.co_consts[arg])
+        elif op in ('LOAD_CONST', 'RETURN_CONST'):
+            stack.append(ins.argval)
+        elif op in ('LOAD_NAME', 'LOAD_GLOBAL'):
+            if op == 'LOAD_GLOBAL' and arg & 1:
+                stack.append(None)
+            stack.append(_Name(ins.argval))
+        elif op == 'LOAD_ATTR':
+            owner = pop()[0]
+            stack.append(_Name(f'{owner}.{ins.argval}') if type(owner) is _Name else _unknown)
+        elif op == 'LOAD_BUILD_CLASS':
+            stack.append(_BuildClass())
+        elif op == 'PUSH_NULL':
+            stack.append(None)
+        elif op in ('BUILD_TUPLE', 'BUILD_LIST'):
+            items = pop(arg)
+            stack.append(tuple(items) if op == 'BUILD_TUPLE' else items)
+        elif op == 'BUILD_SET':
+            # only the type of the value is needed
+            pop(arg)
+            stack.append(set())
+        elif op == 'BUILD_MAP':
+            pop(arg * 2)
+            stack.append({})
+        elif op == 'BUILD_CONST_KEY_MAP':
+            keys = pop()[0]
+            values = pop(arg)
+            stack.append(dict(zip(keys, values)) if type(keys) is tuple else {})
+        elif op in ('LIST_EXTEND', 'SET_UPDATE', 'DICT_UPDATE', 'DICT_MERGE'):
+            pop(arg)
+        elif op == 'MAKE_FUNCTION':
+            item = pop()[0]
+            function = _Function(item) if type(item) is CodeType else _unknown
+            if arg and function is not _unknown:
+                # pre-3.13: the flags say which attributes are on the stack
+                if arg & 0x08:
+                    pop()
+                if arg & 0x04:
+                    function.annotations = pop()[0]
+                if arg & 0x02:
+                    function.kwdefaults = pop()[0]
+                if arg & 0x01:
+                    function.defaults = pop()[0]
+            elif arg:
+                pop(bin(arg & 0x0f).count('1'))
+            stack.append(function)
+        elif op == 'SET_FUNCTION_ATTRIBUTE':
+            function, value = pop()[0], pop()[0]
+            if type(function) is _Function:
+                if arg == 0x01:
+                    function.defaults = value
+                elif arg == 0x02:
+                    function.kwdefaults = value
+                elif arg == 0x04:
+                    function.annotations = value
+            stack.append(function)
+        elif op in ('CALL', 'CALL_KW'):
+            if op == 'CALL_KW':
+                kw_names = len(pop()[0] or ())
+            items = pop(arg + 2)
+            callable, args = items[:2], items[2:]
+            kwargs, kw_names = kw_names, 0
+            if any(type(c) is _BuildClass for c in callable) and len(args) >= 2 \
+                    and type(args[0]) is _Function:
+                bases = args[2:len(args) - kwargs]
+                stack.append(_Class(args[0], args[1], bases))
+            elif arg == 0 and type(callable[1]) in (_Function, _Class) \
+                    and type(callable[0]) is _Name:
+                # decorator application
+                callable[1].decorators.append(str(callable[0]))
+                stack.append(callable[1])
+            else:
+                stack.append(_unknown)
+        elif op == 'IMPORT_NAME':
+            level, _ = pop(2)
+            stack.append(_Import(ins.argval, level if type(level) is int else 0))
+        elif op == 'IMPORT_FROM':
+            module = stack[-1] if stack else _unknown
+            if type(module) is _Import:
+                name = f'{module.name}.{ins.argval}' if module.name else ins.argval
+                stack.append(_Import(name, module.level))
+            else:
+                stack.append(_unknown)
+        elif op == 'SETUP_ANNOTATIONS':
+            names['__annotations__'] = {}
+        elif op == 'STORE_SUBSCR':
+            key, container, value = pop()[0], pop()[0], pop()[0]
+            if container == '__annotations__' and type(container) is _Name:
+                names.setdefault('__annotations__', {})[key] = value
+        elif op == 'STORE_NAME':
+            names[ins.argval] = pop()[0]
+        elif op[:6] in ('STORE_', 'DELETE') or op[:4] == 'POP_':
+            pop(-stack_effect(ins.opcode, arg) if ins.opcode >= HAVE_ARGUMENT else -stack_effect(ins.opcode))
+        else:
+            try:
+                effect = stack_effect(ins.opcode, arg) if ins.opcode >= HAVE_ARGUMENT else stack_effect(ins.opcode)
+            except ValueError:
+                _debug(2, '_interpret: unknown opcode', op)
+                stack = []
+                continue
+            if effect > 0:
+                stack.extend([_unknown] * effect)
+            else:
+                pop(-effect)
+                if stack:
+                    stack[-1] = _unknown
+
+    return names
+
+
+def _docstring(code: CodeType) -> str|None:
+    """Returns the docstring of a function code object, if any."""
+    if code.co_flags & 0x4000000:
+        # CO_HAS_DOCSTRING was added in 3.14
+        return code.co_consts[0]
+    if code.co_consts and type(code.co_consts[0]) is str:
+        return code.co_consts[0]
+    return None
+
+
+def _make_function(item: _Function, module_name: str) -> FunctionType|classmethod|staticmethod|property:
+    """Creates a real function object from the code object. The function
+        is never called.
+    """
+    code = item.code
+    closure = tuple(CellType() for _ in code.co_freevars) or None
+    defaults = item.defaults if type(item.defaults) is tuple else None
+    function = FunctionType(code, {'__name__': module_name}, code.co_name, defaults, closure)
+    function.__doc__ = _docstring(code)
+    function.__qualname__ = getattr(code, 'co_qualname', code.co_name)
+
+    if type(item.kwdefaults) is dict:
+        function.__kwdefaults__ = item.kwdefaults
+    if type(item.annotations) is tuple:
+        annotations = item.annotations
+        function.__annotations__ = {
+            annotations[i]: annotations[i+1]
+            for i in range(0, len(annotations) - 1, 2)
+        }
+    elif type(item.annotations) is dict:
+        function.__annotations__ = item.annotations
+
+    result = function
+    for decorator in reversed(item.decorators):
+        match decorator.split('.')[-1]:
+            case 'classmethod':
+                result = classmethod(result)
+            case 'staticmethod':
+                result = staticmethod(result)
+            case 'property':
+                result = property(result, doc=function.__doc__)
+    return result
+
+
+def _stub_base(name: str, stubs: dict[str, type]) -> type:
+    """Returns an empty class standing in for a base class by name,
+        shared through stubs by the classes of one bytecode_module call.
+    """
+    if name not in stubs:
+        stubs[name] = type(name.split('.')[-1], (), {})
+    return stubs[name]
+
+
+def _make_class(item: _Class, module_name: str, classes: dict,
+                stubs: dict[str, type]) -> type|None:
+    """Creates a stand-in class from the class body without running it.
+        Bases that were defined earlier in the same module are looked up
+        in classes; other bases are replaced with empty stand-ins.
+    """
+    if type(item.name) is not str:
+        return None
+    body = _interpret(item.body.code)
+    namespace = {
+        '__module__': module_name,
+        '__qualname__': body.get('__qualname__', item.name),
+        '__doc__': body['__doc__'] if type(body.get('__doc__')) is str else None,
+    }
+    if type(body.get('__annotations__')) is dict:
+        namespace['__annotations__'] = body['__annotations__']
+
+    for name, value in body.items():
+        if name in namespace:
+            continue
+        if type(value) is _Function:
+            namespace[name] = _make_function(value, module_name)
+        elif type(value) is _Class:
+            cls = _make_class(value, module_name, classes, stubs)
+            if cls is not None:
+                namespace[name] = cls
+        elif _is_known(value):
+            namespace[name] = value
+
+    bases = []
+    for base in item.bases:
+        if type(base) is not _Name or base == 'object':
+            continue
+        base = classes[base] if base in classes else _stub_base(base, stubs)
+        if base not in bases:
+            bases.append(base)
+    return type(item.name, tuple(bases), namespace)
+
+
+def _is_known(value) -> bool:
+    """Returns True if at least the type of a value could be determined."""
+    return value is not _unknown and type(value) not in (_Name, _Import, _BuildClass)
+
+
+def bytecode_module(name: str, search_path: list[str]|None = None,
+                    _stubs: dict[str, type]|None = None) -> ModuleType:
+    """Builds a stand-in module from cached bytecode without executing
+        it. Functions keep their real code objects, so names, argument
+        names, docstrings, constant defaults, annotations, and async
+        flags are all available to dox_a_module; classes are rebuilt
+        from their bodies with stand-in base classes. Values that are
+        not constants and names bound by imports are omitted, except
+        for submodules of a package, which are loaded from bytecode as
+        well.
+    """
+    _debug(1, 'bytecode_module(', name, ')')
+    # stand-in bases are shared by the submodules but not across calls
+    stubs = {} if _stubs is None else _stubs
+    path = find_bytecode(name, search_path)
+    is_package = os.path.basename(path).startswith('__init__.')
+    names = _interpret(load_bytecode(path))
+    package = name if is_package else name.rpartition('.')[0]
+
+    doc = names['__doc__'] if type(names.get('__doc__')) is str else None
+    module = ModuleType(name, doc)
+    module.__file__ = path
+    if is_package:
+        module.__path__ = [os.path.dirname(os.path.dirname(path))
+                           if os.path.basename(os.path.dirname(path)) == '__pycache__'
+                           else os.path.dirname(path)]
+
+    classes = {}
+    for key, value in names.items():
+        if key in ('__doc__', '__annotations__'):
+            continue
+        if type(value) is _Function:
+            setattr(module, key, _make_function(value, name))
+        elif type(value) is _Class:
+            cls = _make_class(value, name, classes, stubs)
+            if cls is not None:
+                classes[key] = cls
+                setattr(module, key, cls)
+        elif type(value) is _Import:
+            # only submodules of this package are documented
+            full = value.name
+            if value.level:
+                base = package.rsplit('.', value.level - 1)[0] if value.level > 1 else package
+                full = f'{base}.{value.name}' if value.name else base
+            if full.startswith(f'{name}.') and full.rpartition('.')[2] == key:
+                try:
+                    setattr(module, key, bytecode_module(full, search_path, stubs))
+                except ModuleNotFoundError:
+                    pass
+        elif _is_known(value):
+            setattr(module, key, value)
+
+    return module
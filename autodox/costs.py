@@ -0,0 +1,260 @@
+"""Attributes the time spent documenting each module to importing it
+    (including its transitive imports), introspection, formatting, and
+    hooks, so that slow builds can be traced to imports or to hooks.
+"""
+
+
+from . import functions
+from importlib.util import resolve_name
+from time import perf_counter, process_time
+import builtins
+import json
+import sys
+
+
+PHASES = {
+    'formatting': ('_header', '_paragraph', '_list', '_render_annotation', '_assemble'),
+    'hooks': ('_invoke_handler', '_invoke_before_handler', '_invoke_batch_handler'),
+}
+COLUMNS = ('import', 'introspection', 'formatting', 'hooks', 'total', 'bytes')
+
+
+def _imported_name(name: str, globals: dict|None, fromlist: tuple, level: int,
+                   added: list[str]) -> str:
+    """Returns the name of the module an import statement imported,
+        given the names it added to sys.modules in order.
+    """
+    if level:
+        try:
+            name = resolve_name('.' * level + name, (globals or {}).get('__package__'))
+        except (ImportError, ValueError):
+            return added[0]
+    for item in fromlist or ():
+        if f'{name}.{item}' in added:
+            return f'{name}.{item}'
+    return name if name in added else added[0]
+
+
+class CostReport:
+    """Context manager that instruments autodox.functions while active
+        and records per documented module the import wall time, the
+        introspection, formatting, and hook time, and the output size.
+        Times are exclusive: a phase nested in another (e.g. hooks run
+        by formatting functions, or a documented submodule) is only
+        counted once, in the innermost phase and module. Transitive
+        imports are attributed to the first module that imports them,
+        as with `python -X importtime`.
+    """
+    def __init__(self) -> None:
+        self.modules = {}
+        self.originals = {}
+        self.stack = []
+        self.module_names = []
+        # exclusive CPU seconds per phase, summed over the modules
+        self.cpu = {'import': 0.0, 'introspection': 0.0, 'formatting': 0.0, 'hooks': 0.0}
+
+    def _stats(self, name: str) -> dict:
+        if name not in self.modules:
+            self.modules[name] = {
+                'import': 0.0, 'introspection': 0.0, 'formatting': 0.0,
+                'hooks': 0.0, 'bytes': 0, 'imports': [],
+            }
+        return self.modules[name]
+
+    def _enter(self) -> list:
+        # each frame is [child seconds, child bytes, child CPU seconds, CPU start]
+        frame = [0.0, 0, 0.0, process_time()]
+        self.stack.append(frame)
+        return frame
+
+    def _exit(self, frame: list, elapsed: float, size: int = 0, phase: str|None = None) -> None:
+        cpu = process_time() - frame[3]
+        self.stack.pop()
+        if self.stack:
+            self.stack[-1][0] += elapsed
+            self.stack[-1][1] += size
+            self.stack[-1][2] += cpu
+        if phase is not None:
+            self.cpu[phase] += cpu - frame[2]
+
+    def _timed(self, phase: str, function):
+        def wrapper(*args, **kwargs):
+            frame = self._enter()
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = perf_counter() - start
+                self._exit(frame, elapsed, phase=phase if self.module_names else None)
+                if self.module_names:
+                    self._stats(self.module_names[-1])[phase] += elapsed - frame[0]
+        return wrapper
+
+    def _module(self, function):
+        def wrapper(module, options={}):
+            stats = self._stats(getattr(module, '__name__', '[unnamed]'))
+            self.module_names.append(getattr(module, '__name__', '[unnamed]'))
+            frame = self._enter()
+            start = perf_counter()
+            doc = ''
+            try:
+                doc = function(module, options)
+                return doc
+            finally:
+                elapsed = perf_counter() - start
+                size = len(doc.encode())
+                self._exit(frame, elapsed, size, 'introspection')
+                self.module_names.pop()
+                stats['introspection'] += elapsed - frame[0]
+                stats['bytes'] += size - frame[1]
+        return wrapper
+
+    def _writer_call(self, function):
+        def wrapper(writer, text, *args, **kwargs):
+            if self.module_names:
+                self._stats(self.module_names[-1])['bytes'] += len(text.encode())
+            return function(writer, text, *args, **kwargs)
+        return wrapper
+
+    def _load(self, function):
+        def wrapper(name, options):
+            imports = []
+            original_import = builtins.__import__
+            builtins.__import__ = self._traced_import(original_import, imports)
+            frame = self._enter()
+            start = perf_counter()
+            module = None
+            try:
+                module = function(name, options)
+                return module
+            finally:
+                elapsed = perf_counter() - start
+                builtins.__import__ = original_import
+                # imports are not exclusive of nested phases
+                self._exit(frame, elapsed)
+                self.cpu['import'] += process_time() - frame[3]
+                stats = self._stats(getattr(module, '__name__', name))
+                stats['import'] += elapsed
+                stats['imports'].extend(imports)
+        return wrapper
+
+    def _traced_import(self, original_import, imports: list):
+        """Returns an __import__ that records (name, self seconds,
+            cumulative seconds, depth) for each import statement that
+            added modules to sys.modules, in completion order.
+        """
+        stack = []
+        def traced_import(name, globals=None, locals=None, fromlist=(), level=0):
+            if not level and name in sys.modules and not fromlist:
+                return original_import(name, globals, locals, fromlist, level)
+            before = len(sys.modules)
+            frame = [0.0]
+            stack.append(frame)
+            start = perf_counter()
+            try:
+                return original_import(name, globals, locals, fromlist, level)
+            finally:
+                elapsed = perf_counter() - start
+                stack.pop()
+                if stack:
+                    stack[-1][0] += elapsed
+                if len(sys.modules) > before:
+                    imports.append((
+                        _imported_name(name, globals, fromlist, level, [*sys.modules][before:]),
+                        elapsed - frame[0], elapsed, len(stack) + 1
+                    ))
+        return traced_import
+
+    def _patches(self) -> dict:
+        """Returns the functions to wrap, by name, mapped to functions
+            that return the wrappers.
+        """
+        # dox_a_module calls itself through the symbol table and fragment
+        # wrappers, so modules are timed at the implementation
+        patches = {'_dox_a_module': self._module, '_load_module': self._load}
+        for phase, names in PHASES.items():
+            for name in names:
+                patches[name] = lambda function, phase=phase: self._timed(phase, function)
+        return patches
+
+    def __enter__(self) -> 'CostReport':
+        for name, patch in self._patches().items():
+            self.originals[name] = getattr(functions, name)
+            setattr(functions, name, patch(self.originals[name]))
+        self.originals['ShardWriter.__call__'] = functions.ShardWriter.__call__
+        functions.ShardWriter.__call__ = self._writer_call(functions.ShardWriter.__call__)
+        return self
+
+    def __exit__(self, *args) -> None:
+        functions.ShardWriter.__call__ = self.originals.pop('ShardWriter.__call__')
+        for name, original in self.originals.items():
+            setattr(functions, name, original)
+        self.originals = {}
+
+    def rows(self) -> list[dict]:
+        """Returns one row per module with the COLUMNS, in the order
+            the modules were documented.
+        """
+        rows = []
+        for name, stats in self.modules.items():
+            row = {'module': name, **{k: stats[k] for k in COLUMNS if k in stats}}
+            row['total'] = sum([stats[k] for k in ('import', 'introspection', 'formatting', 'hooks')])
+            rows.append(row)
+        return rows
+
+    def worst(self, count: int = 10, key: str = 'total') -> list[dict]:
+        """Returns the count rows with the highest value for key."""
+        return sorted(self.rows(), key=lambda row: row[key], reverse=True)[:count]
+
+    def summary(self, count: int = 10) -> str:
+        """Returns a plain text table of the worst offenders, the totals
+            per phase, and the slowest transitive imports.
+        """
+        rows = self.rows()
+        width = max([len(row['module']) for row in rows] + [6])
+        lines = [
+            f'{"module":<{width}} ' + ' '.join([f'{c:>13}' for c in COLUMNS])
+        ]
+        for row in self.worst(count):
+            lines.append(
+                f'{row["module"]:<{width}} '
+                + ' '.join([f'{row[c]:>13.6f}' for c in COLUMNS[:-1]])
+                + f' {row["bytes"]:>13}'
+            )
+        totals = {
+            phase: sum([row[phase] for row in rows])
+            for phase in ('import', 'introspection', 'formatting', 'hooks')
+        }
+        lines.append('totals: ' + ', '.join([f'{k} {v:.6f}s' for k, v in totals.items()]))
+
+        imports = sorted(
+            [i for stats in self.modules.values() for i in stats['imports']],
+            key=lambda i: i[1], reverse=True
+        )[:count]
+        if imports:
+            lines.append('slowest imports (self, cumulative):')
+            for name, self_time, cumulative, _ in imports:
+                lines.append(f'  {self_time:.6f}s {cumulative:.6f}s {name}')
+        return '\n'.join(lines) + '\n'
+
+    def to_csv(self) -> str:
+        """Returns the rows as CSV."""
+        lines = [','.join(('module',) + COLUMNS)]
+        for row in self.rows():
+            lines.append(','.join([row['module']] + [str(row[c]) for c in COLUMNS]))
+        return '\n'.join(lines) + '\n'
+
+    def to_json(self) -> str:
+        """Returns the rows and the transitive imports of each module as
+            JSON.
+        """
+        return json.dumps({
+            row['module']: {
+                **{c: row[c] for c in COLUMNS},
+                'imports': [
+                    {'name': n, 'self': s, 'cumulative': c, 'depth': d}
+                    for n, s, c, d in self.modules[row['module']]['imports']
+                ],
+            }
+            for row in self.rows()
+        }, indent=2)
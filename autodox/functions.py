@@ -1,7 +1,26 @@
-from enum import Enum, auto
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from contextvars import ContextVar
+from enum import Enum, EnumMeta, auto
+from fnmatch import fnmatchcase
+from hashlib import sha256
+from importlib import import_module
+from importlib.machinery import all_suffixes
 from inspect import iscoroutinefunction
-from types import ModuleType, MethodType, FunctionType
-from typing import Any, Callable
+from pkgutil import iter_modules
+from string import Formatter
+from types import CodeType, ModuleType, MethodType, FunctionType, NoneType, UnionType
+from typing import Any, Callable, Iterator, Union, get_origin, get_type_hints
+import asyncio
+import collections.abc
+import gc
+import json
+import mmap
+import os
+import re
+import sys
+import threading
+import zlib
 
 
 
@@ -17,10 +36,34 @@ class Event(Enum):
     AFTER_CLASS = auto()
     BEFORE_MODULE = auto()
     AFTER_MODULE = auto()
+    BATCH = auto()
 
 
 _handlers = {}
+# the functions chained into each handler, in order
+_handler_functions = {}
 _debug_level = 0
+_annotation_cache = {}
+_namespace_cache = {}
+# stacks are immutable tuples in context variables so that concurrently
+# documented members (see adox_a_module) each see their own
+_fragments = ContextVar('_fragments', default=())
+_fragment_names = ContextVar('_fragment_names', default=())
+_fragment_lock = threading.Lock()
+_symbol_tables = ContextVar('_symbol_tables', default=())
+_event_loop = ContextVar('_event_loop', default=None)
+_semaphore = ContextVar('_semaphore', default=None)
+# names in sys.modules before the modules being documented were imported
+_preloaded = ContextVar('_preloaded', default=None)
+# (names of the modules documented by the run, {id: (item, module name)}
+# of the deduplicated classes and functions rendered outside of their
+# canonical location)
+_locations = ContextVar('_locations', default=None)
+# [modules released since the last gc checkpoint] of the low_memory run
+_released = ContextVar('_released', default=None)
+_gc_interval = 16
+_symbol_marker = re.compile('([\x01\x03])([^\x02]*)\x02([^\x01\x03]*)\\1')
+_sphinx_entry = re.compile(r'(.+?)\s+(\S+)\s+(-?\d+)\s+?(\S*)\s+(?:.*)')
 
 
 def _debug(level = 1, *args):
@@ -29,16 +72,47 @@ def _debug(level = 1, *args):
         print(*args)
 
 
-def _set_handler(event: Event, function: Callable) -> None:
-    """Set a handler for a specific event."""
+def _await(coroutine: Any) -> Any:
+    """Runs the coroutine of an async handler to completion from
+        synchronous code: on the event loop of the adox_ call if there is
+        one (the caller is then a worker thread), otherwise in a new
+        event loop. If a sync dox_ function is called from a coroutine,
+        e.g. in Jupyter, the running loop cannot be waited on, so the
+        new event loop runs in another thread.
+    """
+    loop = _event_loop.get()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if loop is not None and loop is not running:
+        return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+    if running is None:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+
+def _set_handler(event: Event, function: Callable, chain: Callable|None = None) -> None:
+    """Set a handler for a specific event. If one is already set, the
+        handlers are chained with chain(first, second, *args), or by
+        passing the output of the first to the second by default.
+    """
     _debug(3, '_set_handler(', event, function, ')')
     if not callable(function):
         raise TypeError('function must be callable')
+    _handler_functions.setdefault(event.name, []).append(function)
+
+    if iscoroutinefunction(function):
+        function = lambda *args, handler=function: _await(handler(*args))
 
     if event.name in _handlers:
         first = _handlers[event.name]
         second = function
-        _handlers[event.name] = lambda *args: second(first(*args))
+        if chain is None:
+            _handlers[event.name] = lambda *args: second(first(*args))
+        else:
+            _handlers[event.name] = lambda *args: chain(first, second, *args)
     else:
         _handlers[event.name] = function
 
@@ -55,7 +129,10 @@ def set_before_handler(event: Event, function: Callable[[Any, dict], tuple[Any,
 
 
 def set_after_handler(event: Event, function: Callable[[str], str]) -> None:
-    """Sets a handler for an AFTER_ event."""
+    """Sets a handler for an AFTER_ event. With cross_references or
+        symbols, the text contains unresolved symbol markers (see
+        SymbolTable.resolve) that the handler should pass through.
+    """
     _debug(3, 'set_after_handler(', event, ')')
     if type(event) is not Event:
         raise TypeError('event must be Event')
@@ -65,6 +142,33 @@ def set_after_handler(event: Event, function: Callable[[str], str]) -> None:
     _set_handler(event, function)
 
 
+def set_batch_handler(function: Callable[[list[tuple[str, str, str]]], list]) -> None:
+    """Sets a handler that receives all fragments (headers, paragraphs,
+        and list items) of a module in one call before the module is
+        assembled. Each fragment is a (kind, qualified name, text)
+        tuple; the handler returns a list of the same length containing
+        the modified fragments (or just their texts). As for AFTER_
+        handlers, texts may contain unresolved symbol markers.
+    """
+    _debug(3, 'set_batch_handler(', function, ')')
+    _set_handler(Event.BATCH, function, _chain_batch_handlers)
+
+
+def _chain_batch_handlers(first: Callable, second: Callable,
+                          fragments: list[tuple[str, str, str]]) -> list:
+    """Passes the fragments returned by the first BATCH handler to the
+        second as (kind, qualified name, text) tuples, even if the first
+        returned just their texts.
+    """
+    result = first(fragments)
+    if len(result) != len(fragments):
+        raise ValueError('BATCH handler must return one fragment per fragment')
+    return second([
+        (kind, name, text if type(text) is str else text[2])
+        for (kind, name, _), text in zip(fragments, result)
+    ])
+
+
 def unset_handler(event: Event) -> None:
     """Unset an event handling handler."""
     _debug(3, 'unset_handler(', event, ')')
@@ -72,6 +176,7 @@ def unset_handler(event: Event) -> None:
         raise TypeError('event must be Event')
     if event.name in _handlers:
         del _handlers[event.name]
+    _handler_functions.pop(event.name, None)
 
 
 def _invoke_handler(event: Event, *args) -> None:
@@ -85,21 +190,347 @@ def _invoke_handler(event: Event, *args) -> None:
     return args[0] if len(args) == 1 else args
 
 
-def _header(line: str, header_level: int = 0) -> str:
+_formats = ('header', 'paragraph', 'list')
+
+# option name -> default value; flags are set by their presence
+_option_defaults = {
+    'exclude_names': frozenset(),
+    'exclude_types': frozenset(),
+    'header_level': 0,
+    'line_length': 80,
+    'format': 'list',
+    'function_format': 'header',
+    'method_format': 'header',
+    'value_format': 'list',
+    'name': None,
+    'prepend': '',
+    'include_private': False,
+    'include_dunder': False,
+    'include_submodules': False,
+    'document_submodules': False,
+    'anchors': False,
+    'resolve_annotations': False,
+    'writer': None,
+    'shard_size': 1_000_000,
+    'cross_references': False,
+    'symbols': None,
+    'use_all': False,
+    'list_undeclared': False,
+    'concurrency': 8,
+    'low_memory': False,
+    'evict_modules': False,
+    'deduplicate': False,
+    'source_url': None,
+    'source_cache': None,
+    'prefetch': 0,
+    'workers': 0,
+}
+_source_fields = ('path', 'start', 'end', 'module')
+_option_flags = frozenset([
+    name for name, default in _option_defaults.items() if default is False
+])
+
+
+def _validate_option(name: str, value: Any) -> Any:
+    """Validates an option and returns its normalized value."""
+    if name in _option_flags:
+        return True
+    if name in ('exclude_names', 'exclude_types'):
+        if type(value) is str or not hasattr(value, '__iter__'):
+            raise TypeError(f'{name} must be a list of str')
+        return frozenset(value)
+    if name in ('header_level', 'line_length', 'shard_size', 'concurrency', 'prefetch', 'workers'):
+        if type(value) is not int:
+            raise TypeError(f'{name} must be int')
+        if value < 0 or (value == 0 and name not in ('header_level', 'prefetch', 'workers')):
+            raise ValueError(f'{name} must be positive')
+        return value
+    if name in ('format', 'function_format', 'method_format', 'value_format'):
+        formats = _formats + ('table',) if name == 'value_format' else _formats
+        if value not in formats:
+            raise ValueError(f'{name} must be one of {", ".join(formats)}')
+        return value
+    if name == 'writer':
+        if value is not None and not callable(value):
+            raise TypeError('writer must be callable')
+        return value
+    if name == 'symbols':
+        if value is not None and not isinstance(value, SymbolTable):
+            raise TypeError('symbols must be a SymbolTable')
+        return value
+    if name in ('name', 'prepend', 'source_url', 'source_cache') and value is not None \
+            and type(value) is not str:
+        raise TypeError(f'{name} must be str')
+    if name == 'source_url' and value is not None:
+        try:
+            fields = [field for _, field, _, _ in Formatter().parse(value) if field is not None]
+        except ValueError as e:
+            raise ValueError(f'source_url is not a valid template: {e}')
+        unknown = [f for f in fields if re.split(r'[.\[]', f)[0] not in _source_fields]
+        if unknown:
+            raise ValueError(
+                f'source_url may only use the fields {{{"}, {".join(_source_fields)}}}, '
+                f'not {{{"}, {".join(unknown)}}}'
+            )
+    return value
+
+
+class Options:
+    """Immutable, validated options for the dox_a_{thing} functions. A
+        dict of options is converted once at the entry point; nested
+        members get cheap overlays from derive() that only store the
+        changed options and look the rest up in their parent on first
+        access. Also supports read-only dict access, where an option
+        is `in` the Options only if it was set, as with a dict. Unknown
+        keys are kept in the extras dict.
+    """
+    __slots__ = ('_parent', '_given', 'extras', *_option_defaults)
+
+    def __init__(self, options: dict|None = None) -> None:
+        options = options or {}
+        set_slot = object.__setattr__
+        set_slot(self, '_parent', None)
+        set_slot(self, '_given', frozenset([k for k in options if k in _option_defaults]))
+        set_slot(self, 'extras', {k: v for k, v in options.items() if k not in _option_defaults})
+        for name, default in _option_defaults.items():
+            value = _validate_option(name, options[name]) if name in options else default
+            set_slot(self, name, value)
+
+    def __getattr__(self, name: str) -> Any:
+        # only called for slots not set on an overlay
+        if name in _option_defaults or name == 'extras':
+            value = getattr(self._parent, name)
+            object.__setattr__(self, name, value)
+            return value
+        raise AttributeError(name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError('Options are immutable')
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError('Options are immutable')
+
+    def derive(self, **changes) -> 'Options':
+        """Returns an overlay of these Options with the given changes,
+            which are validated like the options of a new Options.
+        """
+        child = object.__new__(Options)
+        given = self._given
+        if not changes.keys() <= given:
+            unknown = changes.keys() - _option_defaults.keys()
+            if unknown:
+                raise KeyError(f'unknown options: {", ".join(sorted(unknown))}')
+            given = given.union(changes)
+        object.__setattr__(child, '_parent', self)
+        object.__setattr__(child, '_given', given)
+        for name, value in changes.items():
+            object.__setattr__(child, name, _validate_option(name, value))
+        return child
+
+    def __contains__(self, key: str) -> bool:
+        if key in _option_flags:
+            return key in self._given and getattr(self, key)
+        return key in self._given or key in self.extras
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self.extras:
+            return self.extras[key]
+        if key in self:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self[key] if key in self else default
+
+    def keys(self) -> list[str]:
+        return [k for k in _option_defaults if k in self] + [*self.extras]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def to_dict(self) -> dict:
+        """Returns the set options as a new dict."""
+        return {
+            k: [*v] if type(v) is frozenset else v
+            for k, v in [(k, self[k]) for k in self.keys()]
+        }
+
+    def __repr__(self) -> str:
+        return f'Options({self.to_dict()})'
+
+
+def _options(options: dict|Options) -> Options:
+    """Converts a dict of options to Options if necessary."""
+    return options if type(options) is Options else Options(options)
+
+
+class _OptionEdits(collections.abc.MutableMapping):
+    """Mutable dict view of Options passed to the BEFORE_ handlers. It
+        reads through to the Options and only records the changes, so
+        that the Options are not copied for every member.
+    """
+    def __init__(self, options: Options) -> None:
+        self.options = options
+        self.changes = {}
+        self.removed = set()
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self.changes:
+            return self.changes[key]
+        if key in self.removed:
+            raise KeyError(key)
+        return self.options[key]
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self.changes[key] = value
+        self.removed.discard(key)
+
+    def __delitem__(self, key: str) -> None:
+        if key not in self:
+            raise KeyError(key)
+        self.changes.pop(key, None)
+        self.removed.add(key)
+
+    def __contains__(self, key: object) -> bool:
+        if key in self.changes:
+            return True
+        return key not in self.removed and key in self.options
+
+    def __iter__(self):
+        keys = [k for k in self.options.keys() if k not in self.removed]
+        return iter(keys + [k for k in self.changes if k not in keys])
+
+    def __len__(self) -> int:
+        return len([*self])
+
+    def copy(self) -> dict:
+        """Returns the options with the changes applied as a new dict,
+            as dict.copy does for handlers written for dict options.
+        """
+        return dict(self)
+
+    def __repr__(self) -> str:
+        return f'_OptionEdits({dict(self)})'
+
+    def to_options(self) -> Options:
+        """Returns the Options with the changes applied."""
+        if not self.changes and not self.removed:
+            return self.options
+        if self.removed or not self.changes.keys() <= _option_defaults.keys():
+            return Options(dict(self))
+        return self.options.derive(**self.changes)
+
+
+def _invoke_before_handler(event: Event, item: Any, options: Options) -> tuple[Any, Options]:
+    """Invokes the handler for a BEFORE_ event with a dict view of the
+        options (which the handler may modify) if a handler is set. Only
+        the changed options are validated.
+    """
+    if event.name not in _handlers:
+        return (item, options)
+    item, options = _invoke_handler(event, item, _OptionEdits(options))
+    if type(options) is _OptionEdits:
+        return (item, options.to_options())
+    return (item, _options(options))
+
+
+def _anchor(name: str) -> str:
+    """Returns a stable anchor for a qualified name, e.g.
+        'package.my_module.Class' becomes 'package-my_module-Class'. Case
+        and underscores are kept so that distinct names get distinct
+        anchors.
+    """
+    return ''.join([c if c.isalnum() or c == '_' else '-' for c in name]).strip('-')
+
+
+def _fragment(kind: str, doc: str) -> str:
+    """If the fragments of a module are being collected for the BATCH
+        handler, stores the fragment and returns a placeholder for it.
+        Otherwise, returns the fragment unchanged.
+    """
+    stack = _fragments.get()
+    if not stack:
+        return doc
+    fragments = stack[-1]
+    with _fragment_lock:
+        fragments.append((kind, _fragment_names.get()[-1], doc))
+        index = len(fragments) - 1
+    return f'\x00{index}\x00'
+
+
+def _qualname(item: Any, name: str) -> str:
+    """Returns the fully qualified name of a class or function for
+        fragment collection.
+    """
+    module = getattr(item, '__module__', None) or _fragment_names.get()[-1]
+    return f'{module}.{getattr(item, "__qualname__", name)}'
+
+
+def _invoke_batch_handler(fragments: list[tuple[str, str, str]], docs: list[str]) -> list[str]:
+    """Invokes the BATCH handler on the fragments that appear in docs,
+        in document order, and returns the resulting texts indexed like
+        fragments.
+    """
+    _debug(3, '_invoke_batch_handler(', len(fragments), ')')
+    order = [int(i) for doc in docs for i in doc.split('\x00')[1::2]]
+    result = _handlers[Event.BATCH.name]([fragments[i] for i in order])
+    if len(result) != len(order):
+        raise ValueError('BATCH handler must return one fragment per fragment')
+    texts = [text for _, _, text in fragments]
+    for i, fragment in zip(order, result):
+        texts[i] = fragment if type(fragment) is str else fragment[2]
+    return texts
+
+
+def _invoke_after_handler(event: Event, doc: str) -> str:
+    """Invokes the handler for an AFTER_VALUE, AFTER_FUNCTION, or
+        AFTER_CLASS event with the fragments being collected for the
+        BATCH handler filled in. If the handler changes the doc, its
+        result is kept and the fragments in it are not batched;
+        otherwise the placeholders are kept.
+    """
+    stack = _fragments.get()
+    if event.name not in _handlers or not stack or '\x00' not in doc:
+        return _invoke_handler(event, doc)
+    parts = doc.split('\x00')
+    for i in range(1, len(parts), 2):
+        parts[i] = stack[-1][int(parts[i])][2]
+    filled = ''.join(parts)
+    result = _invoke_handler(event, filled)
+    return doc if result == filled else result
+
+
+def _assemble(doc: str, texts: list[str]) -> str:
+    """Replaces the fragment placeholders in doc with the texts."""
+    if not texts:
+        return doc
+    parts = doc.split('\x00')
+    for i in range(1, len(parts), 2):
+        parts[i] = texts[int(parts[i])]
+    return ''.join(parts)
+
+
+def _header(line: str, header_level: int = 0, anchor: str|None = None) -> str:
     """Takes a line and returns it formatted as a header with the proper
-        number of hashtags for the given header_level.
+        number of hashtags for the given header_level. If an anchor is
+        supplied, an html anchor tag is placed on the line above.
     """
-    _debug(2, '_header(', line, header_level, ')')
+    _debug(2, '_header(', line, header_level, anchor, ')')
     doc = ''.join(['#' for _ in range(header_level+1)]) + f' {line}\n\n'
-    return _invoke_handler(Event.AFTER_HEADER, doc)
+    if anchor:
+        doc = f'<a id="{anchor}"></a>\n' + doc
+    return _fragment('header', _invoke_handler(Event.AFTER_HEADER, doc))
 
 
-def _paragraph(docstring: str, options: dict = {}) -> str:
+def _wrap(docstring: str, options: dict|Options = {}) -> str:
     """Takes a docstring, tokenizes it, and returns a str formatted to
-        72 chars or fewer per line without splitting tokens.
+        options['line_length'] (80 by default) chars or fewer per line
+        without splitting tokens.
     """
-    _debug(2, '_paragraph(', docstring, ')')
-    line_length = options.get('line_length', 80)
+    if type(options) is Options:
+        line_length = options.line_length
+    else:
+        line_length = options.get('line_length', 80)
     def make_line(tokens: list[str]) -> tuple[str, list[str]]:
         _debug(2, 'make_line(', tokens, ')')
         line = ''
@@ -117,83 +548,797 @@ def _paragraph(docstring: str, options: dict = {}) -> str:
         line, tokens = make_line(tokens)
         lines.append(line)
 
-    doc = '\n'.join(lines) + '\n\n'
-    return _invoke_handler(Event.AFTER_PARAGRAPH, doc)
+    return '\n'.join(lines) + '\n\n'
 
 
-def _list(line: str, options: dict = {}) -> str:
+def _paragraph(docstring: str, options: dict|Options = {}) -> str:
+    """Takes a docstring, tokenizes it, and returns a str formatted to
+        72 chars or fewer per line without splitting tokens.
+    """
+    _debug(2, '_paragraph(', docstring, ')')
+    doc = _invoke_handler(Event.AFTER_PARAGRAPH, _wrap(docstring, options))
+    return _fragment('paragraph', doc)
+
+
+def _list(line: str, options: dict|Options = {}) -> str:
     """Takes a line and returns a formatted list item."""
     _debug(2, '_list(', line, ')')
-    doc = _paragraph(f'- {line}', options)[:-1]
-    return _invoke_handler(Event.AFTER_LIST, doc)
+    doc = _invoke_handler(Event.AFTER_PARAGRAPH, _wrap(f'- {line}', options))[:-1]
+    return _fragment('list', _invoke_handler(Event.AFTER_LIST, doc))
+
+
+def _type_repr(item: Any) -> str:
+    """Returns the name of a type argument as rendered by typing."""
+    if item is NoneType or item is None:
+        return 'None'
+    if item is Ellipsis:
+        return '...'
+    if isinstance(item, type) and not get_origin(item):
+        if item.__module__ == 'builtins':
+            return item.__qualname__
+        return f'{item.__module__}.{item.__qualname__}'
+    return repr(item)
+
+
+def _linkable(annotation: Any) -> bool:
+    """Returns True if the annotation is a class that can be linked."""
+    return (
+        isinstance(annotation, type) and not get_origin(annotation)
+        and getattr(annotation, '__module__', 'builtins') != 'builtins'
+    )
+
+
+def _contains_linkable(annotation: Any) -> bool:
+    """Returns True if the annotation or any of its arguments can be
+        linked.
+    """
+    if _linkable(annotation):
+        return True
+    args = getattr(annotation, '__args__', None)
+    if type(args) is not tuple or isinstance(annotation, type) and not get_origin(annotation):
+        return False
+    return any(
+        _contains_linkable(a) for arg in args
+        for a in (arg if type(arg) is list else [arg])
+    )
+
+
+def _link_arguments(annotation: Any, linked: str) -> str:
+    """Renders a generic annotation like typing does, replacing every
+        linkable class in its arguments with a symbol reference.
+    """
+    def render(arg: Any) -> str:
+        if type(arg) is list:
+            return '[' + ', '.join([render(a) for a in arg]) + ']'
+        if _linkable(arg):
+            return _symbol_reference(arg, _type_repr(arg), linked)
+        if _contains_linkable(arg):
+            return _link_arguments(arg, linked)
+        return _type_repr(arg) if isinstance(arg, type) or arg in (None, Ellipsis) else str(arg)
+
+    args = annotation.__args__
+    if isinstance(annotation, UnionType):
+        return ' | '.join([render(a) for a in args])
+    rendered = str(annotation)
+    prefix = rendered[:rendered.index('[')] if '[' in rendered else rendered
+    if get_origin(annotation) is collections.abc.Callable and len(args) > 1 and args[0] is not Ellipsis:
+        args = [[*args[:-1]], args[-1]]
+    elif get_origin(annotation) is Union and len(args) == 2 and NoneType in args and 'Optional' in prefix:
+        args = [a for a in args if a is not NoneType]
+    return f'{prefix}[{", ".join([render(a) for a in args])}]'
+
+
+def _symbol_reference(item: Any, display: str, linked: str) -> str:
+    """Returns a marker for a reference to a class that is replaced by
+        a link or by the display text when the symbols are resolved.
+        References inside code spans ('code') and in plain text
+        ('text') use different markers.
+    """
+    marker = '\x01' if linked == 'code' else '\x03'
+    return f'{marker}{item.__module__}.{item.__qualname__}\x02{display}{marker}'
+
+
+class _RenderedAnnotation:
+    """An annotation formatted ahead of time (e.g. in a snapshot) in
+        every style, keyed by style, and by style and linked if linking
+        changes the result.
+    """
+    __slots__ = ('renderings',)
+
+    def __init__(self, renderings: dict[str, str]) -> None:
+        self.renderings = renderings
+
+
+def _format_annotation(annotation: Any, style: str, linked: str|None = None) -> str:
+    """Formats an annotation for a parameter ('param'), a return value
+        ('return'), or a class attribute ('class'). If linked is set,
+        classes are rendered as symbol references.
+    """
+    if type(annotation) is _RenderedAnnotation:
+        renderings = annotation.renderings
+        return renderings.get(f'{style} {linked}', renderings[style])
+    if linked and _linkable(annotation):
+        display = _type_repr(annotation) if style == 'class' else _format_annotation(annotation, style)
+        return _symbol_reference(annotation, display, linked)
+    if linked and _contains_linkable(annotation) and not (style == 'param' and hasattr(annotation, '__name__')):
+        return _link_arguments(annotation, linked)
+    if style == 'param':
+        return annotation.__name__ if hasattr(annotation, '__name__') else str(annotation)
+    if style == 'return':
+        rendered = str(annotation)
+        if '[' in rendered or not hasattr(annotation, '__name__'):
+            return rendered
+        return annotation.__name__
+    return str(annotation)
+
+
+def _render_annotation(annotation: Any, style: str = 'param', linked: str|None = None) -> str:
+    """Returns the formatted annotation, caching the result since the
+        same (often deeply nested) annotations repeat across members.
+    """
+    # equal annotations like Optional[X] and X | None, or 1 and True,
+    # render differently
+    key = (style, type(annotation), annotation, linked)
+    try:
+        return _annotation_cache[key]
+    except KeyError:
+        rendered = _format_annotation(annotation, style, linked)
+        _annotation_cache[key] = rendered
+        return rendered
+    except TypeError:
+        # unhashable annotation
+        return _format_annotation(annotation, style, linked)
+
+
+def _module_namespace(module_name: str|None) -> dict|None:
+    """Returns the (cached) global namespace of a module by name. Modules
+        that are not imported yet are looked up again next time.
+    """
+    if module_name in _namespace_cache:
+        return _namespace_cache[module_name]
+    module = sys.modules.get(module_name) if module_name else None
+    namespace = getattr(module, '__dict__', None)
+    if namespace is not None:
+        _namespace_cache[module_name] = namespace
+    return namespace
+
+
+def _resolve_annotations(obj: Any, annotations: dict) -> dict:
+    """Resolves str annotations (e.g. from `from __future__ import
+        annotations`) with typing.get_type_hints, only if there are any.
+        Annotations that cannot be resolved are returned unchanged.
+    """
+    if not any(type(a) is str for a in annotations.values()):
+        return annotations
+    namespace = None if isinstance(obj, type) else _module_namespace(getattr(obj, '__module__', None))
+    try:
+        hints = get_type_hints(obj, globalns=namespace)
+    except Exception:
+        return annotations
+    return {
+        k: hints[k] if k in hints and hints[k] is not type(None) else v
+        for k, v in annotations.items()
+    }
+
+
+def _exported_members(module: ModuleType, exports: list[str],
+                      options: Options) -> tuple[list[tuple[str, Any]], list[str]]:
+    """Returns the (name, item) pairs of the names declared in __all__,
+        in declared order, and, if options['list_undeclared'] is set, the
+        other public names of the module. Undeclared names are never
+        looked up.
+    """
+    namespace = module.__dict__
+    members = []
+    for name in dict.fromkeys(exports):
+        if name in namespace:
+            members.append((name, namespace[name]))
+        elif hasattr(module, name):
+            # e.g. provided lazily by a module __getattr__
+            members.append((name, getattr(module, name)))
+    undeclared = []
+    if options.list_undeclared:
+        declared = set(exports)
+        include_private, include_dunder = options.include_private, options.include_dunder
+        undeclared = [
+            name for name in namespace
+            if name not in declared and name not in options.exclude_names
+            and (name[:1] != '_' or include_private or include_dunder)
+            and (name[:2] != '__' or include_dunder)
+        ]
+    return members, undeclared
+
+
+class Inventory:
+    """External symbols from a local inventory file, mapping qualified
+        names to the urls of their documentation: an intersphinx
+        objects.inv (version 2) or an autodox inventory written by
+        Inventory.write. Nothing is read until the first lookup; autodox
+        inventories are then memory-mapped and binary searched in place
+        without loading them, and objects.inv files are decompressed
+        into a dict once. Lookups are memoized. Relative urls are joined
+        to base_url. Close the inventory, or use it as a context
+        manager, to unmap the file.
+    """
+    header = b'# autodox inventory version 1\n'
+
+    def __init__(self, path: str, base_url: str = '') -> None:
+        self.path = path
+        self.base_url = base_url
+        self._data = None
+        self._names = None
+        self._found = {}
+
+    def _load(self) -> None:
+        with open(self.path, 'rb') as f:
+            first = f.readline()
+            if first == self.header:
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                return
+            if first != b'# Sphinx inventory version 2\n':
+                raise ValueError(f'{self.path} is not a supported inventory')
+            for _ in range(3):
+                f.readline()
+            lines = zlib.decompress(f.read()).decode().splitlines()
+        self._names = {}
+        for line in lines:
+            match = _sphinx_entry.match(line)
+            if not match or not match.group(2).startswith('py:'):
+                continue
+            name, _, _, uri = match.groups()
+            if uri.endswith('$'):
+                uri = uri[:-1] + name
+            self._names.setdefault(name, uri)
+
+    def close(self) -> None:
+        """Unmaps an autodox inventory; it is mapped again by the next
+            lookup that is not memoized.
+        """
+        if self._data is not None:
+            self._data.close()
+            self._data = None
+
+    def __enter__(self) -> 'Inventory':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _search(self, name: bytes) -> str|None:
+        """Binary searches the sorted lines of a mapped autodox
+            inventory for name.
+        """
+        data = self._data
+        low, high = len(self.header), len(data)
+        while low < high:
+            start = data.rfind(b'\n', low, (low + high) // 2) + 1 or low
+            end = data.find(b'\n', start)
+            end = len(data) if end < 0 else end
+            key, _, uri = data[start:end].partition(b'\t')
+            if key == name:
+                return uri.decode()
+            if key < name:
+                low = end + 1
+            else:
+                high = start
+        return None
+
+    def get(self, qualname: str) -> str|None:
+        """Returns the url of the named symbol or None."""
+        if qualname in self._found:
+            return self._found[qualname]
+        if self._data is None and self._names is None:
+            self._load()
+        if self._names is not None:
+            uri = self._names.get(qualname)
+        else:
+            uri = self._search(qualname.encode())
+        url = None if uri is None else _join_url(self.base_url, uri)
+        self._found[qualname] = url
+        return url
+
+    def items(self) -> Iterator[tuple[str, str]]:
+        """Yields every (qualified name, relative url) pair."""
+        if self._data is None and self._names is None:
+            self._load()
+        if self._names is not None:
+            yield from self._names.items()
+            return
+        for line in self._data[len(self.header):].decode().splitlines():
+            name, _, uri = line.partition('\t')
+            yield name, uri
+
+    @classmethod
+    def write(cls, path: str, links: dict[str, str]) -> None:
+        """Writes an autodox inventory of the qualified names and
+            (relative) urls in links, e.g. converted from an objects.inv
+            with `Inventory.write(path, dict(Inventory(inv).items()))`.
+        """
+        lines = sorted([
+            f'{name}\t{url}'.encode() for name, url in links.items()
+            if '\t' not in name and '\n' not in name + url
+        ], key=lambda line: line.split(b'\t', 1)[0])
+        with open(path, 'wb') as f:
+            f.write(cls.header + b''.join([line + b'\n' for line in lines]))
+
+
+def _join_url(base_url: str, uri: str) -> str:
+    """Joins a relative uri from an inventory to its base url."""
+    if not base_url or '://' in uri:
+        return uri
+    return base_url.rstrip('/') + '/' + uri
+
+
+class SymbolTable:
+    """Maps the qualified names of documented modules and classes to
+        their anchors as they are documented. References to classes in
+        annotations and defaults are resolved against it with one pass
+        over the documentation once everything has been documented, and
+        the names that could not be resolved are collected. Names that
+        are not documented are looked up in the external inventories,
+        in order.
+    """
+    def __init__(self, inventories: list[Inventory]|None = None) -> None:
+        self.anchors = {}
+        self.unresolved = {}
+        self.inventories = list(inventories) if inventories is not None else []
+
+    def add(self, qualname: str, anchor: str) -> None:
+        """Records the anchor of a documented module or class."""
+        self.anchors[qualname] = anchor
+
+    def resolve(self, text: str, link: Callable[[str], str]|None = None) -> str:
+        """Replaces the symbol references in text with links to the
+            documented symbols, or with their names if they are
+            unresolved. The link function returns the link target for
+            an anchor; by default, '#{anchor}'. References are marked
+            '\\x01{qualified name}\\x02{text}\\x01' in code spans and
+            '\\x03{qualified name}\\x02{text}\\x03' elsewhere.
+        """
+        anchors = self.anchors
+        unresolved = self.unresolved
+        def replace(match: re.Match) -> str:
+            marker, qualname, display = match.groups()
+            anchor = anchors.get(qualname)
+            if anchor is not None:
+                target = link(anchor) if link else f'#{anchor}'
+            else:
+                target = self.external(qualname)
+            if target is None:
+                unresolved[qualname] = unresolved.get(qualname, 0) + 1
+                return display
+            if marker == '\x01':
+                return f'`[`{display}`]({target})`'
+            return f'[{display}]({target})'
+        return _symbol_marker.sub(replace, text)
+
+    def external(self, qualname: str) -> str|None:
+        """Returns the url of a symbol from the first inventory that has
+            it, or None.
+        """
+        for inventory in self.inventories:
+            url = inventory.get(qualname)
+            if url is not None:
+                return url
+        return None
+
+    def report(self) -> str:
+        """Returns a report of the unresolved references, most frequently
+            referenced first.
+        """
+        names = sorted(self.unresolved.items(), key=lambda item: (-item[1], item[0]))
+        return ''.join([f'- {name} ({count})\n' for name, count in names])
+
+
+def _symbol_options(options: Options, symbols: 'SymbolTable') -> Options:
+    """Returns options that record into symbols. Sections passed to a
+        writer other than a ShardWriter are resolved as they are written,
+        so they can only link to symbols documented before them.
+    """
+    writer = options.writer
+    if isinstance(writer, ShardWriter):
+        writer.symbols = symbols
+    elif writer is not None:
+        def writer(text: str, *args, write: Callable = writer) -> None:
+            write(symbols.resolve(text), *args)
+    return options.derive(symbols=symbols, writer=writer)
+
+
+def _resolving(document: Callable, item: Any, options: Options) -> str:
+    """Documents an item with document (dox_a_module, dox_a_class, or
+        dox_a_function) as the entry point of a run that links symbols:
+        references are collected in options['symbols'] (or a new
+        SymbolTable) and resolved in the returned documentation.
+    """
+    symbols = options.symbols or SymbolTable()
+    token = _symbol_tables.set((symbols,))
+    try:
+        return symbols.resolve(document(item, _symbol_options(options, symbols)))
+    finally:
+        _symbol_tables.reset(token)
 
 
-def dox_a_module(module: ModuleType, options: dict = {}) -> str:
+def dox_a_module(module: ModuleType, options: dict|Options = {}) -> str:
     """Iterates over a module, collects information about its parts, and
         returns a str containing markdown documentation generated from
-        types, annotations, and docstrings.
+        types, annotations, and docstrings. If options['writer'] is set,
+        the documentation is instead passed to the writer one section
+        at a time in document order and an empty str is returned.
     """
     _debug(1, 'dox_a_module(', getattr(module, '__name__', '[unnamed]'), options, ')')
-    module, options = _invoke_handler(Event.BEFORE_MODULE, module, options)
-    exclude_names = options['exclude_names'] if 'exclude_names' in options else []
-    exclude_types = options['exclude_types'] if 'exclude_types' in options else []
-    header_level = options['header_level'] if 'header_level' in options else 0
-    function_format = options['function_format'] if 'function_format' in options else 'header'
-    value_format = options['value_format'] if 'value_format' in options else 'list'
-    include_private = 'include_private' in options
-    include_dunder = 'include_dunder' in options
-    include_submodules = 'include_submodules' in options
-    document_submodules = 'document_submodules' in options
-    suboptions = {**options, 'header_level': header_level + 2}
+    options = _options(options)
+    if options.deduplicate and _locations.get() is None:
+        token = _locations.set((frozenset([module.__name__]), {}))
+        try:
+            return dox_a_module(module, options)
+        finally:
+            _locations.reset(token)
 
-    values = []
-    functions = []
-    classes = []
-    submodules = []
+    if (options.cross_references or options.symbols is not None) and not _symbol_tables.get():
+        return _resolving(dox_a_module, module, options)
 
-    for name, item in module.__dict__.items():
-        item_type = type(item)
+    if Event.BATCH.name not in _handlers:
+        return _dox_a_module(module, options)
 
-        if name[:1] == '_' and not (include_private or include_dunder):
-            continue
-        if name[:2] == '__' and not include_dunder:
-            continue
-        if name in exclude_names:
-            continue
-        if hasattr(item_type, '__name__') and item_type.__name__ in exclude_types:
-            continue
+    tokens = _collect_fragments(module)
+    try:
+        return _dox_a_module(module, options)
+    finally:
+        _fragments.reset(tokens[0])
+        _fragment_names.reset(tokens[1])
+
+
+def _collect_fragments(module: ModuleType) -> tuple:
+    """Starts collecting the fragments of a module for the BATCH
+        handler and returns the tokens to reset the collection with.
+    """
+    return (
+        _fragments.set(_fragments.get() + ([],)),
+        _fragment_names.set(_fragment_names.get() + (getattr(module, '__name__', '{unknown/unnamed}'),)),
+    )
+
+
+def _dox_a_module(module: ModuleType, options: dict|Options) -> str:
+    """Documents a module as described in dox_a_module. If fragments
+        are being collected, the BATCH handler is invoked on them before
+        the module is assembled.
+    """
+    module, options = _invoke_before_handler(Event.BEFORE_MODULE, module, _options(options))
+    members, undeclared = _module_members(module, options)
+    low_memory = options.low_memory or options.evict_modules
+    if not low_memory:
+        docs = [
+            function(item, member_options) if function else item
+            for _, function, item, member_options in members
+        ]
+    else:
+        docs = []
+        for i, (group, function, item, member_options) in enumerate(members):
+            docs.append(function(item, member_options) if function else item)
+            if group == 'submodules' and function is not None:
+                # drop the documented subtree
+                members[i] = (group, function, None, member_options)
+                name, item = item.__name__, None
+                _release_module(name, options)
+    doc, deferred = _finish_module(module, options, members, docs, undeclared)
+    del members, docs
+
+    if not low_memory:
+        for submodule, suboptions in deferred:
+            dox_a_module(submodule, suboptions)
+        return doc
+
+    deferred.reverse()
+    while deferred:
+        submodule, suboptions = deferred.pop()
+        dox_a_module(submodule, suboptions)
+        name = submodule.__name__
+        del submodule
+        _release_module(name, suboptions)
+
+    return doc
+
+
+def _release_module(name: str, options: Options) -> None:
+    """Called by low_memory runs once a module (and its documented
+        submodules) has been documented and its references dropped. If
+        options['evict_modules'] is set, removes the module and its
+        submodules from sys.modules and from their parent packages
+        unless they were loaded before the run started. Collects
+        garbage and clears the caches every _gc_interval modules.
+    """
+    preloaded = _preloaded.get()
+    if options.evict_modules and preloaded is not None:
+        prefix = f'{name}.'
+        # copied at once since prefetched imports may add modules
+        for key in [k for k in list(sys.modules) if (k == name or k.startswith(prefix)) and k not in preloaded]:
+            module = sys.modules.pop(key)
+            parent, _, child = key.rpartition('.')
+            if parent and getattr(sys.modules.get(parent), child, None) is module:
+                delattr(sys.modules[parent], child)
+            _namespace_cache.pop(key, None)
+            module = None
+    released = _released.get()
+    if released is None:
+        return
+    released[0] += 1
+    if released[0] >= _gc_interval:
+        released[0] = 0
+        _annotation_cache.clear()
+        _namespace_cache.clear()
+        gc.collect()
+        _debug(1, 'gc checkpoint: peak RSS', peak_rss())
+
+
+def peak_rss() -> int|None:
+    """Returns the peak resident set size of the process in bytes, or
+        None if the platform does not report it.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _module_members(module: ModuleType, options: Options) -> tuple[list[tuple], list[str]]:
+    """Selects the members of a module to document and returns them as
+        (group, dox function, item, options) tuples in module order,
+        along with the undeclared names if options['list_undeclared'] is
+        set. Members without a dox function are documented by the item
+        itself: a str, or a submodule to be documented after the module
+        has been written.
+    """
+    header_level = options.header_level
+    include_submodules = options.include_submodules
+    document_submodules = options.document_submodules
+    writer = options.writer
+    suboptions = options.derive(header_level=header_level + 2)
+    function_options = suboptions.derive(format=options.function_format)
+    value_table = options.value_format == 'table'
+    # table rows have no format of their own
+    value_options = suboptions if value_table else suboptions.derive(format=options.value_format)
+    locations = _locations.get() if options.deduplicate else None
+
+    selected = []
+    members, undeclared = _selected_members(module, options)
+
+    for name, item in members:
+        if locations is not None and (isinstance(item, type) or type(item) is FunctionType):
+            where = _rendered_elsewhere(module, name, item, options, locations)
+            if where is not None:
+                group = 'classes' if isinstance(item, type) else 'functions'
+                alias_options = suboptions if group == 'classes' else function_options
+                selected.append((group, _dox_an_alias, (name, item, where), alias_options))
+                continue
 
         if isinstance(item, ModuleType):
             if include_submodules and not document_submodules:
-                submodules.append(f'- {name}')
+                selected.append(('submodules', None, f'- {name}', None))
+            elif document_submodules and writer is not None:
+                # documented after this module has been written
+                selected.append(('submodules', None, item, suboptions))
             elif document_submodules:
-                doc = dox_a_module(item, suboptions)
-                submodules.append(doc)
+                selected.append(('submodules', dox_a_module, item, suboptions))
             continue
 
         if isinstance(item, type):
-            doc = dox_a_class(item, suboptions)
-            if doc:
-                classes.append(doc)
+            selected.append(('classes', dox_a_class, item, suboptions))
             continue
 
         if type(item) is type(dox_a_module):
-            doc = dox_a_function(item, {**suboptions, 'format': function_format})
-            functions.append(doc)
+            selected.append(('functions', dox_a_function, item, function_options))
+            continue
+
+        if value_table:
+            # rendered as table rows without per value options or hooks
+            selected.append(('values', _table_row, item, name))
             continue
 
-        doc = dox_a_value(item, {**suboptions, 'name': name, 'format': value_format})
-        values.append(doc)
+        selected.append(('values', dox_a_value, item, value_options.derive(name=name)))
+
+    return selected, undeclared
+
+
+def _rendered_elsewhere(module: ModuleType, name: str, item: Any, options: Options,
+                        locations: tuple[frozenset, dict]) -> str|None:
+    """Returns the name of the module in which a class or function is
+        rendered in full if that is not the given one, or None. Items
+        are rendered at their canonical location (__module__ and
+        __qualname__) if the run documents it and the options select
+        them there, and otherwise at the first location the run
+        encounters them.
+    """
+    module_name = module.__name__
+    canonical = getattr(item, '__module__', None)
+    qualname = getattr(item, '__qualname__', None)
+    if type(canonical) is not str or type(qualname) is not str:
+        return None
+    if canonical == module_name and qualname == name:
+        return None
+    names, rendered = locations
+    if '.' not in qualname and _documented_by_run(canonical, names, options):
+        if _selected_in(_find_module(canonical, module, options), qualname, item, options):
+            return canonical
+    if id(item) in rendered and rendered[id(item)][0] is item:
+        return rendered[id(item)][1]
+    # the item is kept so that its id is not reused
+    rendered[id(item)] = (item, module_name)
+    return None
+
+
+def _find_module(name: str, start: ModuleType, options: Options) -> ModuleType|None:
+    """Returns the named module: the given one or one of its submodules,
+        one that is already imported, or one that is imported now (as the
+        run would later). When rendering options['snapshot'], the module
+        is its stand-in, and nothing is imported.
+    """
+    if name == start.__name__ or name.startswith(f'{start.__name__}.'):
+        module = start
+        for part in name[len(start.__name__):].split('.')[1:]:
+            module = getattr(module, part, None)
+        if isinstance(module, ModuleType) and module.__name__ == name:
+            return module
+    if 'snapshot' in options:
+        try:
+            return options['snapshot'].module(name)
+        except ModuleNotFoundError:
+            return None
+    if name in sys.modules:
+        return sys.modules[name]
+    try:
+        return import_module(name)
+    except Exception as e:
+        _debug(1, '_find_module: cannot import', name, e)
+        return None
+
+
+def _selected_in(module: ModuleType|None, name: str, item: Any, options: Options) -> bool:
+    """Returns True if documenting the module with the options renders
+        the item under the name.
+    """
+    if module is None or getattr(module, name, None) is not item:
+        return False
+    exports = module.__dict__.get('__all__') if options.use_all else None
+    if exports is not None and name not in exports:
+        return False
+    return _selected(name, item, exports is not None, options)
+
 
-    doc = _header(module.__name__, header_level)
+def _documented_by_run(module_name: str, names: frozenset, options: Options) -> bool:
+    """Returns True if the run documents the named module, either as
+        one of its names or as a public submodule of one of them.
+    """
+    if module_name in names:
+        return True
+    if not options.document_submodules:
+        return False
+    parts = module_name.split('.')
+    for i in range(len(parts) - 1, 0, -1):
+        if '.'.join(parts[:i]) in names:
+            return options.include_private or all([p[:1] != '_' for p in parts[i:]])
+    return False
+
+
+def _dox_an_alias(alias: tuple[str, Any, str], options: Options) -> str:
+    """Documents a deduplicated class or function that is rendered in
+        full elsewhere as a short entry that links to it: to the class
+        itself, or to the module the function is documented in.
+    """
+    name, item, where = alias
+    qualname = f'{item.__module__}.{item.__qualname__}'
+    _debug(1, '_dox_an_alias(', name, qualname, where, ')')
+    target = qualname if isinstance(item, type) else where
+    display = f'`{qualname}`'
+    if options.symbols is not None:
+        reference = f'\x03{target}\x02{display}\x03'
+    else:
+        # deduplicate implies anchors
+        reference = f'[{display}](#{_anchor(target)})'
+
+    match options.format if not isinstance(item, type) else 'header':
+        case 'header':
+            return _header(f'`{name}`', options.header_level) + \
+                _paragraph(f'Alias of {reference}.', options)
+        case 'paragraph':
+            return _paragraph(f'`{name}`: alias of {reference}.', options)
+        case _:
+            return _list(f'`{name}`: alias of {reference}.', options)
+
+
+def _selected_members(module: ModuleType, options: Options) -> tuple[list[tuple[str, Any]], list[str]]:
+    """Returns the (name, item) pairs of a module that are not excluded
+        by the options, in module (or __all__) order, along with the
+        undeclared names if options['list_undeclared'] is set.
+    """
+    undeclared = []
+    exports = module.__dict__.get('__all__') if options.use_all else None
+    if exports is not None:
+        members, undeclared = _exported_members(module, exports, options)
+    else:
+        # copied at once since prefetched imports may add submodules
+        members = [*module.__dict__.items()]
+
+    selected = [
+        (name, item) for name, item in members
+        if _selected(name, item, exports is not None, options)
+    ]
+    return selected, undeclared
+
+
+def _selected(name: str, item: Any, exported: bool, options: Options) -> bool:
+    """Returns True if a member is not excluded by the options. Private
+        names are only excluded if the member is not exported by
+        __all__.
+    """
+    if not exported and name[:1] == '_' and not (options.include_private or options.include_dunder):
+        return False
+    if not exported and name[:2] == '__' and not options.include_dunder:
+        return False
+    if name in options.exclude_names:
+        return False
+    item_type = type(item)
+    if hasattr(item_type, '__name__') and item_type.__name__ in options.exclude_types:
+        return False
+    return True
+
+
+def _finish_module(module: ModuleType, options: Options, members: list[tuple],
+                   docs: list, undeclared: list[str]) -> tuple[str, list[tuple[ModuleType, Options]]]:
+    """Assembles the documentation of a module from the docs of its
+        members and returns it (or writes it if options['writer'] is set
+        and returns an empty str) along with the (submodule, options)
+        pairs that remain to be documented.
+    """
+    header_level = options.header_level
+    function_format = options.function_format
+    writer = options.writer
+    symbols = options.symbols
+    anchors = options.anchors or options.deduplicate or writer is not None or symbols is not None
+
+    values = []
+    functions = []
+    classes = []
+    submodules = []
+    deferred = []
+    for (group, function, item, member_options), doc in zip(members, docs):
+        if group == 'classes':
+            if doc and function is _dox_an_alias:
+                classes.append((None, doc))
+            elif doc:
+                classes.append((item, doc))
+        elif group == 'functions':
+            functions.append(doc)
+        elif group == 'values':
+            values.append(doc)
+        else:
+            submodules.append(doc)
+            if isinstance(doc, ModuleType):
+                deferred.append((doc, member_options))
+
+    # each section is [text, title, anchor, header_level]; sections only
+    # begin at module and class boundaries
+    anchor = _anchor(module.__name__) if anchors else None
+    if symbols is not None:
+        symbols.add(module.__name__, anchor)
+    doc = _header(module.__name__, header_level, anchor)
+    sections = [[doc, module.__name__, anchor, header_level]]
 
     if hasattr(module, '__doc__') and module.__doc__:
-        doc += _paragraph(module.__doc__, options)
+        sections[-1][0] += _paragraph(module.__doc__, options)
 
     if len(classes):
-        doc += _header('Classes', header_level + 1)
-        for cls in classes:
-            doc += cls
+        sections[-1][0] += _header('Classes', header_level + 1)
+        for cls, doc in classes:
+            if cls is None:
+                # an alias continues the previous section
+                sections[-1][0] += doc
+                continue
+            name = f'{getattr(cls, "__module__", module.__name__)}.{cls.__qualname__}'
+            sections.append([doc, name, _anchor(name) if anchors else None, header_level + 2])
+
+    doc = ''
 
     if len(functions):
         doc += _header('Functions', header_level + 1)
@@ -204,31 +1349,183 @@ def dox_a_module(module: ModuleType, options: dict = {}) -> str:
 
     if len(values):
         doc += _header('Values', header_level + 1)
-        for val in values:
-            doc += val
+        if options.value_format == 'table':
+            doc += '| Name | Type | Value |\n| --- | --- | --- |\n' + ''.join(values) + '\n'
+        else:
+            for val in values:
+                doc += val
+
+    if len(undeclared):
+        doc += _header('Undeclared', header_level + 1)
+        for name in undeclared:
+            doc += _list(f'`{name}`')
+        doc += '\n'
 
     if len(submodules):
         doc += _header('Submodules', header_level + 1)
         for sub in submodules:
-            doc += sub
+            if type(sub) is str:
+                doc += sub
+
+    if doc:
+        sections.append([doc, None, None, header_level])
+
+    if _fragments.get():
+        texts = _invoke_batch_handler(_fragments.get()[-1], [s[0] for s in sections])
+        for section in sections:
+            section[0] = _assemble(section[0], texts)
+
+    if writer is None:
+        return _invoke_handler(Event.AFTER_MODULE, ''.join([s[0] for s in sections])), deferred
+
+    if Event.AFTER_MODULE.name in _handlers:
+        doc = _invoke_handler(Event.AFTER_MODULE, ''.join([s[0] for s in sections]))
+        sections = _split_sections(doc, sections)
+    for text, title, anchor, level in sections:
+        writer(text, title, anchor, level)
+
+    return '', deferred
+
+
+def _split_sections(doc: str, sections: list[list]) -> list[list]:
+    """Splits the documentation of a module returned by the AFTER_MODULE
+        handler back into sections at the headers that began them, so
+        that the writer still receives the class boundaries. A section
+        whose header the handler changed or removed stays part of the
+        previous one.
+    """
+    split = [[*sections[0]]]
+    start = 0
+    for text, title, anchor, level in sections[1:]:
+        head, blank, _ = text.partition('\n\n')
+        position = doc.find(head + blank, start + 1)
+        if position < 0:
+            continue
+        split[-1][0] = doc[start:position]
+        split.append([text, title, anchor, level])
+        start = position
+    split[-1][0] = doc[start:]
+    return split
+
+
+class ShardWriter:
+    """Writer for dox_a_module that splits the documentation into
+        size-capped shards at module and class boundaries and builds
+        a table of contents as sections are written.
+    """
+    def __init__(self, name: str, max_size: int = 1_000_000) -> None:
+        self.name = name
+        self.max_size = max_size
+        self.shards = [[]]
+        self.sizes = [0]
+        self.toc = []
+        self.anchors = {}
+        self.symbols = None
+
+    def __call__(self, text: str, title: str|None = None,
+                 anchor: str|None = None, level: int = 0) -> None:
+        size = len(text.encode())
+        if self.sizes[-1] and self.sizes[-1] + size > self.max_size:
+            self.shards.append([])
+            self.sizes.append(0)
+        self.shards[-1].append(text)
+        self.sizes[-1] += size
+        if anchor:
+            self.anchors[anchor] = len(self.shards) - 1
+            self.toc.append((title, anchor, level))
+
+    def filename(self, shard: int|None = None) -> str:
+        """Returns the file name of a shard or of the index if shard is
+            None.
+        """
+        if shard is None:
+            return f'{self.name}.md'
+        return f'{self.name}-{shard+1:04}.md'
+
+    def link(self, anchor: str) -> str:
+        """Returns a link target for an anchor that works across shards.
+            Anchors that did not start a section are assumed to be in
+            the current shard.
+        """
+        if anchor not in self.anchors:
+            return f'#{anchor}'
+        return f'{self.filename(self.anchors[anchor])}#{anchor}'
+
+    def files(self) -> dict[str, str]:
+        """Returns the index and shards as a dict mapping file name to
+            contents.
+        """
+        min_level = min([level for _, _, level in self.toc], default=0)
+        index = ''.join([
+            '  ' * (level - min_level) + f'- [{title}]({self.link(anchor)})\n'
+            for title, anchor, level in self.toc
+        ])
+        files = {self.filename(): index}
+        count = len(self.shards)
+        for i, shard in enumerate(self.shards):
+            nav = [f'[Contents]({self.filename()})']
+            if i > 0:
+                nav.insert(0, f'[Previous]({self.filename(i-1)})')
+            if i < count - 1:
+                nav.append(f'[Next]({self.filename(i+1)})')
+            text = ''.join(shard)
+            if self.symbols is not None:
+                text = self.symbols.resolve(text, self.link)
+            files[self.filename(i)] = text + ' | '.join(nav) + '\n'
+        return files
+
+
+def dox_a_module_sharded(module: ModuleType, options: dict|Options = {}) -> dict[str, str]:
+    """Documents a module into size-capped shards with a table of
+        contents. The maximum shard size in bytes is taken from
+        options['shard_size']. Returns a dict mapping file name to
+        contents; the table of contents is in the '{module}.md' file.
+    """
+    _debug(1, 'dox_a_module_sharded(', getattr(module, '__name__', '[unnamed]'), options, ')')
+    options = _options(options)
+    writer = ShardWriter(module.__name__, options.shard_size)
+    dox_a_module(module, options.derive(writer=writer))
+    return writer.files()
 
-    return _invoke_handler(Event.AFTER_MODULE, doc)
 
+def _table_value(value: Any) -> str:
+    """Returns the repr of a simple value as a table cell, or an empty
+        str for other values.
+    """
+    if isinstance(value, Enum):
+        value = value.value
+    if type(value) not in (int, float, complex, bool, str, bytes, NoneType):
+        return ''
+    rendered = repr(value)
+    if len(rendered) > 60:
+        rendered = rendered[:57] + '...'
+    return '`' + rendered.replace('|', '\\|').replace('`', "'") + '`'
 
-def dox_a_value(value: Any, options: dict = {}) -> str:
+
+def _table_row(value: Any, name: str) -> str:
+    """Returns a markdown table row with the name, type, and (simple)
+        value of a value for the 'table' value_format.
+    """
+    return f'| `{name}` | {type(value).__name__} | {_table_value(value)} |\n'
+
+
+def dox_a_value(value: Any, options: dict|Options = {}) -> str:
     """Collects some information about a value and returns it formatted
         as specified in the options or as a list.
     """
     _debug(1, 'dox_a_value(', value, options, ')')
-    value, options = _invoke_handler(Event.BEFORE_VALUE, value, options)
-    header_level = options['header_level'] if 'header_level' in options else 0
-    format = options['format'] if 'format' in options else 'list'
+    value, options = _invoke_before_handler(Event.BEFORE_VALUE, value, _options(options))
+    header_level = options.header_level
+    format = options.format
 
-    name = value.__name__ if hasattr(value, '__name__') else '{unknown/unnamed}'
-    if 'name' in options:
-        name = options['name']
+    name = options.name
+    if name is None:
+        name = value.__name__ if hasattr(value, '__name__') else '{unknown/unnamed}'
     type_str = type(value).__name__
     doc = ''
+    names = _fragment_names.get()
+    if names:
+        _fragment_names.set(names + (f'{names[-1]}.{name}',))
 
     match format:
         case 'header':
@@ -238,27 +1535,49 @@ def dox_a_value(value: Any, options: dict = {}) -> str:
         case _:
             doc = _list(f'`{name}`: {type_str}')
 
-    return _invoke_handler(Event.AFTER_VALUE, doc)
+    if names:
+        _fragment_names.set(names)
+    return _invoke_after_handler(Event.AFTER_VALUE, doc)
+
+
+def _source_link(item: Any, options: Options) -> str|None:
+    """Returns a markdown link to the source of a class or function
+        made from options['source_url'], or None if its source cannot be
+        found. Source files are indexed once and the indexes are cached
+        in options['source_cache'], if set.
+    """
+    from .sources import source_link
+    url = source_link(item, options.source_url, options.source_cache)
+    return f'[source]({url})' if url else None
 
 
-def dox_a_function(function: Callable, options: dict = {}) -> str:
+def dox_a_function(function: Callable, options: dict|Options = {}) -> str:
     """Collects some information about a function and returns it
         formatted as specified in the options or as a list.
     """
     _debug(1, 'dox_a_function(', getattr(function, '__name__', '[unnamed function]'), options, ')')
-    function, options = _invoke_handler(Event.BEFORE_FUNCTION, function, options)
-    header_level = options['header_level'] if 'header_level' in options else 0
-    format = options['format'] if 'format' in options else 'list'
-    prepend = options['prepend'] if 'prepend' in options else ''
+    options = _options(options)
+    if (options.cross_references or options.symbols is not None) and not _symbol_tables.get():
+        return _resolving(dox_a_function, function, options)
+    function, options = _invoke_before_handler(Event.BEFORE_FUNCTION, function, options)
+    header_level = options.header_level
+    format = options.format
+    prepend = options.prepend
 
     if iscoroutinefunction(function):
         prepend = f'{prepend}async ' if prepend else 'async '
 
     name = function.__name__ if hasattr(function, '__name__') else '{unknown/unnamed}'
     annotations = function.__annotations__ if hasattr(function, '__annotations__') else {}
+    annotation_style = 'param'
+    if options.resolve_annotations and annotations:
+        # resolved generics would otherwise be rendered by __name__ alone
+        annotations = _resolve_annotations(function, annotations)
+        annotation_style = 'return'
+    linked = 'code' if options.symbols is not None else None
     return_annotation = annotations['return'] if 'return' in annotations else None
     annotations = [
-        f'{key}: {value.__name__ if hasattr(value, "__name__") else str(value)}'
+        f'{key}: {_render_annotation(value, annotation_style, linked)}'
         for key, value in annotations.items()
         if key != 'return'
     ]
@@ -282,7 +1601,7 @@ def dox_a_function(function: Callable, options: dict = {}) -> str:
             if type(defaults[i]) is str:
                 annotations[i+offset] += f" = '{defaults[i]}'"
             elif type(defaults[i]) is type:
-                annotations[i+offset] += f' = {defaults[i].__name__}'
+                annotations[i+offset] += f' = {_render_annotation(defaults[i], "param", linked)}'
             else:
                 annotations[i+offset] += f' = {defaults[i]}'
 
@@ -295,7 +1614,7 @@ def dox_a_function(function: Callable, options: dict = {}) -> str:
                 if type(v) is str:
                     kwannotations.append(annotations[i] + f" = '{v}'")
                 elif type(v) is type:
-                    kwannotations.append(annotations[i] + f" = {v.__name__}")
+                    kwannotations.append(annotations[i] + f" = {_render_annotation(v, 'param', linked)}")
                 else:
                     kwannotations.append(annotations[i] + f" = {v}")
 
@@ -314,31 +1633,40 @@ def dox_a_function(function: Callable, options: dict = {}) -> str:
 
     signature = f'`{prepend}{name}({annotations})'
     if return_annotation:
-        if '[' in str(return_annotation):
-            return_annotation = str(return_annotation)
-        elif hasattr(return_annotation, '__name__'):
-            return_annotation = return_annotation.__name__
-        signature += f' -> {return_annotation}'
+        signature += f' -> {_render_annotation(return_annotation, "return", linked)}'
     signature += ':` ' if format != 'header' else ':`'
 
     doc = ''
+    names = _fragment_names.get()
+    if names:
+        _fragment_names.set(names + (_qualname(function, name),))
+
+    source = _source_link(function, options) if options.source_url is not None else None
 
     match format:
         case 'header':
             doc = _header(signature, header_level)
             if docstring:
                 doc += _paragraph(docstring, options)
+            if source:
+                doc += _paragraph(source, options)
         case 'paragraph':
             doc = _paragraph(signature, options)
             if docstring:
                 doc += _paragraph(docstring, options)
+            if source:
+                doc += _paragraph(source, options)
         case _:
             doc = signature
             if docstring:
                 doc += docstring
+            if source:
+                doc += f' {source}' if docstring else source
             doc = _list(doc)
 
-    return _invoke_handler(Event.AFTER_FUNCTION, doc)
+    if names:
+        _fragment_names.set(names)
+    return _invoke_after_handler(Event.AFTER_FUNCTION, doc)
 
 
 def _dox_properties(properties: dict, header_level: int = 0) -> str:
@@ -385,13 +1713,10 @@ def _dox_properties(properties: dict, header_level: int = 0) -> str:
     return doc
 
 
-def _dox_methods(cls: type, methods: dict, options: dict = {}) -> str:
+def _dox_methods(cls: type, methods: dict, options: Options) -> str:
     """Format a collection of methods/functions."""
     _debug(1, '_dox_methods(', getattr(cls, '__name__', '[unnamed class]'), methods, options, ')')
-    header_level = options['header_level'] if 'header_level' in options else 0
-    header_level += 1
-    suboptions = {**options, 'header_level': header_level}
-    format = options['method_format'] if 'method_format' in options else 'header'
+    suboptions = options.derive(header_level=options.header_level + 1, format=options.method_format)
     doc = ''
 
     dunders = {
@@ -412,20 +1737,25 @@ def _dox_methods(cls: type, methods: dict, options: dict = {}) -> str:
 
     if dunders:
         for _, value in dunders.items():
-            doc += dox_a_function(value, {**suboptions, 'format': format})
+            doc += dox_a_function(value, suboptions)
 
     if publics:
+        classmethod_options, staticmethod_options = None, None
         for name, value in publics.items():
             if isinstance(value, classmethod):
-                doc += dox_a_function(getattr(cls, name), {**suboptions, 'format': format, 'prepend': '@classmethod '})
+                if classmethod_options is None:
+                    classmethod_options = suboptions.derive(prepend='@classmethod ')
+                doc += dox_a_function(getattr(cls, name), classmethod_options)
             elif isinstance(cls.__dict__[name], staticmethod):
-                doc += dox_a_function(value, {**suboptions, 'format': format, 'prepend': '@staticmethod '})
+                if staticmethod_options is None:
+                    staticmethod_options = suboptions.derive(prepend='@staticmethod ')
+                doc += dox_a_function(value, staticmethod_options)
             else:
-                doc += dox_a_function(value, {**suboptions, 'format': format})
+                doc += dox_a_function(value, suboptions)
 
     if privates:
         for _, value in privates.items():
-            doc += dox_a_function(value, {**suboptions, 'format': format})
+            doc += dox_a_function(value, suboptions)
 
     return doc
 
@@ -440,36 +1770,16 @@ def _get_all_annotations(cls: type) -> dict:
     return annotations
 
 
-def dox_a_class(cls: type, options: dict = {}) -> str:
-    """Collects some information about a class and returns a formatted
-        str. Any names specified in options['exclude_names'] and any
-        types specified in options['exclude_types'] will be excluded.
-        Private and dunder methods/properties will be included if
-        options['include_private'] or options['include_dunder'] are
-        specified, respectively.
+def _class_members(cls: type, options: Options) -> tuple[dict, dict]:
+    """Returns the properties and the methods of a class that are not
+        excluded by the options, each as a dict in class order.
     """
-    _debug(1, 'dox_a_class(', getattr(cls, '__name__', '[unnamed class]'), options, ')')
-    cls, options = _invoke_handler(Event.BEFORE_CLASS, cls, options)
-    exclude_names = options['exclude_names'] if 'exclude_names' in options else []
-    header_level = options['header_level'] if 'header_level' in options else 0
-    include_private = 'include_private' in options
-    include_dunder = 'include_dunder' in options
-    suboptions = {**options, 'header_level': header_level + 1}
-
-    classname = cls.__name__ if hasattr(cls, '__name__') else '{unknown/unnamed class}'
-    if classname in exclude_names:
-        return ''
-
-    parent = cls.__base__ if hasattr(cls, '__base__') else None
+    exclude_names = options.exclude_names
+    include_private = options.include_private
+    include_dunder = options.include_dunder
 
     properties = {}
     methods = {}
-    annotations = _get_all_annotations(cls)
-
-    if parent:
-        parent = parent.__name__ if hasattr(parent, '__name__') else str(parent)
-    parent = None if parent == 'object' else parent
-
     for name, item in cls.__dict__.items():
         if name[:1] == '_' and not (include_private or include_dunder) and name != '__init__':
             continue
@@ -490,16 +1800,76 @@ def dox_a_class(cls: type, options: dict = {}) -> str:
         if type(item) is property:
             properties[name] = item
 
-    doc = _header(f'`{classname}({parent})`', header_level) if parent else _header(f'`{classname}`', header_level)
+    return properties, methods
+
+
+def dox_a_class(cls: type, options: dict|Options = {}) -> str:
+    """Collects some information about a class and returns a formatted
+        str. Any names specified in options['exclude_names'] and any
+        types specified in options['exclude_types'] will be excluded.
+        Private and dunder methods/properties will be included if
+        options['include_private'] or options['include_dunder'] are
+        specified, respectively.
+    """
+    _debug(1, 'dox_a_class(', getattr(cls, '__name__', '[unnamed class]'), options, ')')
+    options = _options(options)
+    if (options.cross_references or options.symbols is not None) and not _symbol_tables.get():
+        return _resolving(dox_a_class, cls, options)
+    cls, options = _invoke_before_handler(Event.BEFORE_CLASS, cls, options)
+    header_level = options.header_level
+
+    classname = cls.__name__ if hasattr(cls, '__name__') else '{unknown/unnamed class}'
+    if classname in options.exclude_names:
+        return ''
+
+    parent = cls.__base__ if hasattr(cls, '__base__') else None
+
+    properties, methods = _class_members(cls, options)
+    annotations = _get_all_annotations(cls)
+    annotation_style = 'class'
+    if options.resolve_annotations and annotations:
+        annotations = _resolve_annotations(cls, annotations)
+        annotation_style = 'return'
+
+    if parent:
+        parent = parent.__name__ if hasattr(parent, '__name__') else str(parent)
+    parent = None if parent == 'object' else parent
+
+    names = _fragment_names.get()
+    if names:
+        _fragment_names.set(names + (_qualname(cls, classname),))
+
+    symbols = options.symbols
+    anchor = None
+    if options.anchors or options.deduplicate or options.writer is not None or symbols is not None:
+        qualname = f'{getattr(cls, "__module__", "")}.{getattr(cls, "__qualname__", classname)}'
+        anchor = _anchor(qualname)
+        if symbols is not None:
+            symbols.add(qualname, anchor)
+
+    doc = _header(f'`{classname}({parent})`' if parent else f'`{classname}`', header_level, anchor)
 
     docstring = cls.__doc__ if hasattr(cls, '__doc__') else None
     if docstring:
         doc += _paragraph(docstring, options)
 
+    if options.source_url is not None:
+        source = _source_link(cls, options)
+        if source:
+            doc += _paragraph(source, options)
+
+    if options.value_format == 'table' and isinstance(cls, EnumMeta) and len(cls.__members__):
+        doc += _header('Members', header_level + 1)
+        doc += '| Name | Value |\n| --- | --- |\n' + ''.join([
+            f'| `{name}` | {_table_value(member.value)} |\n'
+            for name, member in cls.__members__.items()
+        ]) + '\n'
+
     if annotations:
+        linked = 'text' if symbols is not None else None
         doc += _header('Annotations', header_level + 1)
         for name, value in annotations.items():
-            doc += _list(f'{name}: {str(value)}')
+            doc += _list(f'{name}: {_render_annotation(value, annotation_style, linked)}')
         doc += '\n'
 
     if properties:
@@ -508,25 +1878,832 @@ def dox_a_class(cls: type, options: dict = {}) -> str:
 
     if methods:
         doc += _header('Methods', header_level + 1)
-        doc += _dox_methods(cls, methods, suboptions)
+        doc += _dox_methods(cls, methods, options.derive(header_level=header_level + 1))
+
+    if names:
+        _fragment_names.set(names)
+    return _invoke_after_handler(Event.AFTER_CLASS, doc)
+
+
+def _enter_async(options: Options) -> tuple|None:
+    """Sets up the event loop and semaphore for the outermost adox_
+        call and returns the tokens to reset them with, or None if they
+        are already set up.
+    """
+    if _event_loop.get() is not None:
+        return None
+    return (
+        _event_loop.set(asyncio.get_running_loop()),
+        _semaphore.set(asyncio.Semaphore(options.concurrency)),
+    )
+
+
+def _exit_async(tokens: tuple|None) -> None:
+    if tokens is not None:
+        _event_loop.reset(tokens[0])
+        _semaphore.reset(tokens[1])
+
+
+async def _in_thread(function: Callable, *args) -> Any:
+    """Runs a synchronous function in a worker thread once the
+        semaphore allows it. Async handlers invoked by the function are
+        run on the event loop.
+    """
+    async with _semaphore.get():
+        return await asyncio.to_thread(function, *args)
+
+
+async def adox_a_module(module: ModuleType, options: dict|Options = {}) -> str:
+    """Coroutine version of dox_a_module that supports async handlers.
+        The members of the module (and documented submodules) are
+        documented concurrently in worker threads, at most
+        options['concurrency'] (default 8) at a time, and the result is
+        identical to that of dox_a_module.
+    """
+    _debug(1, 'adox_a_module(', getattr(module, '__name__', '[unnamed]'), options, ')')
+    options = _options(options)
+    tokens = _enter_async(options)
+    try:
+        if options.deduplicate and _locations.get() is None:
+            token = _locations.set((frozenset([module.__name__]), {}))
+            try:
+                return await adox_a_module(module, options)
+            finally:
+                _locations.reset(token)
+
+        if (options.cross_references or options.symbols is not None) and not _symbol_tables.get():
+            symbols = options.symbols or SymbolTable()
+            token = _symbol_tables.set((symbols,))
+            try:
+                return symbols.resolve(await adox_a_module(module, _symbol_options(options, symbols)))
+            finally:
+                _symbol_tables.reset(token)
+
+        if Event.BATCH.name not in _handlers:
+            return await _adox_a_module(module, options)
+
+        collecting = _collect_fragments(module)
+        try:
+            return await _adox_a_module(module, options)
+        finally:
+            _fragments.reset(collecting[0])
+            _fragment_names.reset(collecting[1])
+    finally:
+        _exit_async(tokens)
+
+
+async def _adox_a_module(module: ModuleType, options: Options) -> str:
+    """Documents a module as described in adox_a_module."""
+    module, options = await _in_thread(_invoke_before_handler, Event.BEFORE_MODULE, module, options)
+    members, undeclared = await _in_thread(_module_members, module, options)
+    docs = await asyncio.gather(*[
+        adox_a_module(item, member_options) if function is dox_a_module
+        else _in_thread(function, item, member_options) if function
+        else asyncio.sleep(0, item)
+        for _, function, item, member_options in members
+    ])
+    doc, deferred = await _in_thread(_finish_module, module, options, members, docs, undeclared)
+    del members, docs
+
+    for submodule, suboptions in deferred:
+        await adox_a_module(submodule, suboptions)
 
-    return _invoke_handler(Event.AFTER_CLASS, doc)
+    return doc
+
+
+async def adox_a_class(cls: type, options: dict|Options = {}) -> str:
+    """Coroutine version of dox_a_class that supports async handlers."""
+    _debug(1, 'adox_a_class(', getattr(cls, '__name__', '[unnamed class]'), options, ')')
+    options = _options(options)
+    tokens = _enter_async(options)
+    try:
+        return await _in_thread(dox_a_class, cls, options)
+    finally:
+        _exit_async(tokens)
+
+
+async def adox_a_function(function: Callable, options: dict|Options = {}) -> str:
+    """Coroutine version of dox_a_function that supports async handlers."""
+    _debug(1, 'adox_a_function(', getattr(function, '__name__', '[unnamed function]'), options, ')')
+    options = _options(options)
+    tokens = _enter_async(options)
+    try:
+        return await _in_thread(dox_a_function, function, options)
+    finally:
+        _exit_async(tokens)
+
+
+def _package_dirs(name: str, search_path: list[str]|None = None) -> list[str]:
+    """Finds the directories of a package (or the file of a module) by
+        scanning the search path the way the import system does, but
+        without importing anything. A regular package or module wins;
+        otherwise all namespace package portions are returned.
+    """
+    parts = name.split('.')
+    portions = []
+    for path in (search_path if search_path is not None else sys.path):
+        candidate = os.path.join(path or '.', *parts)
+        if os.path.isfile(os.path.join(candidate, '__init__.py')):
+            return [candidate]
+        for suffix in all_suffixes():
+            if os.path.isfile(candidate + suffix):
+                return [candidate + suffix]
+        if os.path.isdir(candidate) and candidate not in portions:
+            portions.append(candidate)
+    return portions
+
+
+def _walk_package(dirs: list[str], prefix: str, found: list[str],
+                  namespace_packages: bool = False) -> None:
+    """Adds the names of all submodules in the package directories to
+        found, including namespace packages that contain modules if
+        namespace_packages is set.
+    """
+    for _, name, is_package in iter_modules(dirs, f'{prefix}.'):
+        found.append(name)
+        if is_package:
+            last = name.rpartition('.')[2]
+            _walk_package([
+                os.path.join(d, last) for d in dirs
+                if os.path.isdir(os.path.join(d, last))
+            ], name, found, namespace_packages)
+
+    if not namespace_packages:
+        return
+    for directory in dirs:
+        for entry in sorted(os.listdir(directory)):
+            path = os.path.join(directory, entry)
+            name = f'{prefix}.{entry}'
+            if not entry.isidentifier() or name in found or not os.path.isdir(path) \
+                    or os.path.isfile(os.path.join(path, '__init__.py')):
+                continue
+            submodules = []
+            _walk_package([path], name, submodules, True)
+            if submodules:
+                found.append(name)
+                found.extend(submodules)
+
+
+def discover_modules(name: str, include: list[str] = [], exclude: list[str] = [],
+                     search_path: list[str]|None = None,
+                     namespace_packages: bool = False) -> list[str]:
+    """Lists a package and every submodule in it by scanning the
+        filesystem rather than relying on what the package happens to
+        import. Directories without an __init__.py (e.g. tests or
+        scripts) are only walked as namespace packages if
+        namespace_packages is set. Names are kept if they match any of
+        the include glob patterns (or if there are none) and none of the
+        exclude glob patterns, e.g. 'package.sub.*'. Parents are listed
+        before their submodules. Raises ModuleNotFoundError if the
+        package cannot be found.
+    """
+    _debug(1, 'discover_modules(', name, include, exclude, ')')
+    dirs = _package_dirs(name, search_path)
+    if not dirs:
+        raise ModuleNotFoundError(f'No module named {name!r}', name=name)
+
+    found = [name]
+    if os.path.isdir(dirs[0]):
+        _walk_package(dirs, name, found, namespace_packages)
+
+    found = [
+        n for n in found
+        if (not include or any(fnmatchcase(n, p) for p in include))
+        and not any(fnmatchcase(n, p) for p in exclude)
+    ]
+    return sorted(set(found), key=lambda n: n.split('.'))
+
+
+def _load_module(name: str, options: Options) -> ModuleType:
+    """Imports a module by name, relative to options['package'] if set,
+        or builds it from bytecode if options['bytecode'] is set, or from
+        the Snapshot in options['snapshot'].
+    """
+    package = options['package'] if 'package' in options else None
+    if 'snapshot' in options:
+        return options['snapshot'].module(name)
+    if 'bytecode' in options:
+        from importlib.util import resolve_name
+        from .bytecode import bytecode_module
+        return bytecode_module(resolve_name(name, package) if package else name)
+    return import_module(name, package)
+
+
+def _dox_modules(names: list[str], options: Options) -> Iterator[tuple[str, str]]:
+    """Imports and documents the named modules in order, yielding the
+        name and documentation of each. In low_memory runs, each module
+        is released once the following names are outside of it. If
+        options['checkpoint'] is set, modules recorded in the checkpoint
+        journal at that path are replayed instead of documented.
+    """
+    if 'checkpoint' in options and options.deduplicate:
+        # replayed modules would not record where their items were rendered
+        raise ValueError('checkpoint cannot be combined with deduplicate')
+    token = None
+    if options.deduplicate and _locations.get() is None:
+        token = _locations.set((frozenset(names), {}))
+    try:
+        if 'checkpoint' in options:
+            yield from _resume_modules(names, options)
+            return
+        yield from _document_modules(names, options)
+    finally:
+        if token is not None:
+            _locations.reset(token)
+
+
+def _document_modules(names: list[str], options: Options) -> Iterator[tuple[str, str]]:
+    """Implements _dox_modules without checkpoints."""
+    if options.workers > 1 and len(names) > 1 and not options.deduplicate:
+        # which module renders a deduplicated item depends on the order
+        from .workers import forked_modules
+        yield from forked_modules(names, options, options.get('timings', {}))
+        return
+
+    if options.prefetch and len(names) > 1:
+        prefetcher = _Prefetcher(names, options)
+        load = prefetcher.get
+    else:
+        prefetcher = None
+        load = lambda i: _load_module(names[i], options)
+
+    if not (options.low_memory or options.evict_modules):
+        try:
+            for i, name in enumerate(names):
+                yield (name, dox_a_module(load(i), options))
+        finally:
+            if prefetcher is not None:
+                prefetcher.close()
+        return
+
+    token = _preloaded.set(frozenset(sys.modules)) if _preloaded.get() is None else None
+    # nested runs count towards the gc checkpoints of the outer run
+    released = _released.set([0]) if token is not None else None
+    try:
+        documented = []
+        for i, name in enumerate(names):
+            doc = dox_a_module(load(i), options)
+            following = names[i + 1] if i + 1 < len(names) else ''
+            documented.append(name)
+            while documented and not following.startswith(f'{documented[-1]}.'):
+                _release_module(documented.pop(), options)
+            yield (name, doc)
+    finally:
+        if prefetcher is not None:
+            prefetcher.close()
+        if token is not None:
+            _released.reset(released)
+            _preloaded.reset(token)
+
+
+class _Prefetcher:
+    """Imports the modules that a run will document next in a background
+        thread, at most options['prefetch'] ahead of the module being
+        documented, so that imports overlap with formatting. A module is
+        only imported once the modules of the run that contain it and
+        precede it have been documented. Exceptions raised by an import are re-raised
+        when the run reaches that module; if the thread is ended by
+        anything else (e.g. SystemExit), the remaining modules are
+        imported by the run itself.
+    """
+    def __init__(self, names: list[str], options: Options) -> None:
+        self.names = names
+        self.options = options
+        self.ahead = options.prefetch
+        self.results = {}
+        self.position = 0
+        self.stopped = False
+        self.exited = False
+        self.condition = threading.Condition()
+        self.thread = None
+        # the index after which the outermost containing module listed
+        # before it is documented; containing modules listed after it are
+        # imported along with it, as they would be without prefetching
+        indexes = {name: i for i, name in enumerate(names)}
+        self.after = []
+        for position, name in enumerate(names):
+            parts = name.split('.')
+            self.after.append(max([
+                j for j in [indexes.get('.'.join(parts[:i]), -1) for i in range(1, len(parts))]
+                if j < position
+            ], default=-1))
+
+    def start(self) -> None:
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name='autodox-prefetch', daemon=True)
+            self.thread.start()
+
+    def _ready(self, i: int) -> bool:
+        return self.stopped or (
+            i <= self.position + self.ahead and self.after[i] < self.position
+        )
+
+    def _run(self) -> None:
+        try:
+            for i, name in enumerate(self.names):
+                with self.condition:
+                    self.condition.wait_for(lambda: self._ready(i))
+                    if self.stopped:
+                        return
+                _debug(2, '_Prefetcher importing', name)
+                try:
+                    result = (_load_module(name, self.options), None)
+                except Exception as e:
+                    result = (None, e)
+                with self.condition:
+                    self.results[i] = result
+                    self.condition.notify_all()
+        finally:
+            with self.condition:
+                self.exited = True
+                self.condition.notify_all()
+
+    def get(self, i: int) -> ModuleType:
+        """Returns module i of the run once it has been imported."""
+        self.start()
+        with self.condition:
+            self.position = i
+            self.condition.notify_all()
+            self.condition.wait_for(lambda: i in self.results or self.exited)
+            module, error = self.results.pop(i, (None, None))
+        if module is None and error is None:
+            return _load_module(self.names[i], self.options)
+        if error is not None:
+            raise error
+        return module
+
+    def close(self) -> None:
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+        self.results.clear()
+
+
+class Checkpoint:
+    """Journal of the modules documented by a run, appended to as each
+        module is finished so that an interrupted run can be resumed.
+        Each line is a JSON object; the first identifies the run by its
+        module names, options, and hooks, and every other line records
+        a module's documentation, the sections it passed to the writer,
+        and the symbols it added. A journal from a different run or a
+        torn last line is discarded.
+    """
+    version = 1
+
+    def __init__(self, path: str, names: list[str], options: Options) -> None:
+        self.path = path
+        self.run = {'version': self.version, 'key': _checkpoint_key(names, options)}
+        self.entries = {}
+        valid = 0
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                lines = f.readlines()
+            for i, line in enumerate(lines):
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                if i == 0 and entry != self.run:
+                    break
+                if i > 0:
+                    self.entries[entry['name']] = entry
+                valid += len(line)
+            if not valid:
+                self.entries = {}
+        _debug(1, 'Checkpoint(', path, ') resuming', len(self.entries), 'modules')
+        self.file = open(path, 'r+b' if valid else 'wb')
+        self.file.truncate(valid)
+        self.file.seek(valid)
+        if not valid:
+            self._append(self.run)
+
+    def _append(self, entry: dict) -> None:
+        self.file.write(json.dumps(entry, separators=(',', ':')).encode() + b'\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def record(self, name: str, doc: str, writes: list[list], anchors: dict[str, str]) -> None:
+        """Records that a module has been documented."""
+        entry = {'name': name, 'doc': doc, 'writes': writes, 'anchors': anchors}
+        self.entries[name] = entry
+        self._append(entry)
+
+    def close(self, finished: bool = False) -> None:
+        """Closes the journal, deleting it if the run finished."""
+        self.file.close()
+        if finished:
+            os.remove(self.path)
+
+
+def _handler_key(function: Callable) -> list:
+    """Returns the module, qualified name, and a hash of the bytecode and
+        constants of a handler, which change when the handler does.
+    """
+    code = getattr(function, '__code__', None)
+    if code is not None:
+        constants = [c for c in code.co_consts if not isinstance(c, CodeType)]
+        code = sha256(code.co_code + repr(constants).encode()).hexdigest()
+    return [
+        getattr(function, '__module__', None),
+        getattr(function, '__qualname__', type(function).__qualname__),
+        code,
+    ]
+
+
+def _checkpoint_key(names: list[str], options: Options) -> str:
+    """Returns a str identifying the output of a run of dox_modules."""
+    settings = {
+        k: sorted(v) if k in ('exclude_names', 'exclude_types') else v
+        for k, v in options.to_dict().items()
+        if k not in ('writer', 'symbols', 'snapshot', 'checkpoint', 'workers', 'timings')
+    }
+    # a symbol table turns on cross-references; its inventories decide the links
+    symbols = options.symbols
+    settings['symbols'] = None if symbols is None else [
+        [inventory.path, inventory.base_url] for inventory in symbols.inventories
+    ]
+    handlers = {
+        event: [_handler_key(function) for function in functions]
+        for event, functions in _handler_functions.items()
+    }
+    return json.dumps([names, settings, handlers], sort_keys=True, default=repr)
+
+
+def _resume_modules(names: list[str], options: Options) -> Iterator[tuple[str, str]]:
+    """Implements _dox_modules with the checkpoint journal at the path
+        in options['checkpoint']: recorded modules are replayed in order
+        without being imported, and the rest are documented and recorded.
+        The journal is deleted once every module has been documented.
+    """
+    journal = Checkpoint(options['checkpoint'], names, options)
+    writer, symbols = options.writer, options.symbols
+    writes = []
+    if writer is not None:
+        def record(*args, write: Callable = writer) -> None:
+            writes.append([*args])
+            write(*args)
+        options = options.derive(writer=record)
+
+    remaining = [name for name in names if name not in journal.entries]
+    documented = _document_modules(remaining, options)
+    try:
+        for name in names:
+            if name in journal.entries:
+                entry = journal.entries[name]
+                for args in entry['writes']:
+                    writer(*args)
+                if symbols is not None:
+                    symbols.anchors.update(entry['anchors'])
+                yield (name, entry['doc'])
+                continue
+            count = len(symbols.anchors) if symbols is not None else 0
+            writes.clear()
+            name, doc = next(documented)
+            anchors = dict([*symbols.anchors.items()][count:]) if symbols is not None else {}
+            journal.record(name, doc, [*writes], anchors)
+            yield (name, doc)
+    except BaseException:
+        journal.close()
+        raise
+    finally:
+        documented.close()
+    journal.close(finished=True)
+
+
+def dox_modules(names: list[str], options: dict|Options = {}) -> str:
+    """Imports and documents each of the named modules in order in a
+        single process, e.g. the list returned by discover_modules, and
+        returns the concatenated documentation. Modules imported by
+        several of them are only imported once.
+    """
+    _debug(1, 'dox_modules(', names, options, ')')
+    options = _options(options)
+    if (options.cross_references or options.symbols is not None) and not _symbol_tables.get():
+        symbols = options.symbols or SymbolTable()
+        token = _symbol_tables.set((symbols,))
+        try:
+            return symbols.resolve(dox_modules(names, _symbol_options(options, symbols)))
+        finally:
+            _symbol_tables.reset(token)
+
+    return ''.join([doc for _, doc in _dox_modules(names, options)])
+
+
+def shard_modules(names: list[str], index: int, count: int,
+                  timings: dict[str, float] = {}) -> list[str]:
+    """Splits the modules into count shards balanced by their
+        historical cost in timings (seconds per module name), assigning
+        the most costly modules first, each to the least loaded shard.
+        Modules without a timing cost the average. Returns the names in
+        shard number index (starting at 1), in their original order.
+    """
+    if not 1 <= index <= count:
+        raise ValueError('shard index must be between 1 and the shard count')
+    known = [timings[name] for name in names if name in timings]
+    default = sum(known) / len(known) if known else 1.0
+    costs = {name: timings.get(name, default) for name in names}
+    loads = [0.0] * count
+    assigned = {}
+    for position in sorted(range(len(names)), key=lambda p: (-costs[names[p]], p)):
+        shard = loads.index(min(loads))
+        loads[shard] += costs[names[position]]
+        assigned[position] = shard
+    return [name for position, name in enumerate(names) if assigned[position] == index - 1]
+
+
+def _load_timings(path: str) -> dict[str, float]:
+    """Loads per-module seconds from a JSON file mapping module names
+        to seconds or to objects with a 'total' (e.g. the JSON written
+        by -cost_report=path).
+    """
+    import json
+    with open(path) as f:
+        data = json.load(f)
+    return {
+        name: value['total'] if type(value) is dict else value
+        for name, value in data.items()
+    }
+
+
+def dox_shard(names: list[str], index: int, count: int, options: dict|Options = {},
+              timings: dict[str, float] = {}) -> dict:
+    """Documents shard number index of count of the named modules (see
+        shard_modules) and returns a JSON-serializable dict that
+        merge_shards combines with the other shards. Symbol references
+        are left unresolved so that they can link across shards.
+    """
+    _debug(1, 'dox_shard(', names, index, count, options, ')')
+    options = _options(options)
+    symbols = None
+    if options.cross_references or options.symbols is not None:
+        symbols = options.symbols or SymbolTable()
+        options = options.derive(symbols=symbols)
+    token = _symbol_tables.set((symbols,))
+    try:
+        docs = dict(_dox_modules(shard_modules(names, index, count, timings), options))
+    finally:
+        _symbol_tables.reset(token)
+    return {
+        'version': 1,
+        'shard': [index, count],
+        'modules': names,
+        'docs': docs,
+        'anchors': symbols.anchors if symbols is not None else None,
+    }
+
+
+def merge_shards(shards: list[dict], symbols: SymbolTable|None = None) -> str:
+    """Stitches the shards returned by dox_shard for every shard index
+        into the documentation dox_modules would have returned for all
+        of the modules in one process. Unresolved symbol references are
+        recorded in symbols, if given.
+    """
+    if not shards:
+        raise ValueError('no shards to merge')
+    names, count = shards[0]['modules'], shards[0]['shard'][1]
+    indexes = sorted([shard['shard'][0] for shard in shards])
+    if any(shard['version'] != 1 for shard in shards):
+        raise ValueError('unsupported shard version')
+    if any(shard['modules'] != names or shard['shard'][1] != count for shard in shards):
+        raise ValueError('shards are from different runs')
+    if indexes != list(range(1, count + 1)):
+        raise ValueError(f'expected shards 1 to {count} but got {indexes}')
+
+    docs = {}
+    for shard in shards:
+        docs.update(shard['docs'])
+    doc = ''.join([docs[name] for name in names])
+    if any(shard['anchors'] is not None for shard in shards):
+        symbols = symbols if symbols is not None else SymbolTable()
+        for shard in shards:
+            symbols.anchors.update(shard['anchors'] or {})
+        doc = symbols.resolve(doc)
+    return doc
+
+
+def _inventory_arg(value: str) -> Inventory:
+    """Parses the path or path=base_url of an -inventory flag. Only the
+        first '=' separates them, so the url may contain '=' and ','.
+    """
+    return Inventory(*value.split('=', 1))
+
+
+def _shard_arg(value: str) -> list[int]|None:
+    """Parses the i/n of a -shard flag, or returns None unless it is
+        two integers with 1 <= i <= n.
+    """
+    parts = value.split('/')
+    if len(parts) != 2 or not all([part.strip().isdigit() for part in parts]):
+        return None
+    index, count = [int(part) for part in parts]
+    return [index, count] if 1 <= index <= count else None
+
+
+def _merge_cli(args: list[str]) -> int:
+    """Merges the shard files given as args and prints the
+        documentation, linking to the symbols in any -inventory given.
+    """
+    import json
+    shards = []
+    symbols = SymbolTable()
+    for arg in args:
+        if arg[:11] == '-inventory=':
+            symbols.inventories.append(_inventory_arg(arg[11:]))
+            continue
+        with open(arg) as f:
+            shards.append(json.load(f))
+    try:
+        print(merge_shards(shards, symbols))
+    except ValueError as e:
+        print(f'ValueError: {str(e)}')
+        return 1
+    finally:
+        for inventory in symbols.inventories:
+            inventory.close()
+    if symbols.unresolved:
+        print('unresolved references:', file=sys.stderr)
+        print(symbols.report(), end='', file=sys.stderr)
+    return 0
+
+
+def _load_config(path: str) -> dict:
+    """Reads the autodox configuration from the [tool.autodox] table of
+        a pyproject.toml file or from the top level of any other TOML
+        file.
+    """
+    try:
+        import tomllib
+    except ImportError:
+        try:
+            import tomli as tomllib
+        except ImportError:
+            raise ImportError('reading config files on Python 3.10 requires tomli')
+    with open(path, 'rb') as f:
+        config = tomllib.load(f)
+    if os.path.basename(path) == 'pyproject.toml':
+        config = config.get('tool', {}).get('autodox', {})
+    return config
+
+
+def _target_args(target: dict) -> list[str]:
+    """Converts a target from the config into invoke_cli arguments:
+        'modules' are the targets, true booleans become flags, lists
+        repeat the flag for each item, and anything else becomes
+        -key=value.
+    """
+    args = [*target.get('modules', [])]
+    for key, value in target.items():
+        if key in ('modules', 'output'):
+            continue
+        if value is True:
+            args.append(f'-{key}')
+        elif value is False:
+            continue
+        elif type(value) is list:
+            args.extend([f'-{key}={v}' for v in value])
+        else:
+            args.append(f'-{key}={value}')
+    return args
+
+
+def run_config(path: str = 'pyproject.toml', name: str = 'autodox') -> int:
+    """Runs every target defined in the config file at path in this
+        process, so imported modules and caches are shared between them.
+        Options at the top level of the config apply to every target in
+        its 'targets' list unless the target overrides them. The docs of
+        each target are written to its 'output' path (if set; otherwise
+        printed) once the target succeeds, so a failed target leaves the
+        previous output in place and its errors go to stderr; sharded
+        targets write to their 'output_dir'. Returns 1 if any target
+        failed, otherwise 0.
+    """
+    from contextlib import redirect_stdout
+    from io import StringIO
+    global _debug_level
+    config = _load_config(path)
+    shared = {k: v for k, v in config.items() if k != 'targets'}
+    debug_level = _debug_level
+    result = 0
+    try:
+        for target in config.get('targets', []):
+            target = {**shared, **target}
+            # -debug flags of one target do not carry over to the next
+            _debug_level = debug_level
+            output = target.get('output')
+            try:
+                args = [name, *_target_args(target)]
+                _debug(1, 'run_config target:', args)
+                if output is None:
+                    code = invoke_cli(args)
+                else:
+                    buffer = StringIO()
+                    with redirect_stdout(buffer):
+                        code = invoke_cli(args)
+                    if code:
+                        sys.stderr.write(buffer.getvalue())
+                    else:
+                        if os.path.dirname(output):
+                            os.makedirs(os.path.dirname(output), exist_ok=True)
+                        with open(output, 'w') as f:
+                            f.write(buffer.getvalue())
+            except (ValueError, TypeError) as e:
+                print(f'{type(e).__name__}: {str(e)}', file=sys.stderr)
+                code = 1
+            if code:
+                label = output or ' '.join([str(m) for m in target.get('modules', [])])
+                print(f'target {label} failed', file=sys.stderr)
+            result |= code
+    finally:
+        _debug_level = debug_level
+    return result
 
 
 def _cli_help(name: str) -> int:
-    print(f'Usage: {name} [package[.module]] [options] ')
+    print(f'Usage: {name} [package[.module] ...] [options] ')
+    print(f'       {name} merge shard.json [shard.json ...] [-inventory=path]')
+    print(f'       {name} collect [package[.module] ...] [options] > snapshot.json')
+    print(f'       {name} render snapshot.json [options]')
+    print(f'       {name} -config[=pyproject.toml]')
     print('\t-exclude_name=str: exclude the given name (or csv of names)')
     print('\t-exclude_type=str: exclude the given type (or csv of types)')
     print('\t-header_level=int: number of hashtags to prepend to headers')
     print('\t-package=str: name of package if not using the . notation')
     print('\t-function_format=str: choose one of "header", "paragraph", or "list"')
     print('\t-method_format=type: choose one of "header", "paragraph", or "list"')
-    print('\t-value_format=type: choose one of "header", "paragraph", or "list"')
+    print('\t-value_format=type: choose one of "header", "paragraph", "list", or')
+    print('\t\t"table"; "table" also lists the members of Enum classes')
     print('\t-include_private: includes things prefaced with "_"')
     print('\t-include_dunder: includes things prefaced with "__"')
     print('\t-include_submodules: includes submodules')
     print('\t-document_submodules: runs module documentation for submodules')
+    print('\t-low_memory: drops references to each documented module, collects')
+    print('\t\tgarbage periodically, and reports the peak RSS on stderr')
+    print('\t-evict_modules: also removes documented modules imported by the run')
+    print('\t\tfrom sys.modules; implies -low_memory')
+    print('\t-source_url=str: links every class and function to its source with')
+    print('\t\tthe url template, in which {path} is the path of the file relative')
+    print('\t\tto the import root, {start} and {end} are the first and last')
+    print('\t\tlines, and {module} is the module name')
+    print('\t-source_cache=str: directory in which to cache the indexes of the')
+    print('\t\tsource files by hash for -source_url')
+    print('\t-prefetch=int: imports up to this many of the following modules in a')
+    print('\t\tbackground thread while a module is documented; ignored with')
+    print('\t\t-cost_report and -metrics')
+    print('\t-workers=int: documents the modules in this many forked processes')
+    print('\t\tthat share the dependencies imported once by this process, and')
+    print('\t\tassembles their output in order; balanced by -timings=str if')
+    print('\t\tgiven; ignored with -deduplicate, -cost_report, and -metrics')
+    print('\t-deduplicate: documents each class and function once, at its')
+    print('\t\tdefining module if the run documents it, with a short alias')
+    print('\t\tentry that links to it wherever else it is exported (implies')
+    print('\t\t-anchors)')
     print('\t-line_length=int: number of chars per line in paragraphs')
+    print('\t-anchors: adds html anchors to module and class headers')
+    print('\t-resolve_annotations: resolves str annotations with typing.get_type_hints')
+    print('\t-cross_references: links classes in annotations and defaults to')
+    print('\t\ttheir documentation; unresolved names are reported on stderr')
+    print('\t-inventory=path[=base_url]: links classes that are not documented to')
+    print('\t\tthe urls in an objects.inv or autodox inventory (repeat for more)')
+    print('\t-bytecode: documents the module from its cached bytecode without')
+    print('\t\timporting it; imported names and computed values are omitted')
+    print('\t-discover: documents every submodule found on the filesystem as')
+    print('\t\tits own module; implied by targets containing glob patterns')
+    print('\t\tsuch as package.sub.*')
+    print('\t-namespace_packages: also discovers the modules in directories')
+    print('\t\twithout an __init__.py as namespace packages')
+    print('\t-use_all: only documents the names listed in a module\'s __all__,')
+    print('\t\tif it has one; on by default when discovering modules')
+    print('\t-ignore_all: documents every public name even if __all__ is set')
+    print('\t-list_undeclared: lists the public names missing from __all__')
+    print('\t\twithout documenting them')
+    print('\t-include_module=str: only document discovered modules matching')
+    print('\t\tthe given glob pattern (or csv of patterns)')
+    print('\t-exclude_module=str: do not document discovered modules matching')
+    print('\t\tthe given glob pattern (or csv of patterns)')
+    print('\t-shard_size=int: split the output into files of at most this many')
+    print('\t\tbytes at module and class boundaries, with a table of contents')
+    print('\t-output_dir=str: directory in which to write sharded output')
+    print('\t-shard=int/int: documents only shard i of n of the modules for a')
+    print('\t\tdistributed run and prints it as JSON to be combined with the')
+    print('\t\tother shards by the merge command')
+    print('\t-timings=str: JSON file with the seconds each module took in a')
+    print('\t\tprevious run, e.g. from -cost_report=str, to balance shards')
+    print('\t-cost_report: prints the import, introspection, formatting, and')
+    print('\t\thook time and output size of the slowest modules to stderr')
+    print('\t-cost_report=str: also writes the costs of every module to the')
+    print('\t\tgiven file as CSV (if it ends in .csv) or JSON')
+    print('\t-metrics=str: writes the counts of documented items, hook')
+    print('\t\tinvocations, and cache hits, the bytes emitted, and the wall')
+    print('\t\tand CPU time per phase of the run to the given file as JSON (if')
+    print('\t\tit ends in .json) or in the Prometheus textfile format')
+    print('\t-checkpoint=str: records each documented module in the given')
+    print('\t\tjournal file so that an interrupted run resumes where it left')
+    print('\t\toff; the journal is deleted once the run finishes')
+    print('\t-config=str: runs every target defined in the [tool.autodox]')
+    print('\t\ttable of pyproject.toml (the default) or in the given TOML file')
+    print('\t\tin one process; other options are ignored')
     print('\t-debug: increases level of debug statements printed; starts at 0')
     print('\t\tand increases once for each time this flag is passed; level 1')
     print('\t\tprints out the trace for dox_{thing} calls; level 2 includes')
@@ -536,9 +2713,30 @@ def _cli_help(name: str) -> int:
 
 def invoke_cli(args: list[str]) -> int:
     """Entry point for pip installed wrapper function to invoke via CLI."""
-    from importlib import import_module
     _settings = {}
-    _module = ''
+    _modules = []
+    _discover = False
+    _namespace_packages = False
+    _include, _exclude = [], []
+    _cost_report = None
+    _metrics = None
+    _ignore_all = False
+    _shard, _timings = None, None
+    _inventories = []
+    _collect, _snapshot = False, None
+
+    if args[1:2] == ['merge']:
+        return _merge_cli(args[2:])
+    if args[1:2] == ['collect']:
+        _collect = True
+        args = [args[0], *args[2:]]
+    elif args[1:2] == ['render'] and len(args) > 2:
+        from .snapshot import Snapshot
+        _snapshot = Snapshot.load(args[2])
+        args = [args[0], *args[3:]]
+    for arg in args[1:]:
+        if arg == '-config' or arg[:8] == '-config=':
+            return run_config(arg[8:] or 'pyproject.toml', args[0])
 
     for arg in args[1:]:
         if arg in ('--help', '-help', '-?', '-h', '?'):
@@ -556,14 +2754,57 @@ def invoke_cli(args: list[str]) -> int:
             _settings['header_level'] = int(arg[14:])
         elif arg[:9] == '-package=':
             _settings['package'] = arg[9:]
+        elif arg[:12] == '-checkpoint=':
+            _settings['checkpoint'] = arg[12:]
         elif arg[:17] == '-function_format=':
             _settings['function_format'] = arg[17:]
         elif arg[:15] == '-method_format=':
             _settings['method_format'] = arg[15:]
         elif arg[:14] == '-value_format=':
             _settings['value_format'] = arg[14:]
-        elif arg[:12] == '-line_length':
-            _settings['line_length'] = int(arg[12:])
+        elif arg[:13] == '-line_length=':
+            _settings['line_length'] = int(arg[13:])
+        elif arg[:12] == '-shard_size=':
+            _settings['shard_size'] = int(arg[12:])
+        elif arg[:12] == '-output_dir=':
+            _settings['output_dir'] = arg[12:]
+        elif arg[:16] == '-include_module=':
+            _include.extend(arg[16:].split(','))
+        elif arg[:16] == '-exclude_module=':
+            _exclude.extend(arg[16:].split(','))
+        elif arg[:7] == '-shard=':
+            _shard = _shard_arg(arg[7:])
+            if _shard is None:
+                print(f'invalid option: {arg} (expected -shard=i/n with 1 <= i <= n)')
+                return 1
+        elif arg[:9] == '-timings=':
+            _timings = arg[9:]
+        elif arg[:13] == '-cost_report=':
+            _cost_report = arg[13:]
+        elif arg == '-cost_report':
+            _cost_report = ''
+        elif arg[:9] == '-metrics=':
+            _metrics = arg[9:]
+        elif arg == '-discover':
+            _discover = True
+        elif arg == '-namespace_packages':
+            _namespace_packages = True
+        elif arg == '-use_all':
+            _settings['use_all'] = True
+        elif arg == '-ignore_all':
+            _ignore_all = True
+        elif arg == '-list_undeclared':
+            _settings['list_undeclared'] = True
+        elif arg == '-anchors':
+            _settings['anchors'] = True
+        elif arg == '-resolve_annotations':
+            _settings['resolve_annotations'] = True
+        elif arg == '-cross_references':
+            _settings['symbols'] = SymbolTable()
+        elif arg[:11] == '-inventory=':
+            _inventories.append(_inventory_arg(arg[11:]))
+        elif arg == '-bytecode':
+            _settings['bytecode'] = True
         elif arg == '-include_private':
             _settings['include_private'] = True
         elif arg == '-include_dunder':
@@ -572,6 +2813,20 @@ def invoke_cli(args: list[str]) -> int:
             _settings['include_submodules'] = True
         elif arg == '-document_submodules':
             _settings['document_submodules'] = True
+        elif arg == '-low_memory':
+            _settings['low_memory'] = True
+        elif arg == '-deduplicate':
+            _settings['deduplicate'] = True
+        elif arg[:10] == '-prefetch=':
+            _settings['prefetch'] = int(arg[10:])
+        elif arg[:9] == '-workers=':
+            _settings['workers'] = int(arg[9:])
+        elif arg[:12] == '-source_url=':
+            _settings['source_url'] = arg[12:]
+        elif arg[:14] == '-source_cache=':
+            _settings['source_cache'] = arg[14:]
+        elif arg == '-evict_modules':
+            _settings['evict_modules'] = True
         elif arg == '-debug':
             global _debug_level
             _debug_level += 1
@@ -579,18 +2834,104 @@ def invoke_cli(args: list[str]) -> int:
             print(f'unrecognized option: {arg}')
             return 1
         else:
-            _module = arg
+            _modules.append(arg)
+
+    if _inventories:
+        _settings['symbols'] = _settings.get('symbols') or SymbolTable()
+        _settings['symbols'].inventories.extend(_inventories)
+
+    report = None
+    if _metrics is not None or _cost_report is not None:
+        # imports are timed in the documenting thread and process
+        for name in ('prefetch', 'workers'):
+            if _settings.pop(name, 0):
+                print(f'-{name} is ignored with -cost_report and -metrics', file=sys.stderr)
+    if _timings and 'workers' in _settings:
+        _settings['timings'] = _load_timings(_timings)
+    if _metrics is not None:
+        from .metrics import RunMetrics
+        report = RunMetrics()
+    elif _cost_report is not None:
+        from .costs import CostReport
+        report = CostReport()
 
     try:
-        if 'package' in _settings:
-            _module = import_module(_module, _settings['package'])
-        else:
-            _module = import_module(_module)
-    except ModuleNotFoundError as e:
-        print(f'ModuleNotFoundError: {str(e)}')
+        # the patches of the report are removed before it is written
+        with report if report is not None else nullcontext():
+            names = []
+            for target in _modules:
+                root = target.split('*')[0].split('?')[0].split('[')[0].rstrip('.')
+                if not (_discover or _include or root != target):
+                    names.append(target)
+                    continue
+                include = [*_include, target] if root != target else _include
+                for name in discover_modules(
+                    root, include, _exclude, namespace_packages=_namespace_packages
+                ):
+                    if name not in names:
+                        names.append(name)
+            if names != _modules:
+                # every submodule is documented as its own module
+                _settings.pop('document_submodules', None)
+                if not _ignore_all:
+                    _settings['use_all'] = True
+            if _ignore_all:
+                _settings.pop('use_all', None)
+            if _snapshot is not None:
+                # the content options were fixed when the snapshot was collected
+                names = _snapshot.names
+                _settings.update(_snapshot.options)
+                _settings['snapshot'] = _snapshot
+
+            options = Options(_settings)
+            if _collect:
+                from .snapshot import Snapshot
+                print(Snapshot.collect(names, options).dumps())
+            elif _shard is not None:
+                import json
+                timings = _load_timings(_timings) if _timings else {}
+                print(json.dumps(dox_shard(names, *_shard, options, timings)))
+            elif 'shard_size' in _settings:
+                output_dir = _settings['output_dir'] if 'output_dir' in _settings else '.'
+                os.makedirs(output_dir, exist_ok=True)
+                writer = ShardWriter((_modules or names)[0].split('*')[0].rstrip('.'), options.shard_size)
+                dox_modules(names, options.derive(writer=writer))
+                for name, contents in writer.files().items():
+                    with open(os.path.join(output_dir, name), 'w') as f:
+                        f.write(contents)
+            elif (options.low_memory or options.evict_modules) and options.symbols is None:
+                # printed as each module is documented, or as each section
+                # is when submodules are documented within their package
+                if options.document_submodules:
+                    options = options.derive(writer=lambda text, *args: sys.stdout.write(text))
+                for _, doc in _dox_modules(names, options):
+                    sys.stdout.write(doc)
+                print()
+            else:
+                print(dox_modules(names, options))
+    except ImportError as e:
+        print(f'{type(e).__name__}: {str(e)}')
         return 1
+    finally:
+        if _metrics:
+            # written for failed runs too so that they can be alerted on
+            report.write(_metrics)
+        for inventory in _inventories:
+            inventory.close()
+
+    if _cost_report is not None:
+        print(report.summary(), end='', file=sys.stderr)
+        if _cost_report:
+            with open(_cost_report, 'w') as f:
+                f.write(report.to_csv() if _cost_report.endswith('.csv') else report.to_json())
+
+    if (options.low_memory or options.evict_modules) and peak_rss() is not None:
+        print(f'peak RSS: {peak_rss() / 2**20:.1f} MiB', file=sys.stderr)
+
+    if options.symbols is not None and options.symbols.unresolved:
+        print('unresolved references:', file=sys.stderr)
+        print(options.symbols.report(), end='', file=sys.stderr)
 
-    print(dox_a_module(_module, _settings))
     return 0
 
 
@@ -0,0 +1,216 @@
+"""Summarizes a run for dashboards and alerts: what was documented, how
+    often each hook ran, how well the caches did, how much was emitted,
+    and the wall and CPU time per phase, in the Prometheus textfile
+    format or as JSON.
+"""
+
+
+from . import functions
+from .costs import CostReport
+from time import perf_counter, process_time, time
+import json
+import os
+
+
+KINDS = ('module', 'class', 'method', 'function', 'value')
+PHASE_NAMES = ('import', 'introspection', 'formatting', 'hooks')
+
+
+class RunMetrics(CostReport):
+    """CostReport that also counts the modules, classes, methods,
+        functions, and values documented, the hook invocations per
+        Event, and the hits and misses of the annotation and namespace
+        caches, and times the whole run.
+    """
+    def __init__(self) -> None:
+        super().__init__()
+        self.documented = {kind: 0 for kind in KINDS}
+        self.hooks = {}
+        self.caches = {'annotations': [0, 0], 'namespaces': [0, 0]}
+        self.run = {'wall': 0.0, 'cpu': 0.0}
+        self.finished = None
+        self._classes = 0
+        self._formatted = 0
+        self._start = None
+
+    def _counted(self, kind: str, function):
+        def wrapper(*args, **kwargs):
+            doc = function(*args, **kwargs)
+            if doc:
+                self.documented[kind] += 1
+            return doc
+        return wrapper
+
+    def _module(self, function):
+        timed = super()._module(function)
+        def wrapper(module, options={}):
+            # counted on entry: with a writer, the sections are written
+            # and the returned doc is empty
+            self.documented['module'] += 1
+            return timed(module, options)
+        return wrapper
+
+    def _class(self, function):
+        def wrapper(*args, **kwargs):
+            self._classes += 1
+            try:
+                doc = function(*args, **kwargs)
+            finally:
+                self._classes -= 1
+            if doc:
+                self.documented['class'] += 1
+            return doc
+        return wrapper
+
+    def _function(self, function):
+        def wrapper(*args, **kwargs):
+            doc = function(*args, **kwargs)
+            if doc:
+                self.documented['method' if self._classes else 'function'] += 1
+            return doc
+        return wrapper
+
+    def _hook(self, function):
+        def wrapper(event, *args):
+            if event.name in functions._handlers:
+                self.hooks[event.name] = self.hooks.get(event.name, 0) + 1
+            return function(event, *args)
+        return wrapper
+
+    def _batch(self, function):
+        def wrapper(*args):
+            self.hooks['BATCH'] = self.hooks.get('BATCH', 0) + 1
+            return function(*args)
+        return wrapper
+
+    def _format(self, function):
+        def wrapper(*args, **kwargs):
+            self._formatted += 1
+            return function(*args, **kwargs)
+        return wrapper
+
+    def _render(self, function):
+        def wrapper(*args, **kwargs):
+            # a hit renders without formatting the annotation
+            formatted = self._formatted
+            result = function(*args, **kwargs)
+            self.caches['annotations'][self._formatted != formatted] += 1
+            return result
+        return wrapper
+
+    def _namespace(self, function):
+        def wrapper(module_name):
+            self.caches['namespaces'][module_name not in functions._namespace_cache] += 1
+            return function(module_name)
+        return wrapper
+
+    def _patches(self) -> dict:
+        patches = super()._patches()
+        counters = {
+            'dox_a_class': self._class,
+            'dox_a_function': self._function,
+            'dox_a_value': lambda function: self._counted('value', function),
+            '_table_row': lambda function: self._counted('value', function),
+            '_invoke_handler': self._hook,
+            '_invoke_batch_handler': self._batch,
+            '_format_annotation': self._format,
+            '_render_annotation': self._render,
+            '_module_namespace': self._namespace,
+        }
+        for name, counter in counters.items():
+            timer = patches.get(name)
+            patches[name] = (
+                lambda function, counter=counter, timer=timer:
+                    counter(timer(function) if timer else function)
+            )
+        return patches
+
+    def __enter__(self) -> 'RunMetrics':
+        super().__enter__()
+        self._start = (perf_counter(), process_time())
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.run['wall'] += perf_counter() - self._start[0]
+        self.run['cpu'] += process_time() - self._start[1]
+        self.finished = time()
+        super().__exit__(*args)
+
+    def to_dict(self) -> dict:
+        """Returns the metrics as a dict of plain values."""
+        rows = self.rows()
+        return {
+            'documented': {**self.documented},
+            'hooks': {**self.hooks},
+            'caches': {
+                name: {
+                    'hits': hits, 'misses': misses,
+                    'hit_rate': hits / (hits + misses) if hits + misses else None,
+                }
+                for name, (hits, misses) in self.caches.items()
+            },
+            'bytes': sum([row['bytes'] for row in rows]),
+            'phases': {
+                phase: {'wall': sum([row[phase] for row in rows]), 'cpu': self.cpu[phase]}
+                for phase in PHASE_NAMES
+            },
+            'run': {**self.run},
+            'finished': self.finished,
+        }
+
+    def to_prometheus(self) -> str:
+        """Returns the metrics in the Prometheus text exposition format,
+            e.g. for the textfile collector of the node exporter.
+        """
+        data = self.to_dict()
+        lines = []
+        def metric(name: str, help: str, samples: list[tuple[str, float]]) -> None:
+            lines.append(f'# HELP autodox_{name} {help}')
+            lines.append(f'# TYPE autodox_{name} gauge')
+            for labels, value in samples:
+                lines.append(f'autodox_{name}{labels} {value}')
+
+        metric('documented', 'Items documented in the last run by kind.', [
+            (f'{{kind="{kind}"}}', count) for kind, count in data['documented'].items()
+        ])
+        metric('hook_invocations', 'Hook invocations in the last run by event.', [
+            (f'{{event="{event}"}}', count) for event, count in data['hooks'].items()
+        ])
+        caches = {k: v for k, v in data['caches'].items() if v['hits'] + v['misses']}
+        metric('cache_hits', 'Cache hits in the last run.', [
+            (f'{{cache="{name}"}}', cache['hits']) for name, cache in caches.items()
+        ])
+        metric('cache_misses', 'Cache misses in the last run.', [
+            (f'{{cache="{name}"}}', cache['misses']) for name, cache in caches.items()
+        ])
+        metric('cache_hit_ratio', 'Cache hit ratio in the last run.', [
+            (f'{{cache="{name}"}}', cache['hit_rate']) for name, cache in caches.items()
+        ])
+        metric('output_bytes', 'Bytes of documentation emitted in the last run.', [
+            ('', data['bytes'])
+        ])
+        metric('phase_seconds', 'Exclusive seconds spent per phase in the last run.', [
+            (f'{{phase="{phase}",clock="{clock}"}}', seconds)
+            for phase, clocks in data['phases'].items() for clock, seconds in clocks.items()
+        ])
+        metric('run_seconds', 'Seconds the last run took.', [
+            (f'{{clock="{clock}"}}', seconds) for clock, seconds in data['run'].items()
+        ])
+        if data['finished'] is not None:
+            metric('last_run_timestamp_seconds', 'When the last run finished.', [
+                ('', data['finished'])
+            ])
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str) -> None:
+        """Writes the metrics to path as JSON (if it ends in .json) or
+            in the Prometheus text format. The file is replaced
+            atomically so a collector never reads a partial file.
+        """
+        contents = (
+            json.dumps(self.to_dict(), indent=2) if path.endswith('.json')
+            else self.to_prometheus()
+        )
+        with open(f'{path}.tmp', 'w') as f:
+            f.write(contents)
+        os.replace(f'{path}.tmp', path)
@@ -0,0 +1,363 @@
+"""Persists what dox_a_module extracts from modules in a versioned
+    snapshot, so that documentation can be rendered with different
+    presentation options on any machine without importing anything.
+"""
+
+
+from . import functions
+from .functions import Options, _RenderedAnnotation, _debug, _options
+from ast import literal_eval
+from enum import Enum, EnumMeta
+from inspect import iscoroutinefunction
+from types import FunctionType, MethodType, ModuleType, NoneType, new_class
+from typing import Any
+import json
+
+
+VERSION = 1
+
+# options that decide what is extracted; they are fixed when collecting
+# and every other option can be chosen when rendering
+CONTENT_OPTIONS = (
+    'exclude_names', 'exclude_types', 'include_private', 'include_dunder',
+    'include_submodules', 'document_submodules', 'resolve_annotations',
+    'use_all', 'list_undeclared',
+)
+
+_simple_types = (int, float, complex, bool, str, bytes, NoneType)
+_styles = ('param', 'return', 'class')
+
+
+def _doc(item: Any) -> str|None:
+    """Returns the docstring of an item if it is a str."""
+    doc = getattr(item, '__doc__', None)
+    return doc if type(doc) is str else None
+
+
+def _annotation(annotation: Any) -> str|list:
+    """Encodes an annotation as a str annotation or as its renderings in
+        every style (and linked style, if it contains classes).
+    """
+    if type(annotation) is str or annotation is None:
+        return annotation
+    rendered = [functions._format_annotation(annotation, style) for style in _styles]
+    if not functions._contains_linkable(annotation):
+        return rendered
+    return rendered + [{
+        f'{style} {linked}': functions._format_annotation(annotation, style, linked)
+        for style in _styles for linked in ('code', 'text')
+    }]
+
+
+def _value(value: Any) -> dict:
+    """Encodes a value as its type name and, for simple values, its repr."""
+    entry = {'v': type(value).__name__}
+    if isinstance(value, Enum):
+        entry['e'] = 1
+        value = value.value
+    if type(value) in _simple_types:
+        entry['l'] = repr(value)
+    return entry
+
+
+def _default(value: Any) -> str|dict:
+    """Encodes a default as a str, a class, or the text it renders as."""
+    if type(value) is str:
+        return value
+    if type(value) is type:
+        return {'t': [value.__module__, value.__qualname__, value.__name__]}
+    return {'s': f'{value}'}
+
+
+def _function(function: Any, options: Options) -> dict:
+    """Encodes what dox_a_function reads from a function."""
+    annotations = getattr(function, '__annotations__', None) or {}
+    if options.resolve_annotations and annotations:
+        annotations = functions._resolve_annotations(function, annotations)
+    entry = {
+        'f': [function.__module__, function.__qualname__, function.__name__],
+        'doc': _doc(function),
+        'ann': {k: _annotation(v) for k, v in annotations.items()},
+    }
+    if iscoroutinefunction(function):
+        entry['async'] = 1
+    if getattr(function, '__defaults__', None):
+        entry['defaults'] = [_default(d) for d in function.__defaults__]
+    if getattr(function, '__kwdefaults__', None):
+        entry['kwdefaults'] = {k: _default(v) for k, v in function.__kwdefaults__.items()}
+    return entry
+
+
+def _class(cls: type, options: Options) -> dict:
+    """Encodes what dox_a_class reads from a class."""
+    annotations = functions._get_all_annotations(cls)
+    if options.resolve_annotations and annotations:
+        annotations = functions._resolve_annotations(cls, annotations)
+    parent = getattr(cls, '__base__', None)
+    properties, methods = functions._class_members(cls, options)
+    members = []
+    for name, item in cls.__dict__.items():
+        if name in properties:
+            members.append([name, 'property', _doc(item)])
+        elif name in methods:
+            kind = type(item).__name__ if type(item) in (classmethod, staticmethod) else 'function'
+            function = item.__func__ if type(item) in (classmethod, staticmethod, MethodType) else item
+            members.append([name, kind, _function(function, options)])
+            if kind == 'function':
+                continue
+            if not hasattr(item, '__name__'):
+                # e.g. wrapped implicitly by type(), without the attributes
+                # of the function
+                members[-1].append({'bare': 1})
+            elif _doc(item) != _doc(function):
+                members[-1].append({'doc': _doc(item)})
+    entry = {
+        'c': [cls.__module__, cls.__qualname__, cls.__name__],
+        'base': getattr(parent, '__name__', str(parent)) if parent not in (None, object) else None,
+        'doc': _doc(cls),
+        'ann': {k: _annotation(v) for k, v in annotations.items()},
+        'members': members,
+    }
+    if isinstance(cls, EnumMeta):
+        entry['enum'] = [[name, _value(member.value)] for name, member in cls.__members__.items()]
+    return entry
+
+
+def collect_module(module: ModuleType, options: dict|Options = {},
+                   modules: dict[str, dict]|None = None) -> dict[str, dict]:
+    """Extracts what dox_a_module would document from a module and any
+        documented submodules into modules (a new dict if None), keyed
+        by module name, and returns it.
+    """
+    _debug(1, 'collect_module(', getattr(module, '__name__', '[unnamed]'), options, ')')
+    options = _options(options)
+    modules = {} if modules is None else modules
+    entry = {'doc': _doc(module), 'members': []}
+    modules[module.__name__] = entry
+
+    members, undeclared = functions._selected_members(module, options)
+    for name, item in members:
+        if isinstance(item, ModuleType):
+            if options.document_submodules and item.__name__ not in modules:
+                collect_module(item, options, modules)
+            encoded = {'m': item.__name__}
+        elif isinstance(item, type):
+            encoded = _class(item, options)
+        elif type(item) is FunctionType:
+            encoded = _function(item, options)
+        else:
+            encoded = _value(item)
+        entry['members'].append([name, encoded])
+    if options.use_all and '__all__' in module.__dict__:
+        entry['all'] = [name for name, _ in members]
+    if undeclared:
+        entry['undeclared'] = undeclared
+    return modules
+
+
+def _literal(text: str) -> Any:
+    """Returns the simple value with the given repr."""
+    try:
+        return literal_eval(text)
+    except ValueError:
+        # e.g. nan or inf
+        return complex(text) if 'j' in text else float(text)
+
+
+class _Text(str):
+    """A default that renders as the text it was collected as."""
+
+
+class Snapshot:
+    """The extracted documentation of modules along with the content
+        options that were used to extract it. Stand-in modules, classes,
+        and functions are rebuilt from it on demand, so that rendering
+        them with dox_a_module (or dox_modules with the snapshot as
+        options['snapshot']) gives the same documentation as the
+        original modules without importing anything.
+    """
+    def __init__(self, data: dict) -> None:
+        if data.get('version') != VERSION:
+            raise ValueError(f'unsupported snapshot version {data.get("version")}')
+        self.data = data
+        self.names = data['names']
+        self.options = data['options']
+        self._modules = {}
+        self._items = {}
+        self._types = {}
+        self._enums = {}
+        self._enum_values = {}
+
+    @classmethod
+    def collect(cls, names: list[str], options: dict|Options = {}) -> 'Snapshot':
+        """Imports the named modules like dox_modules and collects them."""
+        options = _options(options)
+        modules = {}
+        for name in names:
+            collect_module(functions._load_module(name, options), options, modules)
+        return cls({
+            'version': VERSION,
+            'names': [*names],
+            'options': {k: v for k, v in options.to_dict().items() if k in CONTENT_OPTIONS},
+            'modules': modules,
+        })
+
+    @classmethod
+    def load(cls, path: str) -> 'Snapshot':
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def dumps(self) -> str:
+        return json.dumps(self.data, separators=(',', ':'))
+
+    def write(self, path: str) -> None:
+        with open(path, 'w') as f:
+            f.write(self.dumps())
+
+    def render(self, options: dict|Options = {}) -> str:
+        """Renders the documentation of the collected modules with the
+            given presentation options, as dox_modules would have.
+        """
+        options = {**_options(options).to_dict(), **self.options, 'snapshot': self}
+        return functions.dox_modules(self.names, options)
+
+    def module(self, name: str) -> ModuleType:
+        """Returns the stand-in for a collected module."""
+        if name not in self._modules:
+            if name not in self.data['modules']:
+                raise ModuleNotFoundError(f'{name} is not in the snapshot', name=name)
+            self._modules[name] = self._module(name, self.data['modules'][name])
+        return self._modules[name]
+
+    def _module(self, name: str, entry: dict) -> ModuleType:
+        module = ModuleType(name, entry['doc'])
+        self._modules[name] = module
+        for key, item in entry['members']:
+            setattr(module, key, self._item(item))
+        for key in entry.get('undeclared', []):
+            module.__dict__.setdefault(key, None)
+        if 'all' in entry:
+            module.__all__ = entry['all']
+        return module
+
+    def _item(self, item: dict) -> Any:
+        if 'm' in item:
+            name = item['m']
+            return self.module(name) if name in self.data['modules'] else ModuleType(name)
+        if 'c' in item or 'f' in item:
+            # one stand-in per class or function, however often it is
+            # exported, so that deduplicate sees the same item
+            key = ('c', *item['c'][:2]) if 'c' in item else ('f', *item['f'][:2])
+            if key not in self._items:
+                self._items[key] = self._class(item) if 'c' in item else self._function(item)
+            return self._items[key]
+        return self._value(item)
+
+    def _type(self, name: str) -> type:
+        """Returns an empty class standing in for a type by name."""
+        if name not in self._types:
+            self._types[name] = type(name, (), {})
+        return self._types[name]
+
+    def _enum(self, name: str) -> type:
+        """Returns an Enum class without members standing in for the
+            type of Enum values, or the base of Enum classes, by name.
+        """
+        if name not in self._enums:
+            self._enums[name] = Enum(name, [])
+        return self._enums[name]
+
+    def _value(self, item: dict) -> Any:
+        value = _literal(item['l']) if 'l' in item else self._type(item['v'])()
+        if 'e' not in item:
+            return value
+        # only the type and value of an Enum value are documented, so it
+        # is an instance of the stand-in class rather than a member
+        key = (item['v'], item.get('l'))
+        if key not in self._enum_values:
+            member = object.__new__(self._enum(item['v']))
+            member._name_, member._value_ = None, value
+            self._enum_values[key] = member
+        return self._enum_values[key]
+
+    def _annotation(self, item: str|list|None) -> Any:
+        if type(item) is not list:
+            return item
+        renderings = dict(zip(_styles, item))
+        if len(item) > len(_styles):
+            renderings.update(item[-1])
+        return _RenderedAnnotation(renderings)
+
+    def _default(self, item: str|dict) -> Any:
+        if type(item) is str:
+            return item
+        if 't' in item:
+            module, qualname, name = item['t']
+            return type(name, (), {'__module__': module, '__qualname__': qualname})
+        return _Text(item['s'])
+
+    def _function(self, item: dict) -> FunctionType:
+        module, qualname, name = item['f']
+        template = _async_template if 'async' in item else _template
+        function = FunctionType(template.__code__, {'__name__': module}, name)
+        function.__qualname__ = qualname
+        function.__doc__ = item['doc']
+        function.__annotations__ = {k: self._annotation(v) for k, v in item['ann'].items()}
+        if 'defaults' in item:
+            function.__defaults__ = tuple([self._default(d) for d in item['defaults']])
+        if 'kwdefaults' in item:
+            function.__kwdefaults__ = {k: self._default(v) for k, v in item['kwdefaults'].items()}
+        return function
+
+    def _class(self, item: dict) -> type:
+        module, qualname, name = item['c']
+        namespace = {
+            '__module__': module,
+            '__qualname__': qualname,
+            '__doc__': item['doc'],
+            '__annotations__': {k: self._annotation(v) for k, v in item['ann'].items()},
+        }
+        assigned = {}
+        for key, kind, member, *wrapper in item['members']:
+            if kind == 'property':
+                namespace[key] = property(doc=member)
+            elif kind in ('classmethod', 'staticmethod'):
+                method = (classmethod if kind == 'classmethod' else staticmethod)(self._function(member))
+                if wrapper and 'bare' in wrapper[0]:
+                    method.__dict__.clear()
+                elif wrapper:
+                    method.__doc__ = wrapper[0]['doc']
+                namespace[key] = method
+            elif key in _implicit:
+                # set after the class is created so that it is not wrapped
+                namespace[key] = None
+                assigned[key] = self._function(member)
+            else:
+                namespace[key] = self._function(member)
+        if 'enum' not in item or not item['base']:
+            # Enum itself has no members to list, so it is a plain class
+            bases = (self._type(item['base']),) if item['base'] else ()
+            cls = type(name, bases, namespace)
+        else:
+            # the members follow the methods, which EnumType requires of
+            # _generate_next_value_
+            members = [(key, self._value(value)) for key, value in item['enum']]
+            def fill(body: dict) -> None:
+                for key, value in [*namespace.items(), *members]:
+                    body[key] = value
+            cls = new_class(name, (self._enum(item['base']),), exec_body=fill)
+        for key, function in assigned.items():
+            type.__setattr__(cls, key, function)
+        return cls
+
+
+# methods that type() wraps in staticmethod or classmethod
+_implicit = ('__new__', '__init_subclass__', '__class_getitem__')
+
+
+def _template() -> None:
+    ...
+
+
+async def _async_template() -> None:
+    ...
@@ -0,0 +1,205 @@
+"""Indexes the line spans of the classes and functions in source files
+    by tokenizing each file once, so that documentation can link to the
+    source of every member without calling inspect.getsourcelines for
+    each of them. Indexes are cached on disk by the hash of the file.
+"""
+
+
+from .functions import _debug
+from hashlib import sha256
+from io import BytesIO
+from typing import Any
+import json
+import os
+import sys
+import tokenize
+
+
+VERSION = 1
+
+_skipped = (tokenize.NL, tokenize.ENCODING)
+
+
+def index_source(source: bytes) -> dict:
+    """Tokenizes Python source and returns its index: 'spans' maps the
+        qualified name of every class and function to its [first, last]
+        line, and 'ends' maps the first line of every function (its
+        co_firstlineno) to its last line. Spans start at the first
+        decorator.
+    """
+    spans, ends = {}, {}
+    scopes = []         # open [qualname, kind, depth, column] scopes
+    indents = []        # columns of the open blocks
+    last = 0            # last line of the latest significant token
+    comments = []       # (line, column) of the comments since then
+    statement = True    # whether the next token starts a statement
+    decorated = None    # first line of pending decorators
+    header = None       # [qualname, kind, first] whose body is pending
+    name_of = None      # (kind, first) of a def or class awaiting its name
+
+    def close(qualname: str, kind: str, column: int = 0) -> None:
+        # comments indented like the body belong to the scope
+        end = max([last] + [line for line, col in comments if column and col >= column])
+        spans[qualname][1] = end
+        if kind == 'def':
+            ends[str(spans[qualname][0])] = end
+
+    for token in tokenize.tokenize(BytesIO(source).readline):
+        kind, string, start = token.type, token.string, token.start[0]
+        if kind in _skipped:
+            continue
+        if kind == tokenize.COMMENT:
+            comments.append((start, token.start[1]))
+            continue
+        if kind == tokenize.INDENT:
+            indents.append(token.end[1])
+            if header is not None:
+                scopes.append([header[0], header[1], len(indents), indents[-1]])
+                header = None
+            continue
+        if kind == tokenize.DEDENT:
+            indents.pop()
+            while scopes and scopes[-1][2] > len(indents):
+                qualname, kind, _, column = scopes.pop()
+                close(qualname, kind, column)
+            statement = True
+            continue
+        if header is not None and statement:
+            # the body was on the same line as the header
+            close(header[0], header[1])
+            header = None
+        if kind == tokenize.NEWLINE:
+            statement = True
+            continue
+        if kind == tokenize.ENDMARKER:
+            break
+        last = token.end[0]
+        comments.clear()
+
+        if name_of is not None and kind == tokenize.NAME:
+            parent = scopes[-1] if scopes else None
+            qualname = string
+            if parent is not None:
+                qualname = f'{parent[0]}.<locals>.{string}' if parent[1] == 'def' else f'{parent[0]}.{string}'
+            spans[qualname] = [name_of[1], last]
+            header = [qualname, name_of[0], name_of[1]]
+            name_of = None
+        elif statement:
+            if string == '@':
+                decorated = decorated or start
+            elif string in ('def', 'class'):
+                name_of = (string, decorated or start)
+                decorated = None
+            elif string != 'async':
+                decorated = None
+        # async def is still a def statement
+        statement = statement and string == 'async'
+
+    while scopes:
+        qualname, kind, _, column = scopes.pop()
+        close(qualname, kind, column)
+    return {'spans': spans, 'ends': ends}
+
+
+class SourceIndex:
+    """Finds the line spans of classes and functions in their source
+        files. Each version of a file, by modification time and size, is
+        tokenized at most once per process, and its index is cached as
+        JSON in cache_dir (if set) under the hash of the file, so
+        unchanged files are never tokenized again.
+    """
+    def __init__(self, cache_dir: str|None = None) -> None:
+        self.cache_dir = cache_dir
+        # filename: (mtime and size, index)
+        self.files = {}
+
+    def index(self, filename: str) -> dict|None:
+        """Returns the index of a source file, or None if it cannot be
+            read or tokenized.
+        """
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return None
+        version = (stat.st_mtime_ns, stat.st_size)
+        if filename in self.files and self.files[filename][0] == version:
+            return self.files[filename][1]
+        try:
+            with open(filename, 'rb') as f:
+                source = f.read()
+        except OSError:
+            return None
+
+        path = None
+        if self.cache_dir is not None:
+            digest = sha256(source).hexdigest()
+            path = os.path.join(self.cache_dir, f'v{VERSION}-{digest}.json')
+            if os.path.exists(path):
+                with open(path) as f:
+                    self.files[filename] = (version, json.load(f))
+                return self.files[filename][1]
+
+        _debug(2, 'index_source(', filename, ')')
+        try:
+            index = index_source(source)
+        except (tokenize.TokenError, SyntaxError):
+            index = None
+        self.files[filename] = (version, index)
+        if path is not None and index is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(f'{path}.tmp', 'w') as f:
+                json.dump(index, f)
+            os.replace(f'{path}.tmp', path)
+        return index
+
+    def span(self, item: Any) -> tuple[str, int, int]|None:
+        """Returns the (path relative to the import root, first line,
+            last line) of a class or function defined in the source file
+            of its module, or None if it cannot be found.
+        """
+        module_name = getattr(item, '__module__', None)
+        module = sys.modules.get(module_name) if type(module_name) is str else None
+        filename = getattr(module, '__file__', None)
+        qualname = getattr(item, '__qualname__', None)
+        if type(filename) is not str or not filename.endswith('.py') or type(qualname) is not str:
+            return None
+        index = self.index(filename)
+        if index is None:
+            return None
+
+        code = getattr(item, '__code__', None)
+        span = None
+        # wrappers made by decorators have the code of the wrapper
+        if code is not None and code.co_filename == filename and \
+                getattr(code, 'co_qualname', qualname) == qualname:
+            last = index['ends'].get(str(code.co_firstlineno))
+            span = [code.co_firstlineno, last] if last is not None else None
+        span = span or index['spans'].get(qualname)
+        if span is None:
+            return None
+
+        root = filename
+        levels = module_name.count('.') + 1
+        if os.path.basename(filename) == '__init__.py':
+            levels += 1
+        for _ in range(levels):
+            root = os.path.dirname(root)
+        path = os.path.relpath(filename, root).replace(os.sep, '/')
+        return (path, span[0], span[1])
+
+
+# SourceIndex by cache_dir, shared by the runs of the process
+_indexes = {}
+
+
+def source_link(item: Any, url: str, cache_dir: str|None = None) -> str|None:
+    """Returns the url template with {path}, {start}, and {end} filled
+        in from the source span of the item, or None if it has none.
+    """
+    if cache_dir not in _indexes:
+        _indexes[cache_dir] = SourceIndex(cache_dir)
+    span = _indexes[cache_dir].span(item)
+    if span is None:
+        return None
+    path, start, end = span
+    return url.format(path=path, start=start, end=end, module=item.__module__)
@@ -0,0 +1,165 @@
+"""Documents the modules of a run in forked worker processes. The parent
+    imports the dependencies that several of the modules share once, so
+    that the workers inherit them copy-on-write instead of importing
+    them again, and assembles the documentation the workers stream back
+    in the order of the run.
+"""
+
+
+from . import functions
+from .functions import Options, _debug, _package_dirs, shard_modules
+from typing import Iterator
+import ast
+import multiprocessing
+import os
+import pickle
+import queue
+
+
+def _source_file(name: str, search_path: list[str]|None = None) -> str|None:
+    """Returns the source file of a module without importing it."""
+    found = _package_dirs(name, search_path)
+    if not found:
+        return None
+    path = os.path.join(found[0], '__init__.py') if os.path.isdir(found[0]) else found[0]
+    return path if path.endswith('.py') and os.path.isfile(path) else None
+
+
+def _imports(path: str) -> set[str]:
+    """Returns the absolute module names imported anywhere in a file."""
+    try:
+        with open(path, 'rb') as f:
+            tree = ast.parse(f.read(), path)
+    except (OSError, SyntaxError, ValueError):
+        return set()
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update([alias.name for alias in node.names])
+        elif isinstance(node, ast.ImportFrom) and not node.level and node.module:
+            names.add(node.module)
+    return names
+
+
+def shared_dependencies(names: list[str], search_path: list[str]|None = None) -> list[str]:
+    """Returns the modules outside of the packages of the named modules
+        that at least two of them import, found by parsing their source
+        without importing anything. Dependencies of a single module are
+        left to the worker that documents it.
+    """
+    roots = {name.split('.')[0] for name in names}
+    counts = {}
+    for name in names:
+        path = _source_file(name, search_path)
+        if path is None:
+            continue
+        for dependency in _imports(path):
+            if dependency.split('.')[0] not in roots and dependency != '__future__':
+                counts[dependency] = counts.get(dependency, 0) + 1
+    return sorted([name for name, count in counts.items() if count > 1])
+
+
+def preload(names: list[str]) -> list[str]:
+    """Imports the shared dependencies of the named modules and returns
+        the names of those that could be imported.
+    """
+    imported = []
+    for name in shared_dependencies(names):
+        try:
+            __import__(name)
+            imported.append(name)
+        except Exception as e:
+            _debug(1, 'preload: cannot import', name, e)
+    return imported
+
+
+def _work(names: list[str], options: Options, results) -> None:
+    """Documents the names in a worker and puts a (name, doc, writes,
+        anchors) tuple for each module on the results queue, or a (name,
+        exception) tuple for the module that failed, followed by None.
+    """
+    writer, symbols = options.writer, options.symbols
+    writes = []
+    if writer is not None:
+        options = options.derive(writer=lambda *args: writes.append([*args]))
+    documented = functions._document_modules(names, options.derive(workers=0))
+    try:
+        for name in names:
+            count = len(symbols.anchors) if symbols is not None else 0
+            writes.clear()
+            try:
+                _, doc = next(documented)
+            except Exception as e:
+                try:
+                    pickle.dumps(e)
+                except Exception:
+                    e = RuntimeError(f'{type(e).__name__}: {e}')
+                results.put((name, e))
+                break
+            anchors = dict([*symbols.anchors.items()][count:]) if symbols is not None else {}
+            results.put((name, doc, [*writes], anchors))
+    finally:
+        results.put(None)
+
+
+def forked_modules(names: list[str], options: Options,
+                   timings: dict[str, float] = {}) -> Iterator[tuple[str, str]]:
+    """Documents the named modules in options['workers'] forked worker
+        processes, each given a shard of the modules balanced by the
+        timings (see shard_modules), after importing their shared
+        dependencies in this process. Yields the name and documentation
+        of each module in order as soon as it and every module before it
+        are done; sections for the writer and symbols are replayed here.
+        Raises the exception of a worker once the module it failed on is
+        due, as documenting the modules in order would have. Documents
+        them in this process where fork is not available.
+    """
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        yield from functions._document_modules(names, options.derive(workers=0))
+        return
+    context = multiprocessing.get_context('fork')
+    count = min(options.workers, len(names))
+    preloaded = preload(names)
+    _debug(1, 'forked_modules(', len(names), 'modules', count, 'workers', preloaded, ')')
+
+    results = context.Queue()
+    workers = []
+    for i in range(1, count + 1):
+        assigned = shard_modules(names, i, count, timings)
+        worker = context.Process(target=_work, args=(assigned, options, results), daemon=True)
+        worker.start()
+        workers.append(worker)
+
+    writer, symbols = options.writer, options.symbols
+    done = {}
+    running = count
+    try:
+        for name in names:
+            while name not in done:
+                if not running:
+                    raise RuntimeError(f'no worker documented {name}')
+                try:
+                    result = results.get(timeout=1)
+                except queue.Empty:
+                    if not any([worker.is_alive() for worker in workers]) and results.empty():
+                        codes = [worker.exitcode for worker in workers]
+                        raise RuntimeError(f'workers exited with codes {codes}')
+                    continue
+                if result is None:
+                    running -= 1
+                else:
+                    done[result[0]] = result[1:]
+            if len(done[name]) == 1:
+                raise done[name][0]
+            doc, writes, anchors = done.pop(name)
+            for args in writes:
+                writer(*args)
+            if symbols is not None:
+                symbols.anchors.update(anchors)
+            yield (name, doc)
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
+        results.close()
@@ -4,3 +4,40 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 import autodox
 from autodox import functions
+from autodox import bytecode
+from tempfile import TemporaryDirectory
+
+
+class TempPackage:
+    """Writes files (a dict of '/' separated paths to contents) into a
+        temporary directory and puts it first on sys.path. Like the
+        TemporaryDirectory it wraps, it has a name and a cleanup method,
+        which also removes the modules of the written packages from
+        sys.modules.
+    """
+    def __init__(self, files: dict[str, str]) -> None:
+        self.tempdir = TemporaryDirectory()
+        self.name = self.tempdir.name
+        self.packages = sorted({path.split('/')[0].removesuffix('.py') for path in files})
+        for path, contents in files.items():
+            path = os.path.join(self.name, *path.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write(contents)
+        sys.path.insert(0, self.name)
+
+    def forget(self) -> None:
+        """Removes the written packages and their submodules from
+            sys.modules.
+        """
+        for name in [
+            n for n in sys.modules
+            if any(n == p or n.startswith(f'{p}.') for p in self.packages)
+        ]:
+            del sys.modules[name]
+
+    def cleanup(self) -> None:
+        if self.name in sys.path:
+            sys.path.remove(self.name)
+        self.forget()
+        self.tempdir.cleanup()
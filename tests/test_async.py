@@ -0,0 +1,119 @@
+from context import functions
+from types import ModuleType
+import asyncio
+import threading
+import time
+import unittest
+
+
+def make_module(count: int = 6) -> ModuleType:
+    """Builds a module in memory with a few of each kind of member."""
+    module = ModuleType('async_example', 'An example module.')
+    sub = ModuleType('async_example.sub', 'An example submodule.')
+    for target in (module, sub):
+        for i in range(count):
+            cls = type(f'Thing{i}', (), {
+                '__doc__': f'Thing number {i}.', '__module__': target.__name__,
+                '__annotations__': {'size': int},
+            })
+            setattr(target, cls.__name__, cls)
+            exec(f'def function{i}(a: int) -> str:\n    """Function {i}."""', target.__dict__)
+            target.__dict__[f'function{i}'].__module__ = target.__name__
+            setattr(target, f'VALUE_{i}', i)
+    module.sub = sub
+    return module
+
+
+class TestAsync(unittest.TestCase):
+    def tearDown(self) -> None:
+        for event in functions.Event:
+            functions.unset_handler(event)
+
+    def test_output_matches_sync_api(self):
+        module = make_module()
+        options = {'document_submodules': True, 'anchors': True}
+        expected = functions.dox_a_module(module, options)
+        assert asyncio.run(functions.adox_a_module(module, options)) == expected
+        cls, function = module.Thing1, module.function1
+        assert asyncio.run(functions.adox_a_class(cls)) == functions.dox_a_class(cls)
+        assert asyncio.run(functions.adox_a_function(function)) == functions.dox_a_function(function)
+
+        writer = functions.ShardWriter(module.__name__, 200)
+        functions.dox_a_module(module, {**options, 'writer': writer, 'cross_references': True})
+        expected = writer.files()
+        writer = functions.ShardWriter(module.__name__, 200)
+        asyncio.run(functions.adox_a_module(
+            module, {**options, 'writer': writer, 'cross_references': True}
+        ))
+        assert writer.files() == expected
+
+    def test_async_handlers_run_concurrently(self):
+        module = make_module()
+        def mark(doc: str) -> str:
+            return doc + '<!-- owner: docs -->\n\n'
+        functions.set_after_handler(functions.Event.AFTER_FUNCTION, mark)
+        functions.set_after_handler(functions.Event.AFTER_CLASS, mark)
+        expected = functions.dox_a_module(module, {'document_submodules': True})
+        functions.unset_handler(functions.Event.AFTER_FUNCTION)
+        functions.unset_handler(functions.Event.AFTER_CLASS)
+
+        running, peak = [0], [0]
+        lock = threading.Lock()
+        async def lookup_owner(doc: str) -> str:
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            await asyncio.sleep(0.02)
+            with lock:
+                running[0] -= 1
+            return mark(doc)
+        functions.set_after_handler(functions.Event.AFTER_FUNCTION, lookup_owner)
+        functions.set_after_handler(functions.Event.AFTER_CLASS, lookup_owner)
+
+        start = time.perf_counter()
+        doc = asyncio.run(functions.adox_a_module(module, {
+            'document_submodules': True, 'concurrency': 4
+        }))
+        elapsed = time.perf_counter() - start
+        assert doc == expected
+        # 24 hooks of 20 ms each would take at least 480 ms one after another
+        assert elapsed < 0.4, elapsed
+        assert 1 < peak[0] <= 4, peak[0]
+
+        # async handlers also work with the sync API
+        assert functions.dox_a_module(module, {'document_submodules': True}) == expected
+
+    def test_async_before_and_batch_handlers(self):
+        module = make_module(2)
+        async def before(item, options):
+            await asyncio.sleep(0)
+            options['header_level'] = 1
+            return (item, options)
+        async def batch(fragments):
+            await asyncio.sleep(0)
+            return [text.replace('Thing', 'Item') for _, _, text in fragments]
+        functions.set_before_handler(functions.Event.BEFORE_MODULE, before)
+        functions.set_batch_handler(batch)
+        doc = asyncio.run(functions.adox_a_module(module))
+        assert doc.startswith('## async_example\n')
+        assert 'Item number 1.' in doc and 'Thing' not in doc
+        assert doc == functions.dox_a_module(module)
+        assert functions._fragments.get() == () and functions._event_loop.get() is None
+
+    def test_sync_api_inside_running_loop(self):
+        function = make_module(1).function0
+        expected = functions.dox_a_function(function)
+        async def after(doc):
+            await asyncio.sleep(0)
+            return doc + 'After.\n'
+        async def main():
+            plain = functions.dox_a_function(function)
+            functions.set_after_handler(functions.Event.AFTER_FUNCTION, after)
+            return plain, functions.dox_a_function(function)
+        plain, handled = asyncio.run(main())
+        assert plain == expected
+        assert handled == expected + 'After.\n'
+
+
+if __name__ == '__main__':
+    unittest.main()
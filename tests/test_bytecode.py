@@ -0,0 +1,164 @@
+from context import bytecode, functions
+from contextlib import redirect_stdout
+from importlib import import_module
+from importlib.util import cache_from_source
+from io import StringIO
+from tempfile import TemporaryDirectory
+import compileall
+import os
+import sys
+import unittest
+
+
+CORE = '''"""Core module."""
+from __future__ import annotations
+
+LIMIT = 10
+NAMES = ['a', 'b']
+
+class Base:
+    """The base."""
+    name: str
+
+class Thing(Base):
+    """A thing."""
+    data: dict[str, list[int]]
+    def __init__(self, name: str, data: dict = {}, /, *, kind: str = 'x') -> None:
+        """Initialize."""
+        super().__init__()
+    @property
+    def size(self) -> int:
+        """The size."""
+    @classmethod
+    def make(cls, name: str = 'default') -> Thing:
+        """Make one."""
+    @staticmethod
+    def helper(value: int = 3) -> int:
+        """Help out."""
+    async def fetch(self, url: str) -> bytes:
+        """Fetch it."""
+
+def compute(a: int, b: float = 1.5, c: bytes = b'c') -> list[int]:
+    """Compute a thing."""
+
+async def run(x: int) -> None:
+    """Run async."""
+'''
+
+
+class TestBytecode(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tempdir = TemporaryDirectory()
+        self.path = self.tempdir.name
+
+    def tearDown(self) -> None:
+        for name in [n for n in sys.modules if n.startswith('bcpkg')]:
+            del sys.modules[name]
+        self.tempdir.cleanup()
+
+    def write(self, name: str, source: str) -> None:
+        path = os.path.join(self.path, *name.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(source)
+
+    def test_matches_imported_module(self):
+        self.write('bcpkg/__init__.py', '"""A package."""\nfrom . import core\n')
+        self.write('bcpkg/core.py', CORE)
+        compileall.compile_dir(self.path, quiet=1)
+
+        module = bytecode.bytecode_module('bcpkg', [self.path])
+        assert not any(n.startswith('bcpkg') for n in sys.modules)
+
+        sys.path.insert(0, self.path)
+        try:
+            imported = import_module('bcpkg')
+        finally:
+            sys.path.remove(self.path)
+
+        options = {'document_submodules': True, 'exclude_names': ['annotations']}
+        expected = functions.dox_a_module(imported, options)
+        observed = functions.dox_a_module(module, options)
+        assert observed == expected, f"expected\n{expected}\nbut observed\n{observed}"
+
+    def test_does_not_execute_module(self):
+        self.write('bcpkg/__init__.py', '''"""Explodes on import."""
+def check(flag: bool = True) -> None:
+    """Checks something."""
+raise RuntimeError('executed')
+''')
+        compileall.compile_dir(self.path, quiet=1)
+        doc = functions.dox_a_module(bytecode.bytecode_module('bcpkg', [self.path]))
+        assert doc == '# bcpkg\n\nExplodes on import.\n\n## Functions\n\n' + \
+            '### `check(flag: bool = True):`\n\nChecks something.\n\n', doc
+
+    def test_stub_bases_per_call(self):
+        self.write('bcpkg/__init__.py', 'import abc\nclass Thing(abc.ABC): pass\n')
+        compileall.compile_dir(self.path, quiet=1)
+        first = bytecode.bytecode_module('bcpkg', [self.path]).Thing
+        second = bytecode.bytecode_module('bcpkg', [self.path]).Thing
+        assert first.__bases__[0].__name__ == 'ABC'
+        assert first.__bases__[0] is not second.__bases__[0]
+
+    def test_unknown_opcodes(self):
+        self.write('bcpkg/__init__.py', 'LIMIT = 1\nVALUE = -LIMIT\ndef fn(x: int = 2): pass\n')
+        compileall.compile_dir(self.path, quiet=1)
+        def stack_effect(*args):
+            raise ValueError('unknown')
+        original = bytecode.stack_effect
+        bytecode.stack_effect = stack_effect
+        try:
+            module = bytecode.bytecode_module('bcpkg', [self.path])
+        finally:
+            bytecode.stack_effect = original
+        assert module.LIMIT == 1 and module.fn.__defaults__ == (2,)
+        assert not hasattr(module, 'VALUE')
+
+    def test_sourceless_and_missing(self):
+        self.write('bcpkg/__init__.py', 'def fn(x=[1, len(\'x\')]): pass\n')
+        compileall.compile_dir(self.path, quiet=1, legacy=True)
+        os.remove(os.path.join(self.path, 'bcpkg', '__init__.py'))
+        module = bytecode.bytecode_module('bcpkg', [self.path])
+        assert module.fn.__defaults__[0][0] == 1
+        assert repr(module.fn.__defaults__[0][1]) == '...'
+        with self.assertRaises(ModuleNotFoundError):
+            bytecode.bytecode_module('bcpkg.missing', [self.path])
+
+    def test_stale_bytecode(self):
+        self.write('bcpkg/__init__.py', 'def old(): pass\n')
+        compileall.compile_dir(self.path, quiet=1)
+        source = os.path.join(self.path, 'bcpkg', '__init__.py')
+        cached = cache_from_source(source)
+        self.write('bcpkg/__init__.py', 'def new(x: int): pass\n')
+        with self.assertRaises(ModuleNotFoundError) as context:
+            bytecode.bytecode_module('bcpkg', [self.path])
+        assert 'out of date' in str(context.exception)
+        with self.assertRaises(ImportError):
+            bytecode.load_bytecode(cached)
+
+        compileall.compile_dir(self.path, quiet=1, force=True,
+                               invalidation_mode=compileall.py_compile.PycInvalidationMode.UNCHECKED_HASH)
+        assert hasattr(bytecode.bytecode_module('bcpkg', [self.path]), 'new')
+        self.write('bcpkg/__init__.py', 'def newer(x: int): pass\n')
+        with self.assertRaises(ModuleNotFoundError):
+            bytecode.bytecode_module('bcpkg', [self.path])
+
+    def test_bad_magic_number_cli(self):
+        self.write('bcpkg/__init__.py', 'def fn(): pass\n')
+        compileall.compile_dir(self.path, quiet=1)
+        cached = cache_from_source(os.path.join(self.path, 'bcpkg', '__init__.py'))
+        with open(cached, 'r+b') as f:
+            f.write(b'\0\0\0\0')
+        output = StringIO()
+        sys.path.insert(0, self.path)
+        try:
+            with redirect_stdout(output):
+                code = functions.invoke_cli(['autodox', 'bcpkg', '-bytecode'])
+        finally:
+            sys.path.remove(self.path)
+        assert code == 1
+        assert output.getvalue().startswith('ImportError: bad magic number in '), output.getvalue()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+from context import TempPackage, functions
+from contextlib import redirect_stderr, redirect_stdout
+from io import StringIO
+import os
+import subprocess
+import sys
+import unittest
+
+
+FILES = {
+    'ckpkg/__init__.py': '"""Checkpointed package."""\n',
+    'ckpkg/first.py': '"""First."""\nclass One:\n    """One."""\n'
+        'def make() -> One:\n    """Makes one."""\n',
+    'ckpkg/second.py': '"""Second."""\nfrom ckpkg.first import One\n'
+        'def use(one: One) -> int:\n    """Uses one."""\n',
+    'ckpkg/third.py': '"""Third."""\nVALUE = 3\n',
+}
+NAMES = ['ckpkg', 'ckpkg.first', 'ckpkg.second', 'ckpkg.third']
+
+
+class Crash(Exception):
+    pass
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tempdir = TempPackage(FILES)
+        self.journal = os.path.join(self.tempdir.name, 'journal.jsonl')
+
+    def tearDown(self) -> None:
+        for event in functions.Event:
+            functions.unset_handler(event)
+        self.tempdir.cleanup()
+
+    def crash_at(self, name: str) -> list[str]:
+        """Sets a BEFORE_MODULE handler that raises on the named module
+            once and returns the names of the modules documented.
+        """
+        seen = []
+        def handler(module, options):
+            seen.append(module.__name__)
+            if module.__name__ == name and seen.count(name) == 1:
+                raise Crash(name)
+            return (module, options)
+        functions.unset_handler(functions.Event.BEFORE_MODULE)
+        functions.set_before_handler(functions.Event.BEFORE_MODULE, handler)
+        return seen
+
+    def test_resume_matches_uninterrupted_run(self):
+        for extra in ({}, {'cross_references': True}, {'low_memory': True}):
+            self.crash_at('')
+            expected = functions.dox_modules(NAMES, extra)
+            options = {**extra, 'checkpoint': self.journal}
+
+            self.crash_at('ckpkg.third')
+            with self.assertRaises(Crash):
+                functions.dox_modules(NAMES, options)
+            assert os.path.exists(self.journal)
+
+            seen = self.crash_at('')
+            assert functions.dox_modules(NAMES, options) == expected, extra
+            assert seen == ['ckpkg.third'], seen
+            assert not os.path.exists(self.journal)
+
+    def test_torn_and_foreign_journals(self):
+        self.crash_at('ckpkg.second')
+        with self.assertRaises(Crash):
+            functions.dox_modules(NAMES, {'checkpoint': self.journal})
+        with open(self.journal, 'ab') as f:
+            f.write(b'{"name":"ckpkg.sec')
+        seen = self.crash_at('')
+        doc = functions.dox_modules(NAMES, {'checkpoint': self.journal})
+        assert seen == ['ckpkg.second', 'ckpkg.third'], seen
+        assert doc == functions.dox_modules(NAMES)
+
+        self.crash_at('ckpkg.second')
+        with self.assertRaises(Crash):
+            functions.dox_modules(NAMES, {'checkpoint': self.journal})
+        # a journal from a run with other options is started over
+        seen = self.crash_at('')
+        functions.dox_modules(NAMES, {'checkpoint': self.journal, 'header_level': 1})
+        assert seen == NAMES, seen
+
+    def test_journal_key(self):
+        options = functions.Options({'checkpoint': self.journal})
+        keys = [functions._checkpoint_key(NAMES, options)]
+        functions.set_after_handler(functions.Event.AFTER_LIST, lambda doc: doc)
+        keys.append(functions._checkpoint_key(NAMES, options))
+        functions.unset_handler(functions.Event.AFTER_LIST)
+        functions.set_after_handler(functions.Event.AFTER_LIST, lambda doc: doc + '\n')
+        keys.append(functions._checkpoint_key(NAMES, options))
+        functions.set_after_handler(functions.Event.AFTER_LIST, str.strip)
+        keys.append(functions._checkpoint_key(NAMES, options))
+        functions.unset_handler(functions.Event.AFTER_LIST)
+        keys.append(functions._checkpoint_key(NAMES, options))
+        assert len(set(keys)) == 4 and keys[0] == keys[-1]
+
+        with self.assertRaises(ValueError):
+            functions.dox_modules(NAMES, {'checkpoint': self.journal, 'deduplicate': True})
+        assert not os.path.exists(self.journal)
+
+    def test_journal_key_across_processes(self):
+        script = (
+            'from context import functions\n'
+            'options = functions.Options({"exclude_names": list("abcdefgh"), "exclude_types": ["x", "y"]})\n'
+            'print(functions._checkpoint_key(["ckpkg"], options))\n'
+        )
+        tests = os.path.dirname(os.path.abspath(__file__))
+        keys = {
+            subprocess.run(
+                [sys.executable, '-c', script], cwd=tests, capture_output=True, text=True,
+                env={**os.environ, 'PYTHONHASHSEED': seed}, check=True
+            ).stdout
+            for seed in ('1', '2', '3', '4')
+        }
+        assert len(keys) == 1, keys
+
+    def test_journal_key_cross_references(self):
+        keys = [
+            functions._checkpoint_key(NAMES, functions.Options(options)) for options in (
+                {},
+                {'symbols': functions.SymbolTable()},
+                {'symbols': functions.SymbolTable([functions.Inventory('a.inv', 'https://a/')])},
+                {'symbols': functions.SymbolTable([functions.Inventory('a.inv', 'https://b/')])},
+            )
+        ]
+        assert len(set(keys)) == 4
+
+        args = ['autodox', *NAMES, f'-checkpoint={self.journal}']
+        self.crash_at('ckpkg.third')
+        with self.assertRaises(Crash), redirect_stdout(StringIO()), redirect_stderr(StringIO()):
+            functions.invoke_cli([*args, '-cross_references'])
+        seen = self.crash_at('')
+        output = StringIO()
+        with redirect_stdout(output):
+            functions.invoke_cli(args)
+        assert seen == NAMES, seen
+        assert '\x01' not in output.getvalue() and '\x03' not in output.getvalue()
+
+    def test_closed_early(self):
+        seen = self.crash_at('')
+        documented = functions._dox_modules(
+            NAMES, functions.Options({'checkpoint': self.journal, 'low_memory': True})
+        )
+        assert next(documented)[0] == 'ckpkg'
+        assert functions._preloaded.get() is not None
+        documented.close()
+        assert functions._preloaded.get() is None and functions._released.get() is None
+        seen.clear()
+        functions.dox_modules(NAMES, {'checkpoint': self.journal, 'low_memory': True})
+        assert seen == NAMES[1:], seen
+
+    def test_sharded_cli(self):
+        output_dir = os.path.join(self.tempdir.name, 'docs')
+        args = ['autodox', *NAMES, '-cross_references', '-shard_size=100']
+        self.crash_at('')
+        functions.invoke_cli([*args, f'-output_dir={output_dir}'])
+        expected = {}
+        for name in os.listdir(output_dir):
+            with open(os.path.join(output_dir, name)) as f:
+                expected[name] = f.read()
+            os.remove(os.path.join(output_dir, name))
+
+        self.crash_at('ckpkg.second')
+        with self.assertRaises(Crash):
+            functions.invoke_cli([*args, f'-output_dir={output_dir}', f'-checkpoint={self.journal}'])
+        seen = self.crash_at('')
+        functions.invoke_cli([*args, f'-output_dir={output_dir}', f'-checkpoint={self.journal}'])
+        assert seen == ['ckpkg.second', 'ckpkg.third'], seen
+        for name, contents in expected.items():
+            with open(os.path.join(output_dir, name)) as f:
+                assert f.read() == contents, name
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+from context import functions
+from autodox.costs import CostReport
+from autodox.metrics import RunMetrics
+from contextlib import redirect_stdout
+from io import StringIO
+from tempfile import TemporaryDirectory
+import json
+import os
+import sys
+import time
+import unittest
+
+
+class TestCostReport(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.tempdir = TemporaryDirectory()
+        root = os.path.join(cls.tempdir.name, 'costpkg')
+        os.makedirs(root)
+        with open(os.path.join(root, '__init__.py'), 'w') as f:
+            f.write('"""Cost package."""\n')
+        with open(os.path.join(root, 'slowdep.py'), 'w') as f:
+            f.write('import time\ntime.sleep(0.05)\n')
+        with open(os.path.join(root, 'heavy.py'), 'w') as f:
+            f.write('"""Imports a slow dependency."""\nfrom . import slowdep\n'
+                    'def work(a: int) -> int:\n    """Works."""\n')
+        with open(os.path.join(root, 'light.py'), 'w') as f:
+            f.write('"""Cheap to import."""\nclass Thing:\n    """A thing."""\n'
+                    'VALUE = 1\n')
+        sys.path.insert(0, cls.tempdir.name)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        sys.path.remove(cls.tempdir.name)
+        for name in [n for n in sys.modules if n.startswith('costpkg')]:
+            del sys.modules[name]
+        cls.tempdir.cleanup()
+
+    def tearDown(self) -> None:
+        for event in functions.Event:
+            functions.unset_handler(event)
+
+    def test_import_and_hook_costs_are_attributed(self):
+        def slow_hook(doc):
+            time.sleep(0.002)
+            return doc
+        functions.set_after_handler(functions.Event.AFTER_LIST, slow_hook)
+        original = functions._dox_a_module
+        with CostReport() as report:
+            doc = functions.dox_modules(['costpkg.heavy', 'costpkg.light'])
+        assert functions._dox_a_module is original
+
+        heavy = report.modules['costpkg.heavy']
+        light = report.modules['costpkg.light']
+        assert heavy['import'] >= 0.05
+        assert light['import'] < 0.05
+        assert [i[0] for i in heavy['imports']] == ['costpkg.slowdep']
+        name, self_time, cumulative, depth = heavy['imports'][0]
+        assert self_time >= 0.05 and cumulative >= self_time and depth == 1
+        assert light['hooks'] >= 0.002
+        assert light['hooks'] > light['formatting']
+        assert heavy['bytes'] + light['bytes'] == len(doc.encode())
+        assert report.worst(1)[0]['module'] == 'costpkg.heavy'
+
+    def test_outputs(self):
+        with CostReport() as report:
+            functions.dox_modules(['costpkg', 'costpkg.light'])
+        summary = report.summary()
+        assert summary.splitlines()[0].split() == ['module', 'import', 'introspection',
+                                                   'formatting', 'hooks', 'total', 'bytes']
+        assert 'totals: import' in summary
+        csv = report.to_csv().splitlines()
+        assert csv[0] == 'module,import,introspection,formatting,hooks,total,bytes'
+        assert [line.split(',')[0] for line in csv[1:]] == ['costpkg', 'costpkg.light']
+        data = json.loads(report.to_json())
+        assert set(data) == {'costpkg', 'costpkg.light'}
+        assert data['costpkg.light']['bytes'] > 0
+
+    def test_cross_references_enter_modules_once(self):
+        entered = []
+        report = CostReport()
+        timed = report._module
+        def module(function):
+            wrapper = timed(function)
+            return lambda module, options={}: entered.append(module.__name__) or wrapper(module, options)
+        report._module = module
+        with report:
+            functions.dox_modules(['costpkg.light'], {'cross_references': True})
+        assert entered.count('costpkg.light') == 1, entered
+
+    def test_patches_removed_on_errors(self):
+        def fail(module, options):
+            raise RuntimeError('failed')
+        functions.set_before_handler(functions.Event.BEFORE_MODULE, fail)
+        original = functions._dox_a_module
+        for flag in ('-cost_report', '-metrics=unused.prom'):
+            with redirect_stdout(StringIO()), TemporaryDirectory() as tempdir:
+                with self.assertRaises(RuntimeError):
+                    functions.invoke_cli([
+                        'autodox', 'costpkg.light', flag.replace('unused', os.path.join(tempdir, 'm'))
+                    ])
+            assert functions._dox_a_module is original
+
+    def test_sharded_output_size(self):
+        writer = functions.ShardWriter('costpkg')
+        with CostReport() as report:
+            functions.dox_modules(['costpkg.light'], {'writer': writer})
+        assert report.modules['costpkg.light']['bytes'] == sum(writer.sizes)
+
+    def test_run_metrics(self):
+        functions.set_after_handler(functions.Event.AFTER_LIST, lambda doc: doc)
+        functions._annotation_cache.clear()
+        with RunMetrics() as metrics:
+            doc = functions.dox_modules(['costpkg.heavy', 'costpkg.light'])
+            heavy = functions.dox_modules(['costpkg.heavy'])
+        data = metrics.to_dict()
+        assert data['documented'] == {
+            'module': 3, 'class': 1, 'method': 0, 'function': 2, 'value': 1
+        }, data['documented']
+        assert data['hooks'] == {'AFTER_LIST': 1}, data['hooks']
+        annotations = data['caches']['annotations']
+        # int as a parameter and as a return type, rendered twice each
+        assert annotations['misses'] == 2 and annotations['hits'] == 2, annotations
+        assert data['bytes'] == len(doc.encode()) + len(heavy.encode())
+        assert data['run']['wall'] >= sum([p['wall'] for p in data['phases'].values()])
+        assert data['run']['cpu'] > 0
+
+        text = metrics.to_prometheus()
+        assert '# TYPE autodox_documented gauge\n' in text
+        assert 'autodox_documented{kind="class"} 1\n' in text
+        assert 'autodox_hook_invocations{event="AFTER_LIST"} 1\n' in text
+        assert 'autodox_cache_hit_ratio{cache="annotations"} 0.5\n' in text
+        assert 'autodox_phase_seconds{phase="import",clock="cpu"} ' in text
+
+    def test_run_metrics_count_modules_once(self):
+        names = ['costpkg.heavy', 'costpkg.light']
+        with RunMetrics() as metrics:
+            functions.dox_modules(names, {'cross_references': True})
+        assert metrics.documented['module'] == 2, metrics.documented
+
+        with RunMetrics() as metrics:
+            functions.dox_modules(names, {'writer': functions.ShardWriter('costpkg', 100)})
+            functions.dox_a_module_sharded(sys.modules['costpkg.light'], {'shard_size': 100})
+        assert metrics.documented['module'] == 3, metrics.documented
+        assert metrics.documented['class'] == 2, metrics.documented
+
+    def test_cli_metrics(self):
+        with TemporaryDirectory() as tempdir:
+            for name in ('metrics.prom', 'metrics.json'):
+                path = os.path.join(tempdir, name)
+                with redirect_stdout(StringIO()):
+                    code = functions.invoke_cli(['autodox', 'costpkg.light', f'-metrics={path}'])
+                assert code == 0
+                assert os.listdir(tempdir)[-1:] != [f'{name}.tmp']
+                with open(path) as f:
+                    contents = f.read()
+                if name.endswith('.json'):
+                    assert json.loads(contents)['documented']['module'] == 1
+                else:
+                    assert 'autodox_documented{kind="module"} 1\n' in contents
+
+            path = os.path.join(tempdir, 'failed.prom')
+            with redirect_stdout(StringIO()):
+                code = functions.invoke_cli(['autodox', 'costpkg.missing', f'-metrics={path}'])
+            assert code == 1
+            assert os.path.exists(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
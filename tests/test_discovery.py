@@ -0,0 +1,300 @@
+from context import TempPackage, functions
+from contextlib import redirect_stderr, redirect_stdout
+from io import StringIO
+from tempfile import TemporaryDirectory
+import os
+import sys
+import threading
+import unittest
+
+
+FILES = {
+    'discpkg/__init__.py': '"""Imports nothing."""\n',
+    'discpkg/core.py': '"""Core."""\ndef core_fn() -> None:\n    """Does core things."""\n',
+    'discpkg/sub/__init__.py': '',
+    'discpkg/sub/deep.py': 'DEEP = 1\n',
+    'discpkg/nspkg/mod.py': '"""In a namespace package."""\n',
+    'discpkg/data/readme.txt': 'not a module\n',
+    'discpkg/_private.py': '',
+}
+EXPORT_FILES = {
+    'exportpkg/__init__.py': '',
+    'exportpkg/exported.py': '"""Declares its exports."""\nimport os\n'
+        '__all__ = ["public_fn", "_Declared"]\n'
+        'def public_fn() -> None:\n    """Exported."""\n'
+        'class _Declared:\n    """Declared though private."""\n'
+        'def helper() -> None:\n    """Not exported."""\n',
+}
+
+
+class TestDiscovery(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.tempdir = TempPackage(FILES)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.tempdir.cleanup()
+
+    def test_discover_modules(self):
+        before = set(sys.modules)
+        names = functions.discover_modules('discpkg', namespace_packages=True)
+        assert set(sys.modules) == before
+        assert names == [
+            'discpkg', 'discpkg._private', 'discpkg.core', 'discpkg.nspkg',
+            'discpkg.nspkg.mod', 'discpkg.sub', 'discpkg.sub.deep',
+        ], names
+        # directories without an __init__.py are skipped by default
+        names = functions.discover_modules('discpkg')
+        assert 'discpkg.nspkg' not in names and 'discpkg.sub.deep' in names, names
+
+    def test_patterns(self):
+        names = functions.discover_modules('discpkg', ['discpkg.sub*', 'discpkg.core'])
+        assert names == ['discpkg.core', 'discpkg.sub', 'discpkg.sub.deep'], names
+        names = functions.discover_modules('discpkg', [], ['*._*', '*.nspkg*'])
+        assert names == ['discpkg', 'discpkg.core', 'discpkg.sub', 'discpkg.sub.deep'], names
+        with self.assertRaises(ModuleNotFoundError):
+            functions.discover_modules('discpkg_missing')
+
+    def test_dox_modules(self):
+        names = functions.discover_modules('discpkg', ['discpkg.core', 'discpkg.sub.deep'])
+        doc = functions.dox_modules(names)
+        assert doc == '# discpkg.core\n\nCore.\n\n## Functions\n\n' + \
+            '### `core_fn():`\n\nDoes core things.\n\n' + \
+            '# discpkg.sub.deep\n\n## Values\n\n- `DEEP`: int\n', doc
+
+    def test_cli_targets_and_patterns(self):
+        output = StringIO()
+        with redirect_stdout(output):
+            code = functions.invoke_cli([
+                'autodox', 'discpkg.sub.*', 'discpkg.core', '-exclude_module=*.nspkg*'
+            ])
+        assert code == 0
+        assert output.getvalue() == '# discpkg.sub.deep\n\n## Values\n\n- `DEEP`: int\n' + \
+            '# discpkg.core\n\nCore.\n\n## Functions\n\n' + \
+            '### `core_fn():`\n\nDoes core things.\n\n\n', output.getvalue()
+
+    def test_prefetch(self):
+        names = functions.discover_modules('discpkg')
+        expected = functions.dox_modules(names, {'use_all': True})
+        imported = {}
+        def record(module, options):
+            imported[module.__name__] = sorted([n for n in sys.modules if n.startswith('discpkg')])
+            return (module, options)
+        functions.set_before_handler(functions.Event.BEFORE_MODULE, record)
+        try:
+            self.tempdir.forget()
+            assert functions.dox_modules(names, {'use_all': True, 'prefetch': 3}) == expected
+        finally:
+            functions.unset_handler(functions.Event.BEFORE_MODULE)
+        # submodules are only imported once their package is documented
+        assert imported['discpkg'] == ['discpkg'], imported
+
+        with self.assertRaises(ModuleNotFoundError):
+            functions.dox_modules(['discpkg.core', 'discpkg.missing'], {'prefetch': 1})
+        docs = functions._dox_modules(['discpkg.core', 'discpkg.missing', 'discpkg.sub'],
+                                      functions.Options({'prefetch': 2}))
+        assert next(docs)[0] == 'discpkg.core'
+        with self.assertRaises(ModuleNotFoundError):
+            next(docs)
+        assert not [t for t in threading.enumerate() if t.name == 'autodox-prefetch']
+
+        # submodules listed before their packages
+        names = ['discpkg.sub.deep', 'discpkg.core', 'discpkg.sub', 'discpkg']
+        expected = functions.dox_modules(names)
+        self.tempdir.forget()
+        results = []
+        thread = threading.Thread(
+            target=lambda: results.append(functions.dox_modules(names, {'prefetch': 2})), daemon=True
+        )
+        thread.start()
+        thread.join(10)
+        assert results == [expected]
+
+        # only exceptions are passed on; the run imports modules the thread could not
+        package = TempPackage({'discexit.py': 'raise SystemExit(3)\n'})
+        excepthook, threading.excepthook = threading.excepthook, lambda args: None
+        try:
+            with self.assertRaises(SystemExit):
+                functions.dox_modules(['discpkg.core', 'discexit', 'discpkg.sub'], {'prefetch': 2})
+        finally:
+            threading.excepthook = excepthook
+            package.cleanup()
+        assert not [t for t in threading.enumerate() if t.name == 'autodox-prefetch']
+
+        errors = StringIO()
+        with redirect_stdout(StringIO()), redirect_stderr(errors), TemporaryDirectory() as tempdir:
+            functions.invoke_cli(['autodox', 'discpkg.core', '-prefetch=2', '-workers=2',
+                                  f'-cost_report={os.path.join(tempdir, "costs.json")}'])
+        assert errors.getvalue().startswith('-prefetch is ignored with -cost_report and -metrics\n'
+                                            '-workers is ignored with -cost_report and -metrics\n')
+
+    def test_shard_modules(self):
+        names = ['a', 'b', 'c', 'd', 'e']
+        timings = {'a': 1.0, 'b': 5.0, 'c': 2.0, 'd': 2.0}
+        shards = [functions.shard_modules(names, i, 2, timings) for i in (1, 2)]
+        # longest first: b (5) -> 1, e (unknown: average 2.5) -> 2, c (2) -> 2,
+        # d (2) -> 2, a (1) -> 1
+        assert shards == [['a', 'b'], ['c', 'd', 'e']], shards
+        assert functions.shard_modules(names, 1, 1) == names
+        assert sorted(sum([functions.shard_modules(names, i, 3) for i in (1, 2, 3)], [])) == names
+        with self.assertRaises(ValueError):
+            functions.shard_modules(names, 3, 2)
+
+    def test_sharded_cli_and_merge(self):
+        with TemporaryDirectory() as tempdir:
+            timings = os.path.join(tempdir, 'timings.json')
+            output = StringIO()
+            with redirect_stdout(output), redirect_stderr(StringIO()):
+                functions.invoke_cli(['autodox', 'discpkg.*', '-cross_references',
+                                      f'-cost_report={timings}'])
+            expected = output.getvalue()
+
+            paths = []
+            for i in (1, 2, 3):
+                output = StringIO()
+                with redirect_stdout(output):
+                    code = functions.invoke_cli(['autodox', 'discpkg.*', '-cross_references',
+                                                 f'-shard={i}/3', f'-timings={timings}'])
+                assert code == 0
+                paths.append(os.path.join(tempdir, f'shard{i}.json'))
+                with open(paths[-1], 'w') as f:
+                    f.write(output.getvalue())
+
+            output = StringIO()
+            with redirect_stdout(output):
+                code = functions.invoke_cli(['autodox', 'merge', *reversed(paths)])
+            assert code == 0
+            assert output.getvalue() == expected
+
+            output = StringIO()
+            with redirect_stdout(output):
+                code = functions.invoke_cli(['autodox', 'merge', *paths[:2]])
+            assert code == 1
+            assert output.getvalue() == 'ValueError: expected shards 1 to 3 but got [1, 2]\n'
+
+        for shard in ('1', '0/3', '4/3', '1/2/3', 'a/3', '-1/3'):
+            output = StringIO()
+            with redirect_stdout(output):
+                code = functions.invoke_cli(['autodox', 'discpkg.*', f'-shard={shard}'])
+            assert code == 1
+            assert output.getvalue().startswith(f'invalid option: -shard={shard} '), shard
+
+    def test_config_targets(self):
+        with TemporaryDirectory() as tempdir:
+            config = os.path.join(tempdir, 'pyproject.toml')
+            core = os.path.join(tempdir, 'docs', 'core.md')
+            sub = os.path.join(tempdir, 'docs', 'sub.md')
+            with open(config, 'w') as f:
+                f.write(
+                    '[project]\nname = "example"\n\n'
+                    '[tool.autodox]\nheader_level = 1\n\n'
+                    '[[tool.autodox.targets]]\n'
+                    f'modules = ["discpkg.core"]\noutput = "{core}"\n'
+                    'function_format = "list"\nline_length = 40\n\n'
+                    '[[tool.autodox.targets]]\n'
+                    f'modules = ["discpkg.sub.*"]\noutput = "{sub}"\n'
+                    'exclude_module = ["*.nothing", "*.nope"]\nheader_level = 2\n'
+                )
+            assert functions.invoke_cli(['autodox', f'-config={config}']) == 0
+
+            for path, args in (
+                (core, ['discpkg.core', '-header_level=1', '-function_format=list',
+                        '-line_length=40']),
+                (sub, ['discpkg.sub.*', '-header_level=2', '-exclude_module=*.nothing,*.nope']),
+            ):
+                output = StringIO()
+                with redirect_stdout(output):
+                    functions.invoke_cli(['autodox', *args])
+                with open(path) as f:
+                    assert f.read() == output.getvalue()
+            with open(sub) as f:
+                assert f.read().startswith('### discpkg.sub.deep\n')
+
+    def test_config_target_errors(self):
+        levels = []
+        def before(module, options):
+            levels.append(functions._debug_level)
+            return (module, options)
+        functions.set_before_handler(functions.Event.BEFORE_MODULE, before)
+        with TemporaryDirectory() as tempdir:
+            config = os.path.join(tempdir, 'pyproject.toml')
+            paths = [os.path.join(tempdir, f'{i}.md') for i in range(4)]
+            with open(config, 'w') as f:
+                f.write(
+                    '[tool.autodox]\n\n'
+                    f'[[tool.autodox.targets]]\nmodules = ["discpkg.core"]\noutput = "{paths[0]}"\n'
+                    'line_length = "wide"\n\n'
+                    f'[[tool.autodox.targets]]\nmodules = ["discpkg.core"]\noutput = "{paths[1]}"\n'
+                    'function_format = "bullets"\n\n'
+                    f'[[tool.autodox.targets]]\nmodules = ["discpkg.core"]\noutput = "{paths[2]}"\n'
+                    'debug = true\n\n'
+                    f'[[tool.autodox.targets]]\nmodules = ["discpkg.core"]\noutput = "{paths[3]}"\n'
+                )
+            errors = StringIO()
+            try:
+                with redirect_stderr(errors):
+                    assert functions.invoke_cli(['autodox', f'-config={config}']) == 1
+            finally:
+                functions.unset_handler(functions.Event.BEFORE_MODULE)
+            assert errors.getvalue().count(' failed\n') == 2
+            assert f'target {paths[0]} failed' in errors.getvalue()
+            assert f'target {paths[1]} failed' in errors.getvalue()
+            with open(paths[3]) as f:
+                assert f.read().startswith('# discpkg.core\n')
+        assert levels == [1, 0]
+        assert functions._debug_level == 0
+
+    def test_config_failed_target_keeps_output(self):
+        with TemporaryDirectory() as tempdir:
+            config = os.path.join(tempdir, 'pyproject.toml')
+            path = os.path.join(tempdir, 'core.md')
+            with open(config, 'w') as f:
+                f.write(f'[[tool.autodox.targets]]\nmodules = ["discpkg.core"]\noutput = "{path}"\n')
+            assert functions.invoke_cli(['autodox', f'-config={config}']) == 0
+            with open(path) as f:
+                expected = f.read()
+
+            with open(config, 'w') as f:
+                f.write(f'[[tool.autodox.targets]]\nmodules = ["discpkg.missing"]\noutput = "{path}"\n')
+            errors = StringIO()
+            with redirect_stderr(errors):
+                assert functions.invoke_cli(['autodox', f'-config={config}']) == 1
+            assert errors.getvalue().startswith('ModuleNotFoundError: '), errors.getvalue()
+            assert f'target {path} failed' in errors.getvalue()
+            with open(path) as f:
+                assert f.read() == expected
+
+
+class TestExports(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.tempdir = TempPackage(EXPORT_FILES)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.tempdir.cleanup()
+
+    def test_all_is_honored(self):
+        module = functions._load_module('exportpkg.exported', functions.Options({}))
+        everything = functions.dox_a_module(module)
+        assert '`helper():`' in everything and '_Declared' not in everything
+        doc = functions.dox_a_module(module, {'use_all': True, 'list_undeclared': True})
+        assert doc == '# exportpkg.exported\n\nDeclares its exports.\n\n' + \
+            '## Classes\n\n### `_Declared`\n\nDeclared though private.\n\n' + \
+            '## Functions\n\n### `public_fn():`\n\nExported.\n\n' + \
+            '## Undeclared\n\n- `os`\n- `helper`\n\n', doc
+
+        output = StringIO()
+        with redirect_stdout(output):
+            functions.invoke_cli(['autodox', 'exportpkg.exported*'])
+        assert '`public_fn():`' in output.getvalue()
+        assert 'helper' not in output.getvalue()
+        output = StringIO()
+        with redirect_stdout(output):
+            functions.invoke_cli(['autodox', 'exportpkg.exported*', '-ignore_all'])
+        assert '`helper():`' in output.getvalue()
+
+
+if __name__ == '__main__':
+    unittest.main()
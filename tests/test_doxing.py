@@ -1,7 +1,15 @@
 from __future__ import annotations
+from collections import OrderedDict
 from context import functions
+from tempfile import TemporaryDirectory
+from types import ModuleType
 from typing import Any, Hashable, Protocol, runtime_checkable
+import collections.abc as abc
+import os
+import re
+import sys
 import unittest
+import zlib
 
 
 class ExampleClass:
@@ -414,5 +422,424 @@ mollit anim id est laborum.
         assert observed == expected, f"expected\n{expected}\nbut observed\n{observed}"
 
 
+class TestAnnotationRendering(unittest.TestCase):
+    def test_rendered_annotations_are_cached(self):
+        functions._annotation_cache.clear()
+        functions.dox_a_class(ExampleClass)
+        assert ('class', str, 'Hashable', None) in functions._annotation_cache
+        assert ('return', str, 'ExampleClass', None) in functions._annotation_cache
+        functions._annotation_cache[('return', str, 'ExampleClass', None)] = 'Cached'
+        doc = functions.dox_a_function(ExampleClass.unpack)
+        assert '-> Cached:' in doc, doc
+        functions._annotation_cache.clear()
+
+    def test_equal_annotations_of_other_types(self):
+        def one(arg: 1) -> None: ...
+        def true(arg: True) -> None: ...
+        assert functions.dox_a_function(one) == '- `one(arg: 1) -> None:`\n'
+        assert functions.dox_a_function(true) == '- `true(arg: True) -> None:`\n'
+
+    def test_namespaces_imported_later(self):
+        functions._namespace_cache.clear()
+        name = 'autodox_later_module'
+        assert functions._module_namespace(name) is None
+        module = ModuleType(name)
+        sys.modules[name] = module
+        try:
+            assert functions._module_namespace(name) is module.__dict__
+        finally:
+            del sys.modules[name]
+            functions._namespace_cache.clear()
+
+    def test_unhashable_annotations(self):
+        def fn(arg: ['not', 'hashable']) -> None: ...
+        doc = functions.dox_a_function(fn)
+        assert "fn(arg: ['not', 'hashable'])" in doc, doc
+
+    def test_resolve_annotations(self):
+        def fn(things: list[ExampleClass], data: Hashable) -> dict[str, list[ExampleClass]]: ...
+        doc = functions.dox_a_function(fn)
+        assert doc == '- `fn(things: list[ExampleClass], data: Hashable) -> ' + \
+            'dict[str, list[ExampleClass]]:`\n', doc
+
+        doc = functions.dox_a_function(fn, {'resolve_annotations': True})
+        module = ExampleClass.__module__
+        assert doc == f'- `fn(things: list[{module}.ExampleClass], data: Hashable) -> ' + \
+            f'dict[str, list[{module}.ExampleClass]]:`\n', doc
+
+        # resolved class annotations render the same as the raw strings
+        resolved = functions.dox_a_class(ExampleClass, {'resolve_annotations': True})
+        assert resolved == functions.dox_a_class(ExampleClass)
+
+    def test_unresolvable_annotations_are_kept(self):
+        def fn(thing: DoesNotExist) -> None: ...
+        doc = functions.dox_a_function(fn, {'resolve_annotations': True})
+        assert doc == '- `fn(thing: DoesNotExist) -> None:`\n', doc
+
+
+class TestOptions(unittest.TestCase):
+    def test_dict_conversion(self):
+        options = functions.Options({
+            'exclude_names': ['a', 'b'], 'include_private': True, 'package': 'pkg'
+        })
+        assert options.exclude_names == frozenset(['a', 'b'])
+        assert options.include_private is True
+        assert options.include_dunder is False
+        assert options.header_level == 0
+        assert 'include_private' in options and 'include_dunder' not in options
+        assert options['package'] == 'pkg' and options.extras == {'package': 'pkg'}
+        assert options.get('header_level', 3) == 3
+        assert options.to_dict() == {
+            'exclude_names': ['a', 'b'], 'include_private': True, 'package': 'pkg'
+        } or options.to_dict() == {
+            'exclude_names': ['b', 'a'], 'include_private': True, 'package': 'pkg'
+        }
+        assert functions._options(options) is options
+
+    def test_immutable(self):
+        options = functions.Options({'header_level': 1})
+        with self.assertRaises(AttributeError):
+            options.header_level = 2
+        with self.assertRaises(TypeError):
+            options['header_level'] = 2
+
+    def test_validation(self):
+        with self.assertRaises(TypeError):
+            functions.Options({'header_level': '1'})
+        with self.assertRaises(TypeError):
+            functions.Options({'exclude_names': 'name'})
+        with self.assertRaises(ValueError):
+            functions.Options({'function_format': 'table'})
+        with self.assertRaises(ValueError):
+            functions.dox_a_class(ExampleClass, {'line_length': 0})
+
+    def test_derive_is_an_overlay(self):
+        options = functions.Options({'line_length': 72})
+        child = options.derive(header_level=2)
+        grandchild = child.derive(format='header')
+        assert grandchild.header_level == 2
+        assert grandchild.format == 'header'
+        assert grandchild.line_length == 72
+        assert 'header_level' in grandchild and 'header_level' not in options
+        assert options.header_level == 0 and options.format == 'list'
+        # only the changed options are stored on the overlay
+        child = options.derive(header_level=2)
+        with self.assertRaises(AttributeError):
+            object.__getattribute__(child, 'line_length')
+        assert child.line_length == 72
+        assert object.__getattribute__(child, 'line_length') == 72
+
+    def test_dict_and_options_render_the_same(self):
+        options = {'include_private': True, 'method_format': 'paragraph'}
+        assert functions.dox_a_class(ExampleClass, options) == \
+            functions.dox_a_class(ExampleClass, functions.Options(options))
+
+
+def make_package() -> ModuleType:
+    """Builds a small package with a submodule in memory."""
+    package = ModuleType('example_package', 'An example package.')
+    submodule = ModuleType('example_package.sub', 'An example submodule.')
+    for module in (package, submodule):
+        for i in range(3):
+            cls = type(f'Thing{i}', (), {'__doc__': f'Thing number {i}.'})
+            cls.__module__ = module.__name__
+            setattr(module, cls.__name__, cls)
+    package.sub = submodule
+    return package
+
+
+class TestShardedOutput(unittest.TestCase):
+    def test_anchors(self):
+        doc = functions.dox_a_class(ExampleInterface, {'anchors': True})
+        assert doc.startswith('<a id="test_doxing-ExampleInterface"></a>\n# `ExampleInterface(Protocol)`'), doc
+        names = ['pkg.my_mod', 'pkg.my.mod', 'pkg.mod.Thing', 'pkg.mod.thing']
+        assert len({functions._anchor(name) for name in names}) == len(names)
+
+    def test_shards_match_single_document(self):
+        package = make_package()
+        options = {'document_submodules': True, 'anchors': True}
+        expected = functions.dox_a_module(package, options)
+
+        writer = functions.ShardWriter(package.__name__, 10_000_000)
+        doc = functions.dox_a_module(package, {**options, 'writer': writer})
+        assert doc == ''
+        assert len(writer.shards) == 1
+        observed = ''.join(writer.shards[0])
+        assert observed == expected, f"expected\n{expected}\nbut observed\n{observed}"
+
+    def test_after_module_handler_with_writer(self):
+        calls = []
+        def handler(doc: str) -> str:
+            calls.append(doc)
+            return doc.replace('Thing number', 'Item number') + 'FOOTER\n'
+        functions.unset_handler(functions.Event.AFTER_MODULE)
+        functions.set_after_handler(functions.Event.AFTER_MODULE, handler)
+        try:
+            files = functions.dox_a_module_sharded(make_package(), {
+                'document_submodules': True, 'shard_size': 100
+            })
+        finally:
+            functions.unset_handler(functions.Event.AFTER_MODULE)
+        # called once per module, and each class is still its own section
+        assert len(calls) == 2
+        assert calls[1].startswith('<a id="example_package-sub"></a>\n### example_package.sub\n'), calls[1]
+        assert len(files) > 2
+        assert '  - [example_package.Thing1](' in files['example_package.md']
+        assert '  - [example_package.sub.Thing2](' in files['example_package.md']
+        contents = ''.join([files[name] for name in sorted(files) if name != 'example_package.md'])
+        assert 'Thing number' not in contents and contents.count('Item number') == 6, contents
+        assert contents.count('FOOTER') == 2, contents
+
+    def test_shard_size_and_toc(self):
+        files = functions.dox_a_module_sharded(make_package(), {
+            'document_submodules': True, 'shard_size': 100
+        })
+        assert len(files) > 2
+        index = files['example_package.md']
+        assert index.startswith('- [example_package](example_package-0001.md#example_package)\n')
+        assert '  - [example_package.sub.Thing2](' in index
+        for name, contents in files.items():
+            if name == 'example_package.md':
+                continue
+            assert '[Contents](example_package.md)' in contents
+            # every anchor linked from the table of contents is in its shard
+            for line in index.split('\n'):
+                if f'({name}#' in line:
+                    anchor = line.split('#')[1][:-1]
+                    assert f'<a id="{anchor}"></a>' in contents
+
+
+def make_linked_modules() -> tuple[ModuleType, ModuleType]:
+    """Builds two modules in memory whose functions and classes refer
+        to each other's classes, one of them before it is documented.
+    """
+    api = ModuleType('linked_api', 'Functions using the models.')
+    models = ModuleType('linked_models', 'Some models.')
+    Kind = type('Kind', (), {'__doc__': 'A kind.', '__module__': models.__name__})
+    Thing = type('Thing', (), {
+        '__doc__': 'A thing.', '__module__': models.__name__,
+        '__annotations__': {'kind': Kind, 'extra': dict[str, Kind], 'other': abc.Hashable},
+    })
+    models.Kind, models.Thing = Kind, Thing
+    def make(kind=Kind, *, parent=None):
+        """Make things."""
+    make.__annotations__ = {'kind': Kind, 'parent': Thing|None, 'return': list[Thing]}
+    make.__module__ = api.__name__
+    api.make = make
+    return api, models
+
+
+class TestCrossReferences(unittest.TestCase):
+    def test_links_resolve_across_modules(self):
+        api, models = make_linked_modules()
+        symbols = functions.SymbolTable()
+        doc = functions.dox_a_module(api, {'symbols': symbols})
+        assert '`[`Kind`](#linked_models-Kind)`' not in doc
+        assert 'Kind' in doc and '\x01' not in doc
+        assert symbols.unresolved == {'linked_models.Kind': 2, 'linked_models.Thing': 2}
+
+        symbols = functions.SymbolTable()
+        doc = ''.join([
+            functions.dox_a_module(module, {'symbols': symbols}) for module in (api, models)
+        ])
+        assert '\x01' not in doc and '\x03' not in doc
+
+        package = ModuleType('linked', 'Both modules.')
+        package.api, package.models = api, models
+        doc = functions.dox_a_module(package, {'cross_references': True, 'document_submodules': True})
+        assert '`make(kind: `[`Kind`](#linked_models-Kind)` = `[`Kind`](#linked_models-Kind)`' in doc, doc
+        assert 'parent: `[`linked_models.Thing`](#linked_models-Thing)` | None = None' in doc, doc
+        assert '-> list[`[`linked_models.Thing`](#linked_models-Thing)`]:`' in doc, doc
+        assert '- kind: [linked_models.Kind](#linked_models-Kind)\n' in doc, doc
+        assert '- extra: dict[str, [linked_models.Kind](#linked_models-Kind)]\n' in doc, doc
+        assert '- other: collections.abc.Hashable\n' in doc, doc
+        assert '<a id="linked_models-Kind"></a>' in doc
+
+    def test_entry_points_resolve(self):
+        api, models = make_linked_modules()
+        symbols = functions.SymbolTable()
+        doc = functions.dox_a_function(api.make, {'symbols': symbols})
+        assert '\x01' not in doc and '\x02' not in doc, repr(doc)
+        assert '`make(kind: Kind = Kind, /, *, parent: linked_models.Thing | None' in doc, doc
+        assert symbols.unresolved == {'linked_models.Kind': 2, 'linked_models.Thing': 2}
+
+        doc = functions.dox_a_class(models.Thing, {'cross_references': True})
+        assert '\x01' not in doc and '\x03' not in doc, repr(doc)
+        assert '- kind: linked_models.Kind\n' in doc, doc
+
+        seen = []
+        functions.set_after_handler(functions.Event.AFTER_FUNCTION, lambda doc: seen.append(doc) or doc)
+        try:
+            doc = functions.dox_a_function(api.make, {'cross_references': True})
+        finally:
+            functions.unset_handler(functions.Event.AFTER_FUNCTION)
+        assert '\x01linked_models.Thing\x02linked_models.Thing\x01' in seen[0], repr(seen[0])
+        assert functions.SymbolTable().resolve(seen[0]) == doc
+
+    def test_unresolved_report(self):
+        _, models = make_linked_modules()
+        symbols = functions.SymbolTable()
+        functions.dox_a_module(models, {'symbols': symbols, 'exclude_names': ['Kind']})
+        assert symbols.unresolved == {'linked_models.Kind': 2, 'collections.abc.Hashable': 1}
+        assert symbols.report() == '- linked_models.Kind (2)\n- collections.abc.Hashable (1)\n'
+        assert 'linked_models.Thing' in symbols.anchors
+
+    def test_external_inventories(self):
+        _, models = make_linked_modules()
+        with TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, 'objects.inv')
+            with open(path, 'wb') as f:
+                f.write(b'# Sphinx inventory version 2\n# Project: Python\n# Version: 3\n'
+                        b'# The remainder of this file is compressed using zlib.\n' + zlib.compress(
+                    b'collections.abc.Hashable py:class 1 library/collections.abc.html#$ -\n'
+                    b'glossary std:label -1 glossary.html#$ Glossary\n'
+                ))
+            sphinx = functions.Inventory(path, 'https://docs.python.org/3/')
+            symbols = functions.SymbolTable([sphinx])
+            doc = functions.dox_a_module(models, {'symbols': symbols})
+            url = 'https://docs.python.org/3/library/collections.abc.html#collections.abc.Hashable'
+            assert f'- other: [collections.abc.Hashable]({url})\n' in doc, doc
+            assert symbols.unresolved == {}
+            assert sphinx.get('glossary') is None
+
+            path = os.path.join(tempdir, 'symbols.inv')
+            links = {f'example.Name{i}': f'example.html#name{i}' for i in range(500)}
+            functions.Inventory.write(path, {**links, **dict(sphinx.items())})
+            with functions.Inventory(path, 'https://docs.python.org/3/') as inventory:
+                assert inventory._data is None
+                assert inventory.get('collections.abc.Hashable') == url
+                assert inventory.get('example.Name7') == 'https://docs.python.org/3/example.html#name7'
+                assert inventory.get('example.Name') is None and inventory.get('zzz') is None
+                assert dict(inventory.items()) == {**links, **dict(sphinx.items())}
+            assert inventory._data is None
+            assert inventory.get('example.Name8') == 'https://docs.python.org/3/example.html#name8'
+            inventory.close()
+
+            inventory = functions._inventory_arg(f'{path}=https://example.com/docs?v=1,2')
+            assert (inventory.path, inventory.base_url) == (path, 'https://example.com/docs?v=1,2')
+            assert functions.SymbolTable().inventories == []
+            assert functions.SymbolTable().inventories is not functions.SymbolTable().inventories
+
+    def test_shards_link_across_files(self):
+        api, models = make_linked_modules()
+        package = ModuleType('linked', 'Both modules.')
+        package.api, package.models = api, models
+        files = functions.dox_a_module_sharded(package, {
+            'document_submodules': True, 'cross_references': True, 'shard_size': 100
+        })
+        doc = ''.join(files.values())
+        assert '\x01' not in doc and '\x03' not in doc
+        targets = re.findall(r'\]\(([^)#]*)#linked_models-Kind\)', doc)
+        assert len(targets) == 5 and len(set(targets)) == 1, targets
+        assert '<a id="linked_models-Kind"></a>' in files[targets[0]]
+
+
+class TestValueTable(unittest.TestCase):
+    def tearDown(self) -> None:
+        for event in functions.Event:
+            functions.unset_handler(event)
+
+    def test_module_values_table(self):
+        module = ModuleType('table_example', 'Many constants.')
+        module.ALPHA = 1
+        module.BETA = 'a|b'
+        module.GAMMA = 'x' * 100
+        module.DELTA = [1, 2]
+        calls = []
+        functions.set_after_handler(functions.Event.AFTER_VALUE, lambda doc: calls.append(doc) or doc)
+        functions.set_after_handler(functions.Event.AFTER_LIST, lambda doc: calls.append(doc) or doc)
+        doc = functions.dox_a_module(module, {'value_format': 'table'})
+        assert doc == '# table_example\n\nMany constants.\n\n## Values\n\n' + \
+            '| Name | Type | Value |\n| --- | --- | --- |\n' + \
+            '| `ALPHA` | int | `1` |\n' + \
+            "| `BETA` | str | `'a\\|b'` |\n" + \
+            f"| `GAMMA` | str | `'{'x' * 56}...` |\n" + \
+            '| `DELTA` | list |  |\n\n', doc
+        assert calls == []
+
+        with self.assertRaises(ValueError):
+            functions.Options({'method_format': 'table'})
+
+    def test_enum_members_table(self):
+        class Color(functions.Enum):
+            """Some colors."""
+            RED = 1
+            GREEN = 'green'
+        doc = functions.dox_a_class(Color, {'value_format': 'table'})
+        assert '## Members\n\n| Name | Value |\n| --- | --- |\n' + \
+            "| `RED` | `1` |\n| `GREEN` | `'green'` |\n\n" in doc, doc
+        assert 'Members' not in functions.dox_a_class(Color)
+
+
+def make_reexporting_modules() -> tuple[ModuleType, ModuleType]:
+    core = ModuleType('dedup.core', 'Defines things.')
+    exec(
+        'class Thing:\n    """A thing."""\n'
+        'def make() -> Thing:\n    """Makes a thing."""\n'
+        'Alias = Thing\n',
+        core.__dict__
+    )
+    package = ModuleType('dedup', 'Re-exports things.')
+    package.Thing, package.make, package.core = core.Thing, core.make, core
+    package.OrderedDict = OrderedDict
+    other = ModuleType('dedup.other')
+    other.OrderedDict = OrderedDict
+    package.other = other
+    return package, core
+
+
+class TestDeduplicate(unittest.TestCase):
+    def test_aliases_link_to_canonical_location(self):
+        package, core = make_reexporting_modules()
+        options = {'deduplicate': True, 'document_submodules': True, 'cross_references': True}
+        doc = functions.dox_a_module(package, options)
+        assert doc.count('A thing.') == 1 and doc.count('Makes a thing.') == 1, doc
+        assert '### `Thing`\n\nAlias of [`dedup.core.Thing`](#dedup-core-Thing).\n\n' in doc, doc
+        assert '### `make`\n\nAlias of [`dedup.core.make`](#dedup-core).\n\n' in doc, doc
+        assert '##### `Alias`\n\nAlias of [`dedup.core.Thing`](#dedup-core-Thing).\n\n' in doc, doc
+        assert '<a id="dedup-core-Thing"></a>\n##### `Thing`\n\nA thing.' in doc, doc
+
+        # not documented by the run: rendered where it is first found
+        assert doc.count('Dictionary that remembers insertion order') == 1, doc
+        assert 'Alias of [`collections.OrderedDict`](#collections-OrderedDict)' in doc, doc
+
+        without = functions.dox_a_module(package, {'document_submodules': True})
+        assert without.count('A thing.') == 3
+
+    def test_aliases_across_modules(self):
+        package, core = make_reexporting_modules()
+        # the run does not document dedup.core, so its items are rendered here
+        doc = functions.dox_a_module(package, {'deduplicate': True, 'function_format': 'list'})
+        assert '## Classes\n\n<a id="dedup-core-Thing"></a>\n### `Thing`\n\nA thing.\n' in doc, doc
+        assert '- `make() -> Thing:` Makes a thing.\n' in doc, doc
+        assert 'lias of [`dedup.core' not in doc, doc
+
+        sys.modules.update({'dedup': package, 'dedup.core': core})
+        try:
+            doc = functions.dox_modules(['dedup', 'dedup.core'], {
+                'deduplicate': True, 'cross_references': True, 'function_format': 'list'
+            })
+        finally:
+            del sys.modules['dedup'], sys.modules['dedup.core']
+        assert doc.count('A thing.') == 1 and doc.count('Makes a thing.') == 1, doc
+        assert '- `make`: alias of [`dedup.core.make`](#dedup-core).\n' in doc, doc
+
+    def test_items_excluded_at_canonical_location(self):
+        package, core = make_reexporting_modules()
+        exec('class _Secret:\n    """A secret."""\n', core.__dict__)
+        package.Secret, package.build = core._Secret, core.make
+        options = {'deduplicate': True, 'document_submodules': True, 'exclude_names': ['make']}
+        doc = functions.dox_a_module(package, options)
+        assert doc.count('A secret.') == 1 and doc.count('Makes a thing.') == 1, doc
+        assert 'Alias of [`dedup.core._Secret`' not in doc, doc
+        assert 'Alias of [`dedup.core.make`' not in doc, doc
+        assert doc.count('A thing.') == 1, doc
+
+        core.__all__ = ['make']
+        doc = functions.dox_a_module(package, {**options, 'use_all': True, 'exclude_names': []})
+        assert '### `Thing`\n\nA thing.' in doc and doc.count('A thing.') == 1, doc
+        assert '### `build`\n\nAlias of [`dedup.core.make`](#dedup-core).\n' in doc, doc
+
+
 if __name__ == '__main__':
     unittest.main()
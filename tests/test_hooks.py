@@ -153,6 +153,47 @@ class TestHooks(unittest.TestCase):
         after = functions.dox_a_module(functions)
         assert after == before + 'AFTER'
 
+    def test_BEFORE_handler_can_modify_options(self):
+        def handle(function, options):
+            options['header_level'] = 2
+            options['format'] = 'header'
+            return (function, options)
+        functions.set_before_handler(functions.Event.BEFORE_FUNCTION, handle)
+        doc = functions.dox_a_function(handle, functions.Options({'line_length': 72}))
+        assert doc == '### `handle():`\n\n', doc
+
+    def test_BEFORE_handler_can_copy_options(self):
+        def handle(function, options):
+            copied = options.copy()
+            copied['header_level'] = 2
+            assert type(copied) is dict and 'header_level' not in options
+            assert repr(options) == "_OptionEdits({'exclude_names': frozenset({'x'}), 'format': 'header'})"
+            return (function, copied)
+        functions.set_before_handler(functions.Event.BEFORE_FUNCTION, handle)
+        doc = functions.dox_a_function(handle, {'exclude_names': ['x'], 'format': 'header'})
+        assert doc == '### `handle():`\n\n', doc
+
+    def test_BEFORE_handler_options_are_validated(self):
+        options = functions.Options({'line_length': 72})
+        seen = []
+        def handle(function, options):
+            seen.append(options)
+            return (function, options)
+        functions.set_before_handler(functions.Event.BEFORE_FUNCTION, handle)
+        # unchanged options are passed through without a copy
+        assert functions._invoke_before_handler(functions.Event.BEFORE_FUNCTION, handle, options)[1] is options
+        assert dict(seen[0]) == {'line_length': 72}
+
+        def invalid(function, options):
+            options['format'] = 'poem'
+            return (function, options)
+        functions.unset_handler(functions.Event.BEFORE_FUNCTION)
+        functions.set_before_handler(functions.Event.BEFORE_FUNCTION, invalid)
+        with self.assertRaises(ValueError):
+            functions.dox_a_function(handle, options)
+        with self.assertRaises(ValueError):
+            options.derive(format='poem')
+
     def test_event_handler_chaining(self):
         val = 'some str'
         before = functions.dox_a_value(val)
@@ -174,5 +215,94 @@ class TestHooks(unittest.TestCase):
         assert after == before + 'AFTER1 AFTER2 AFTER3'
 
 
+    def test_BATCH_handler_receives_fragments_in_bulk(self):
+        import sys
+        module = sys.modules[__name__]
+        before = functions.dox_a_module(module)
+        calls = []
+        def handler(fragments):
+            calls.append(fragments)
+            return fragments
+        functions.set_batch_handler(handler)
+        after = functions.dox_a_module(module)
+        assert after == before
+        assert len(calls) == 1
+        fragments = calls[0]
+        assert {kind for kind, _, _ in fragments} <= {'header', 'paragraph', 'list'}
+        assert fragments[0] == ('header', __name__, f'# {__name__}\n\n')
+        qualnames = {qualname for _, qualname, _ in fragments}
+        assert f'{__name__}.TestHooks' in qualnames
+        assert f'{__name__}.TestHooks.tearDown' in qualnames
+        assert all('\x00' not in text for _, _, text in fragments)
+
+    def test_BATCH_handler_can_modify_fragments(self):
+        import sys
+        module = sys.modules[__name__]
+        functions.set_batch_handler(lambda fragments: [
+            text.upper() if kind == 'header' else text
+            for kind, _, text in fragments
+        ])
+        after = functions.dox_a_module(module)
+        assert f'# {__name__.upper()}\n\n' in after
+        assert '## CLASSES' in after
+        assert '\x00' not in after
+        functions.set_batch_handler(lambda fragments: fragments[1:])
+        with self.assertRaises(ValueError):
+            functions.dox_a_module(module)
+        assert functions._fragments.get() == () and functions._fragment_names.get() == ()
+
+    def test_BATCH_handler_runs_alongside_AFTER_handlers(self):
+        module = functions
+        functions.set_after_handler(
+            functions.Event.AFTER_LIST,
+            lambda doc: doc.replace('- ', '* ')
+        )
+        functions.set_batch_handler(lambda fragments: [
+            (kind, qualname, text + '<!-- list -->\n' if kind == 'list' else text)
+            for kind, qualname, text in fragments
+        ])
+        after = functions.dox_a_module(module)
+        assert '* ' in after
+        assert '<!-- list -->' in after
+        functions.unset_handler(functions.Event.BATCH)
+        assert '<!-- list -->' not in functions.dox_a_module(module)
+
+    def test_chained_BATCH_handlers_receive_tuples(self):
+        import sys
+        module = sys.modules[__name__]
+        received = []
+        functions.set_batch_handler(lambda fragments: [text for _, _, text in fragments])
+        def second(fragments):
+            received.extend(fragments)
+            return fragments
+        functions.set_batch_handler(second)
+        after = functions.dox_a_module(module)
+        assert received and all(type(f) is tuple and len(f) == 3 for f in received)
+        functions.unset_handler(functions.Event.BATCH)
+        assert after == functions.dox_a_module(module)
+
+    def test_AFTER_handlers_see_text_with_BATCH_handler(self):
+        import sys
+        module = sys.modules[__name__]
+        seen = []
+        def after_function(doc):
+            seen.append(doc)
+            return doc
+        functions.set_after_handler(functions.Event.AFTER_FUNCTION, after_function)
+        functions.set_after_handler(functions.Event.AFTER_CLASS, after_function)
+        functions.set_batch_handler(lambda fragments: [
+            (kind, name, text.upper()) for kind, name, text in fragments
+        ])
+        doc = functions.dox_a_module(module)
+        assert seen and all('\x00' not in s for s in seen)
+        # fragments of unchanged docs are still batched
+        assert '## CLASSES' in doc and '`TEARDOWN' in doc, doc
+
+        functions.unset_handler(functions.Event.AFTER_CLASS)
+        functions.set_after_handler(functions.Event.AFTER_CLASS, lambda doc: doc + 'Changed.\n\n')
+        doc = functions.dox_a_module(module)
+        # a changed doc is kept as the handler returned it
+        assert 'Changed.' in doc and '`tearDown' in doc, doc
+
 if __name__ == '__main__':
     unittest.main()
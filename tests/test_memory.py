@@ -0,0 +1,337 @@
+from context import functions
+from contextlib import redirect_stderr, redirect_stdout
+from importlib import import_module
+from io import StringIO
+from tempfile import TemporaryDirectory
+import gc
+import os
+import sys
+import threading
+import tracemalloc
+import unittest
+import weakref
+
+
+# budgets are in bytes and can be overridden from the environment, e.g.
+# AUTODOX_PEAK_BUDGET_PER_MODULE=131072 python test_memory.py
+PEAK_BUDGET_BASE = int(os.environ.get('AUTODOX_PEAK_BUDGET_BASE', 512 * 1024))
+PEAK_BUDGET_PER_MODULE = int(os.environ.get('AUTODOX_PEAK_BUDGET_PER_MODULE', 64 * 1024))
+PACKAGE_SIZES = (4, 16, 64)
+SHOW_REPORT = 'AUTODOX_MEMORY_REPORT' in os.environ
+
+PHASES = {
+    'traversal': (
+        'dox_a_module', 'dox_a_class', '_dox_methods', '_dox_properties',
+        '_get_all_annotations',
+    ),
+    'formatting': (
+        'dox_a_function', 'dox_a_value', '_header', '_paragraph', '_list',
+    ),
+    'hooks': ('_invoke_handler',),
+}
+
+
+def write_package(root: str, name: str, module_count: int) -> None:
+    """Writes a generated package with module_count submodules, each
+        containing a handful of classes, functions, and values.
+    """
+    os.makedirs(os.path.join(root, name))
+    with open(os.path.join(root, name, '__init__.py'), 'w') as f:
+        f.write(f'"""Generated package with {module_count} modules."""\n')
+        for i in range(module_count):
+            f.write(f'from . import mod{i}\n')
+
+    for i in range(module_count):
+        lines = [
+            'from __future__ import annotations',
+            f'"""Generated module number {i}."""',
+        ]
+        for c in range(5):
+            lines.extend([
+                f'class Thing{c}:',
+                f'    """Generated class {c} with some docs to wrap around."""',
+                '    name: str',
+                '    data: dict[str, list[int]]',
+                '    def __init__(self, name: str, data: dict = {}) -> None:',
+                '        """Initialize the thing."""',
+                '    @property',
+                '    def size(self) -> int:',
+                '        """The size of the thing."""',
+                '    def pack(self, compact: bool = True) -> bytes:',
+                '        """Serialize the thing to bytes for some reason."""',
+                '    @classmethod',
+                f'    def unpack(cls, data: bytes) -> Thing{c}:',
+                '        """Deserialize a thing from bytes."""',
+            ])
+        for f in range(5):
+            lines.extend([
+                f'def function{f}(a: int, b: str = "b", /, *, c: float = 1.0) -> list[str]:',
+                f'    """Generated function {f} that does generated things."""',
+            ])
+        for v in range(10):
+            lines.append(f'VALUE_{v} = {v}')
+        with open(os.path.join(root, name, f'mod{i}.py'), 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+
+class MemoryProfile:
+    """Wraps the autodox functions named in PHASES to record tracemalloc
+        peak, net bytes, and net allocated blocks per function and per
+        phase. Phase numbers are inclusive of nested phases, e.g. the
+        formatting phase includes the hooks it invokes.
+    """
+    def __init__(self) -> None:
+        self.originals = {}
+        self.stack = []
+        self.functions = {}
+        self.phases = {
+            phase: {'calls': 0, 'peak': 0, 'bytes': 0, 'blocks': 0}
+            for phase in PHASES
+        }
+        self.peak = 0
+
+    def _fold_peak(self) -> None:
+        _, peak = tracemalloc.get_traced_memory()
+        self.peak = max(self.peak, peak)
+        for frame in self.stack:
+            frame['peak'] = max(frame['peak'], peak)
+        tracemalloc.reset_peak()
+
+    def _wrap(self, phase: str, name: str, function):
+        def wrapper(*args, **kwargs):
+            self._fold_peak()
+            current, _ = tracemalloc.get_traced_memory()
+            frame = {
+                'name': name, 'phase': phase, 'start': current, 'peak': current,
+                'blocks': sys.getallocatedblocks(), 'children': 0,
+            }
+            self.stack.append(frame)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self._fold_peak()
+                self.stack.pop()
+                current, _ = tracemalloc.get_traced_memory()
+                net = current - frame['start']
+                blocks = sys.getallocatedblocks() - frame['blocks']
+                if self.stack:
+                    self.stack[-1]['children'] += net
+
+                stats = self.functions.setdefault(name, {'calls': 0, 'self_bytes': 0, 'peak': 0})
+                stats['calls'] += 1
+                stats['self_bytes'] += net - frame['children']
+                stats['peak'] = max(stats['peak'], frame['peak'] - frame['start'])
+
+                if not any(f['phase'] == phase for f in self.stack):
+                    totals = self.phases[phase]
+                    totals['calls'] += 1
+                    totals['bytes'] += net
+                    totals['blocks'] += blocks
+                    totals['peak'] = max(totals['peak'], frame['peak'] - frame['start'])
+        return wrapper
+
+    def instrument(self) -> None:
+        for phase, names in PHASES.items():
+            for name in names:
+                original = getattr(functions, name)
+                self.originals[name] = original
+                setattr(functions, name, self._wrap(phase, name, original))
+
+    def restore(self) -> None:
+        for name, original in self.originals.items():
+            setattr(functions, name, original)
+        self.originals = {}
+
+    def top_allocators(self, count: int = 5) -> list[tuple[str, dict]]:
+        return sorted(
+            self.functions.items(),
+            key=lambda item: item[1]['self_bytes'],
+            reverse=True
+        )[:count]
+
+    def report(self) -> str:
+        lines = [f'peak: {self.peak} bytes']
+        for phase, totals in self.phases.items():
+            lines.append(
+                f'{phase}: {totals["calls"]} calls, peak {totals["peak"]} bytes, '
+                f'net {totals["bytes"]} bytes, net {totals["blocks"]} blocks'
+            )
+        for name, stats in self.top_allocators():
+            lines.append(
+                f'  {name}: {stats["calls"]} calls, self {stats["self_bytes"]} bytes, '
+                f'peak {stats["peak"]} bytes'
+            )
+        return '\n'.join(lines)
+
+
+def profile_module(module, options: dict) -> MemoryProfile:
+    """Runs dox_a_module under tracemalloc with hooks set and returns
+        the collected profile.
+    """
+    profile = MemoryProfile()
+    for event in (functions.Event.AFTER_HEADER, functions.Event.AFTER_LIST):
+        functions.set_after_handler(event, lambda doc: doc.replace('\t', ' '))
+    profile.instrument()
+    tracemalloc.start()
+    try:
+        functions.dox_a_module(module, options)
+        profile._fold_peak()
+    finally:
+        tracemalloc.stop()
+        profile.restore()
+        for event in functions.Event:
+            functions.unset_handler(event)
+    return profile
+
+
+class TestMemoryBudget(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.tempdir = TemporaryDirectory()
+        sys.path.insert(0, cls.tempdir.name)
+        cls.packages = {}
+        for size in PACKAGE_SIZES:
+            name = f'autodox_memtest_{size}'
+            write_package(cls.tempdir.name, name, size)
+            cls.packages[size] = import_module(name)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        sys.path.remove(cls.tempdir.name)
+        for name in [n for n in sys.modules if n.startswith('autodox_memtest_')]:
+            del sys.modules[name]
+        cls.tempdir.cleanup()
+
+    def test_peak_within_budget(self):
+        options = {'document_submodules': True}
+        for size, package in self.packages.items():
+            profile = profile_module(package, options)
+            if SHOW_REPORT:
+                print(f'\n{package.__name__}\n{profile.report()}', file=sys.stderr)
+            budget = PEAK_BUDGET_BASE + PEAK_BUDGET_PER_MODULE * size
+            assert profile.peak <= budget, \
+                f'peak {profile.peak} exceeded budget {budget}\n{profile.report()}'
+
+    def test_records_every_phase(self):
+        profile = profile_module(self.packages[PACKAGE_SIZES[0]], {'document_submodules': True})
+        for phase, totals in profile.phases.items():
+            assert totals['calls'] > 0, f'no calls recorded for {phase}'
+            assert totals['peak'] >= 0
+
+    def test_reports_top_allocators(self):
+        saved = {name: getattr(functions, name) for names in PHASES.values() for name in names}
+        profile = profile_module(self.packages[PACKAGE_SIZES[0]], {'document_submodules': True})
+        # the wrappers are removed once the profile is done
+        for name, original in saved.items():
+            assert getattr(functions, name) is original, name
+        assert not profile.originals
+
+        top = profile.top_allocators()
+        assert len(top) == 5
+        for name, stats in top:
+            assert name in saved, name
+            assert stats['calls'] > 0 and stats['peak'] >= 0, (name, stats)
+        assert set(profile.functions) <= set(saved)
+        report = profile.report()
+        assert 'traversal:' in report and 'formatting:' in report and 'hooks:' in report
+        assert top[0][0] in report
+
+
+class TestLowMemory(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tempdir = TemporaryDirectory()
+        sys.path.insert(0, self.tempdir.name)
+        write_package(self.tempdir.name, 'autodox_lowmem', 20)
+
+    def tearDown(self) -> None:
+        sys.path.remove(self.tempdir.name)
+        for name in [n for n in sys.modules if n.startswith('autodox_lowmem')]:
+            del sys.modules[name]
+        for event in functions.Event:
+            functions.unset_handler(event)
+        self.tempdir.cleanup()
+
+    def forget(self) -> None:
+        for name in [n for n in sys.modules if n.startswith('autodox_lowmem')]:
+            del sys.modules[name]
+
+    def test_evicted_modules_are_released(self):
+        options = {'document_submodules': True, 'anchors': True}
+        expected = functions.dox_modules(['autodox_lowmem'], options)
+        self.forget()
+
+        documented = []
+        def before(module, options):
+            documented.append(weakref.ref(module))
+            return (module, options)
+        functions.set_before_handler(functions.Event.BEFORE_MODULE, before)
+        doc = functions.dox_modules(['autodox_lowmem'], {**options, 'evict_modules': True})
+        assert doc == expected
+        assert not [n for n in sys.modules if n.startswith('autodox_lowmem')]
+        gc.collect()
+        assert len(documented) == 21
+        assert [ref for ref in documented if ref() is not None] == []
+
+        # modules loaded before the run are kept
+        import_module('autodox_lowmem')
+        functions.dox_modules(['autodox_lowmem'], {**options, 'evict_modules': True})
+        assert len([n for n in sys.modules if n.startswith('autodox_lowmem')]) == 21
+
+    def test_gc_checkpoints_per_run(self):
+        counts = []
+        def before(module, options):
+            counts.append(functions._released.get()[0])
+            return (module, options)
+        functions.set_before_handler(functions.Event.BEFORE_MODULE, before)
+        names = functions.discover_modules('autodox_lowmem')[1:]
+        functions.dox_modules(names[:5], {'low_memory': True})
+        assert counts == [0, 1, 2, 3, 4] and functions._released.get() is None
+        counts.clear()
+        thread = threading.Thread(target=functions.dox_modules, args=(names[:3], {'low_memory': True}))
+        thread.start()
+        thread.join()
+        functions.dox_modules(names, {'low_memory': True})
+        assert counts[:3] == [0, 1, 2] and counts[3:6] == [0, 1, 2], counts
+        assert max(counts) == functions._gc_interval - 1
+
+    def test_cli(self):
+        args = ['autodox', 'autodox_lowmem.*', '-exclude_module=*.mod1*']
+        output = StringIO()
+        with redirect_stdout(output):
+            functions.invoke_cli(args)
+        expected = output.getvalue()
+        self.forget()
+
+        output, errors = StringIO(), StringIO()
+        with redirect_stdout(output), redirect_stderr(errors):
+            functions.invoke_cli([*args, '-evict_modules'])
+        assert output.getvalue() == expected
+        # only the documented modules are evicted
+        kept = [n for n in sys.modules if n.startswith('autodox_lowmem.')]
+        assert kept and all(n.startswith('autodox_lowmem.mod1') for n in kept), kept
+        if functions.peak_rss() is not None:
+            assert errors.getvalue().startswith('peak RSS: ')
+
+    def test_cli_flushes_submodules(self):
+        args = ['autodox', 'autodox_lowmem', '-document_submodules']
+        output = StringIO()
+        with redirect_stdout(output):
+            functions.invoke_cli([*args, '-anchors'])
+        expected = output.getvalue()
+        self.forget()
+
+        sizes = []
+        def before(module, options):
+            sizes.append(len(output.getvalue()))
+            return (module, options)
+        functions.set_before_handler(functions.Event.BEFORE_MODULE, before)
+        output = StringIO()
+        with redirect_stdout(output), redirect_stderr(StringIO()):
+            functions.invoke_cli([*args, '-low_memory'])
+        assert output.getvalue() == expected
+        # the package and each submodule are written before the next one
+        assert len(sizes) == 21 and sizes[0] == 0 and sorted(set(sizes)) == sizes, sizes
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+from context import TempPackage, functions
+from autodox.snapshot import Snapshot
+from contextlib import redirect_stdout
+from inspect import iscoroutinefunction
+from io import StringIO
+from tempfile import TemporaryDirectory
+import json
+import os
+import sys
+import unittest
+
+
+FILES = {
+    'snappkg/__init__.py': '"""A package to snapshot."""\nfrom . import core, shapes\nfrom .core import Thing, compute\n',
+    'snappkg/core.py': '''"""Core module."""
+from __future__ import annotations
+from collections import namedtuple
+from typing import Optional
+import math
+
+LIMIT = 10
+RATIO = math.inf
+NAMES = ['a', 'b']
+Point = namedtuple('Point', 'x y')
+
+class Base:
+    """The base."""
+    name: str
+
+class Thing(Base):
+    """A thing."""
+    data: dict[str, list[int]]
+    parent: Optional[Base]
+    def __init__(self, name: str, data: dict = {}, /, *, kind: type = Base) -> None:
+        """Initialize."""
+    def __new__(cls, *args, **kwargs):
+        return super().__new__(cls)
+    @property
+    def size(self) -> int:
+        """The size."""
+    @classmethod
+    def make(cls, name: str = 'default') -> Thing:
+        """Make one."""
+    @staticmethod
+    def helper(value: int = 3) -> int:
+        """Help out."""
+    async def fetch(self, url: str) -> bytes:
+        """Fetch it."""
+    def _hidden(self) -> None:
+        """Private."""
+
+def compute(a: int, b: float = 1.5, c: bytes = b'c') -> list[Thing]:
+    """Compute a thing."""
+
+async def run(x: int) -> None:
+    """Run async."""
+''',
+    'snappkg/shapes.py': '''"""Shapes."""
+from enum import Enum, IntEnum
+__all__ = ['Color', 'Size', 'RED', 'area']
+
+class Color(Enum):
+    """Some colors."""
+    RED = 'red'
+    GREEN = (0, 255, 0)
+
+class Size(IntEnum):
+    SMALL = 1
+    LARGE = 2
+
+RED = Color.RED
+SECRET = 1
+
+def area(size: Size = Size.SMALL) -> float:
+    """The area."""
+''',
+}
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tempdir = TempPackage(FILES)
+
+    def tearDown(self) -> None:
+        self.tempdir.cleanup()
+
+    def test_render_matches_dox_modules(self):
+        names = ['snappkg', 'snappkg.core', 'snappkg.shapes']
+        for content in (
+            {},
+            {'include_private': True, 'include_dunder': True},
+            {'document_submodules': True, 'resolve_annotations': True},
+            {'use_all': True, 'list_undeclared': True, 'exclude_names': ['LIMIT']},
+        ):
+            snapshot = Snapshot(json.loads(Snapshot.collect(names, content).dumps()))
+            for presentation in (
+                {},
+                {'function_format': 'list', 'method_format': 'paragraph',
+                 'line_length': 40, 'header_level': 2},
+                {'value_format': 'table', 'cross_references': True},
+            ):
+                expected = functions.dox_modules(names, {**content, **presentation})
+                observed = snapshot.render(presentation)
+                assert observed == expected, (content, presentation, observed)
+
+    def test_cli_render_needs_no_imports(self):
+        output = StringIO()
+        with redirect_stdout(output):
+            functions.invoke_cli(['autodox', 'collect', 'snappkg', '-document_submodules'])
+        snapshot_dir = TemporaryDirectory()
+        self.addCleanup(snapshot_dir.cleanup)
+        path = os.path.join(snapshot_dir.name, 'snapshot.json')
+        with open(path, 'w') as f:
+            f.write(output.getvalue())
+
+        expected = {}
+        for args in ([], ['-function_format=list', '-value_format=table']):
+            output = StringIO()
+            with redirect_stdout(output):
+                functions.invoke_cli(['autodox', 'snappkg', '-document_submodules', *args])
+            expected[tuple(args)] = output.getvalue()
+
+        self.tempdir.cleanup()
+        for args, doc in expected.items():
+            output = StringIO()
+            with redirect_stdout(output):
+                code = functions.invoke_cli(['autodox', 'render', path, *args])
+            assert code == 0
+            assert output.getvalue() == doc
+        assert not [n for n in sys.modules if n.startswith('snappkg')]
+
+    def test_render_deduplicate(self):
+        names = ['snappkg', 'snappkg.core', 'snappkg.shapes']
+        options = {'deduplicate': True, 'function_format': 'list'}
+        expected = functions.dox_modules(names, options)
+        assert expected.count('Alias of') == 1 and expected.count('alias of') == 1, expected
+        snapshot = Snapshot(json.loads(Snapshot.collect(names).dumps()))
+        assert snapshot.module('snappkg').Thing is snapshot.module('snappkg.core').Thing
+
+        # rendering looks up canonical modules in the snapshot only
+        self.tempdir.cleanup()
+        observed = snapshot.render(options)
+        assert observed == expected, observed
+        assert not [n for n in sys.modules if n.startswith('snappkg')]
+
+    def test_stand_ins(self):
+        snapshot = Snapshot(json.loads(Snapshot.collect(['snappkg.shapes'], {'include_private': True}).dumps()))
+        shapes = snapshot.module('snappkg.shapes')
+        red = snapshot._value({'v': 'Color', 'e': 1, 'l': "'red'"})
+        assert type(red) is type(shapes.RED) and red is shapes.RED
+        assert (type(red).__name__, red.value) == ('Color', 'red')
+        assert type(snapshot._value({'v': 'Color', 'e': 1, 'l': '2'})) is type(red)
+        assert list(shapes.Color.__members__) == ['RED', 'GREEN']
+        assert shapes.Color.RED.value == 'red' and type(shapes.Color.GREEN.value).__name__ == 'tuple'
+        assert shapes.Size.__base__.__name__ == 'IntEnum' and type(red) is snapshot._enum('Color')
+
+        snapshot = Snapshot.collect(['snappkg.core'])
+        core = snapshot.module('snappkg.core')
+        assert iscoroutinefunction(core.run) and not iscoroutinefunction(core.compute)
+        assert (core.run.__name__, core.compute.__name__) == ('run', 'compute')
+
+    def test_version(self):
+        with self.assertRaises(ValueError):
+            Snapshot({'version': 0, 'names': [], 'options': {}, 'modules': {}})
+        snapshot = Snapshot.collect(['snappkg.core'])
+        assert snapshot.data['version'] == 1
+        with self.assertRaises(ModuleNotFoundError):
+            snapshot.module('snappkg.shapes')
+
+
+if __name__ == '__main__':
+    unittest.main()
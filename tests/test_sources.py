@@ -0,0 +1,140 @@
+from context import functions
+from autodox.sources import SourceIndex, index_source, source_link
+from tempfile import TemporaryDirectory
+import importlib
+import inspect
+import json
+import os
+import sys
+import unittest
+
+
+SOURCE = '''"""Source module."""
+import functools
+
+
+def plain(a: int) -> int:
+    """Plain."""
+    return a
+
+
+@functools.lru_cache
+@staticmethod
+def decorated() -> None: ...
+
+
+class Outer:
+    """Outer."""
+    class Inner:
+        x = 1
+
+    async def method(self) -> None:
+        def local():
+            pass
+        # still in method
+
+    # after method, still in Outer
+    @property
+    def prop(self) -> int:
+        return 1
+# not in Outer
+
+
+def last():
+    return [
+        1,
+    ]
+'''
+
+
+class TestSources(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tempdir = TemporaryDirectory()
+        os.makedirs(os.path.join(self.tempdir.name, 'srcpkg'))
+        with open(os.path.join(self.tempdir.name, 'srcpkg', '__init__.py'), 'w') as f:
+            f.write('')
+        with open(os.path.join(self.tempdir.name, 'srcpkg', 'mod.py'), 'w') as f:
+            f.write(SOURCE)
+        sys.path.insert(0, self.tempdir.name)
+
+    def tearDown(self) -> None:
+        sys.path.remove(self.tempdir.name)
+        for name in [n for n in sys.modules if n.startswith('srcpkg')]:
+            del sys.modules[name]
+        self.tempdir.cleanup()
+
+    def test_index_source(self):
+        index = index_source(SOURCE.encode())
+        assert index['spans'] == {
+            'plain': [5, 7],
+            'decorated': [10, 12],
+            'Outer': [15, 28],
+            'Outer.Inner': [17, 18],
+            'Outer.method': [20, 23],
+            'Outer.method.<locals>.local': [21, 22],
+            'Outer.prop': [26, 28],
+            'last': [32, 35],
+        }, index['spans']
+        assert index['ends'] == {
+            '5': 7, '10': 12, '20': 23, '21': 22, '26': 28, '32': 35
+        }, index['ends']
+
+    def test_spans_match_inspect(self):
+        from srcpkg import mod
+        index = SourceIndex()
+        for item in (mod.plain, mod.Outer, mod.Outer.Inner, mod.Outer.method,
+                     mod.Outer.prop.fget, mod.last):
+            lines, first = inspect.getsourcelines(item)
+            assert index.span(item) == ('srcpkg/mod.py', first, first + len(lines) - 1), item
+        # wrapped by a decorator: found by qualified name
+        assert index.span(mod.decorated) == ('srcpkg/mod.py', 10, 12)
+        assert index.span(len) is None
+
+    def test_cache_by_hash(self):
+        from srcpkg import mod
+        cache = os.path.join(self.tempdir.name, 'cache')
+        assert SourceIndex(cache).span(mod.plain) == ('srcpkg/mod.py', 5, 7)
+        [name] = os.listdir(cache)
+        with open(os.path.join(cache, name)) as f:
+            cached = json.load(f)
+        assert cached == index_source(SOURCE.encode())
+
+        # an unchanged file is not tokenized again
+        cached['spans']['plain'] = [1, 2]
+        cached['ends']['5'] = 6
+        with open(os.path.join(cache, name), 'w') as f:
+            json.dump(cached, f)
+        assert SourceIndex(cache).span(mod.plain) == ('srcpkg/mod.py', 5, 6)
+
+    def test_links(self):
+        from srcpkg import mod
+        url = 'https://example.com/{path}#L{start}-L{end}'
+        doc = functions.dox_a_module(mod, {'source_url': url})
+        assert '### `Outer`\n\nOuter.\n\n[source](https://example.com/srcpkg/mod.py#L15-L28)\n\n' in doc, doc
+        assert '### `plain(a: int) -> int:`\n\nPlain.\n\n' \
+            '[source](https://example.com/srcpkg/mod.py#L5-L7)\n\n' in doc, doc
+        assert '##### `async method():`\n\n[source](https://example.com/srcpkg/mod.py#L20-L23)\n\n' in doc, doc
+
+        doc = functions.dox_a_function(mod.plain, {'source_url': url, 'format': 'list'})
+        assert doc == '- `plain(a: int) -> int:` Plain.\n' \
+            '[source](https://example.com/srcpkg/mod.py#L5-L7)\n', doc
+        assert '[source]' not in functions.dox_a_module(mod)
+
+        for template in ('{path}#L{line}', '{}', '{path', '{0}#{start}'):
+            with self.assertRaises(ValueError):
+                functions.dox_a_module(mod, {'source_url': template})
+        with self.assertRaises(TypeError):
+            functions.dox_a_module(mod, {'source_url': url, 'source_cache': 1})
+
+    def test_changed_files(self):
+        from srcpkg import mod
+        url = '{module}:{start}-{end}'
+        assert source_link(mod.plain, url) == 'srcpkg.mod:5-7'
+        with open(mod.__file__, 'w') as f:
+            f.write('\n\n' + SOURCE)
+        mod = importlib.reload(mod)
+        assert source_link(mod.plain, url) == 'srcpkg.mod:7-9'
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+from context import TempPackage, functions
+from autodox import workers
+import sys
+import unittest
+
+
+FILES = {
+    'wkpkg/__init__.py': '"""Worker package."""\nimport json\n',
+    'wkpkg/first.py': '"""First."""\nimport json\nimport textwrap\nclass One:\n    """One."""\n'
+        'def make() -> One:\n    """Makes one."""\n',
+    'wkpkg/second.py': '"""Second."""\nfrom textwrap import dedent\nfrom wkpkg.first import One\n'
+        'from . import third\ndef use(one: One) -> int:\n    """Uses one."""\n',
+    'wkpkg/third.py': '"""Third."""\nimport csv\nVALUE = 3\n',
+    'wkpkg/broken.py': '"""Broken."""\nraise ValueError("broken")\n',
+}
+NAMES = ['wkpkg', 'wkpkg.first', 'wkpkg.second', 'wkpkg.third']
+
+
+class TestWorkers(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tempdir = TempPackage(FILES)
+
+    def tearDown(self) -> None:
+        self.tempdir.cleanup()
+
+    def test_shared_dependencies(self):
+        assert workers.shared_dependencies(NAMES) == ['json', 'textwrap']
+        assert not [n for n in sys.modules if n.startswith('wkpkg')]
+
+    def test_matches_sequential_run(self):
+        for extra in ({}, {'cross_references': True}, {'low_memory': True}):
+            expected = functions.dox_modules(NAMES, extra)
+            self.tempdir.forget()
+            assert functions.dox_modules(NAMES, {**extra, 'workers': 3}) == expected, extra
+            # the modules were imported by the workers only
+            assert 'wkpkg.first' not in sys.modules
+
+        expected = functions.ShardWriter('wkpkg', 100)
+        functions.dox_modules(NAMES, {'cross_references': True, 'writer': expected})
+        writer = functions.ShardWriter('wkpkg', 100)
+        functions.dox_modules(NAMES, {'cross_references': True, 'writer': writer, 'workers': 2})
+        assert writer.files() == expected.files()
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            functions.dox_modules([*NAMES[:2], 'wkpkg.broken', 'wkpkg.third'], {'workers': 2})
+        with self.assertRaises(ModuleNotFoundError):
+            functions.dox_modules(['wkpkg', 'wkpkg.missing'], {'workers': 2})
+
+        documented = functions._dox_modules(
+            ['wkpkg', 'wkpkg.broken', 'wkpkg.third'], functions.Options({'workers': 2})
+        )
+        assert next(documented)[0] == 'wkpkg'
+        with self.assertRaises(ValueError):
+            next(documented)
+
+
+if __name__ == '__main__':
+    unittest.main()